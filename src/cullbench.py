@@ -0,0 +1,113 @@
+"""Benchmark of culling and LOD assignment over scatter batches.
+
+Spreads batches of random instances over a square terrain, culls them
+for a few cameras and reports how many stay visible, how they split
+into levels of detail and how long it took. Needs no Maya:
+
+    python cullbench.py --sizes 100000 1000000 --distance 300 --lods 3
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import scattercore
+
+CAMERAS = {
+    "ground": ((0.0, 2.0, 0.0), (100.0, 0.0, 100.0)),
+    "aerial": ((0.0, 300.0, -400.0), (0.0, 0.0, 0.0)),
+    "overhead": ((0.0, 400.0, 0.0), (0.0, 0.0, 0.01)),
+}
+
+
+def build_batch(count, extent, lods, seed=0):
+    """Returns a batch of count instances over an extent wide terrain."""
+    rng = random.Random(seed)
+    half = extent / 2.0
+    batch = scattercore.ScatterBatch(
+        "bench", ["lod{0}".format(level) for level in range(lods)], seed)
+    positions = [(rng.uniform(-half, half), rng.uniform(-1.0, 1.0),
+                  rng.uniform(-half, half)) for _ in range(count)]
+    rotations = [(0.0, rng.uniform(-180.0, 180.0), 0.0)
+                 for _ in range(count)]
+    scales = [(scale, scale, scale) for scale in
+              (rng.uniform(0.5, 1.5) for _ in range(count))]
+    batch.add_transforms([0] * count, positions, rotations, scales)
+    return batch
+
+
+def run_cull(batch, camera, distance, lods, radius, repeat=3):
+    """Culls batch for a camera, keeping the fastest of repeat runs.
+
+    Returns
+        dict: The visible and per level counts and the timing
+    """
+    position, target = CAMERAS[camera]
+    view = scattercore.CameraView.look_at(position, target)
+    lod_distances = None
+    if lods > 1 and distance:
+        lod_distances = scattercore.even_lod_distances(distance, lods)
+    seconds = None
+    for _ in range(repeat):
+        start = time.time()
+        culled = scattercore.cull_batch(batch, view, distance, True,
+                                        lod_distances, radius, lods)
+        elapsed = time.time() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    levels = culled.stats()["sources"]
+    return {
+        "instances": len(batch),
+        "camera": camera,
+        "visible": len(culled),
+        "visible_fraction": len(culled) / float(max(len(batch), 1)),
+        "levels": [levels[source] for source in batch.sources],
+        "seconds": seconds,
+        "instances_per_second": len(batch) / max(seconds, 1e-9),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10000, 100000, 1000000])
+    parser.add_argument("--extent", type=float, default=1000.0,
+                        help="Width of the square terrain")
+    parser.add_argument("--distance", type=float,
+                        help="Cull instances farther than this, and split "
+                             "the levels of detail up to it. The terrain "
+                             "width by default, 0 for the farthest visible "
+                             "instance")
+    parser.add_argument("--lods", type=int, default=3,
+                        help="Levels of detail to assign, 1 for none")
+    parser.add_argument("--radius", type=float, default=1.0,
+                        help="Size of the instances at scale 1")
+    parser.add_argument("--cameras", nargs="+", default=sorted(CAMERAS),
+                        choices=sorted(CAMERAS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+    if args.distance is None:
+        args.distance = args.extent
+
+    print("numpy: {0}".format("yes" if scattercore.np is not None else "no"))
+    results = []
+    for size in args.sizes:
+        batch = build_batch(size, args.extent, args.lods, args.seed)
+        for camera in args.cameras:
+            result = run_cull(batch, camera, args.distance, args.lods,
+                              args.radius, args.repeat)
+            print("{instances:>9} {camera:<9} visible {visible:>9} "
+                  "({visible_fraction:6.1%})  levels {levels}  "
+                  "{seconds:7.3f}s  {instances_per_second:12.0f}/s".format(
+                      **result))
+            results.append(result)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+"""File helpers shared by the save and cache modules."""
+import os
+
+
+def replace_file(source, destination):
+    """Renames source over destination, atomically where possible."""
+    if hasattr(os, "replace"):
+        os.replace(source, destination)
+    else:
+        if os.name == "nt" and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
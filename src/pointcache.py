@@ -0,0 +1,219 @@
+"""Point cache files of scatter batches.
+
+A point cache holds the instances of one scatter as typed columns after
+a small versioned header, so it can be memory mapped and streamed back
+into a scene far faster than a scene file full of transforms. Show what
+a cache holds with:
+
+    python pointcache.py info forest.pcache
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import scattercore
+from fileutil import replace_file
+
+EXTENSION = ".pcache"
+MAGIC = b"SCPC"
+FORMAT_VERSION = 1
+# Magic, format version, flags, instance count, seed and the size of
+# the JSON metadata that follows, all little endian.
+HEADER = struct.Struct("<4sHHQQI")
+FLAG_SEED = 1
+ALIGN = 8
+# Name, struct code and values per instance of every column, in file
+# order. They match the arrays of a ScatterBatch.
+COLUMNS = (
+    ("source_indices", "i", 1),
+    ("positions", "d", 3),
+    ("rotations", "f", 3),
+    ("scales", "f", 3),
+)
+
+
+def _padded(size):
+    return (size + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _layout(count, metadata_size):
+    """Returns the offset of every column and the size of the file."""
+    offset = _padded(HEADER.size + metadata_size)
+    offsets = {}
+    for name, code, width in COLUMNS:
+        offsets[name] = offset
+        offset = _padded(offset + count * width * struct.calcsize(code))
+    return offsets, offset
+
+
+def write_batch(batch, path):
+    """Writes a ScatterBatch to a point cache file, atomically.
+
+    Returns
+        str: The path of the file
+    """
+    metadata = json.dumps({
+        "group": batch.group,
+        "sources": batch.sources,
+        "output_mode": batch.output_mode,
+    }).encode("utf-8")
+    flags = FLAG_SEED if batch.seed is not None else 0
+    offsets, size = _layout(len(batch), len(metadata))
+    handle, partial = tempfile.mkstemp(
+        prefix="." + os.path.basename(path), suffix=".partial",
+        dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(handle, "wb") as cache_file:
+            cache_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags,
+                                         len(batch), batch.seed or 0,
+                                         len(metadata)))
+            cache_file.write(metadata)
+            for name, typed in batch.columns().items():
+                cache_file.write(b"\0" * (offsets[name] - cache_file.tell()))
+                if sys.byteorder != "little":
+                    typed = typed[:]
+                    typed.byteswap()
+                typed.tofile(cache_file)
+            cache_file.write(b"\0" * (size - cache_file.tell()))
+        replace_file(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return path
+
+
+class PointCache(object):
+    """A point cache file, memory mapped for reading.
+
+    Columns are read straight from the map, so opening even a very
+    large cache costs nothing until its instances are streamed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as cache_file:
+            self._map = mmap.mmap(cache_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except BaseException:
+            self._map.close()
+            raise
+
+    def _read_header(self):
+        if len(self._map) < HEADER.size:
+            raise ValueError(self.path + " is not a point cache")
+        magic, version, flags, count, seed, metadata_size = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(self.path + " is not a point cache")
+        if version != FORMAT_VERSION:
+            raise ValueError("{0} is a version {1} point cache, this reads "
+                             "version {2}".format(self.path, version,
+                                                  FORMAT_VERSION))
+        metadata = json.loads(self._map[HEADER.size:HEADER.size +
+                                        metadata_size].decode("utf-8"))
+        self.count = count
+        self.seed = seed if flags & FLAG_SEED else None
+        self.group = metadata["group"]
+        self.sources = metadata["sources"]
+        self.output_mode = metadata["output_mode"]
+        self._offsets, size = _layout(count, metadata_size)
+        if len(self._map) < size:
+            raise ValueError(self.path + " is truncated")
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            # Arrays still look into the map, which then closes once
+            # they are gone.
+            pass
+
+    def column(self, name, start=0, end=None):
+        """Reads instances start to end of a column.
+
+        With NumPy the result is a view into the map.
+
+        Returns
+            list: The values, in rows for columns of more than one value
+        """
+        end = self.count if end is None else min(end, self.count)
+        _, code, width = [column for column in COLUMNS
+                          if column[0] == name][0]
+        offset = self._offsets[name] + start * width * struct.calcsize(code)
+        values = max(end - start, 0) * width
+        if np is not None:
+            array = np.frombuffer(self._map, dtype="<" + code, count=values,
+                                  offset=offset)
+            return array if width == 1 else array.reshape(-1, width)
+        flat = struct.unpack_from("<{0}{1}".format(values, code), self._map,
+                                  offset)
+        if width == 1:
+            return list(flat)
+        return [list(flat[i:i + width]) for i in range(0, values, width)]
+
+    def iter_chunks(self, chunk_size):
+        """Yields the source indices, positions, rotations and scales of
+        chunk_size instances at a time.
+
+        The chunks are copies, so they outlive the cache.
+        """
+        for start in range(0, self.count, chunk_size):
+            chunk = [self.column(name, start, start + chunk_size)
+                     for name, _, _ in COLUMNS]
+            if np is not None:
+                chunk = [np.array(column) for column in chunk]
+            yield tuple(chunk)
+
+    def to_batch(self, group=None):
+        """Reads the whole cache into a ScatterBatch."""
+        batch = scattercore.ScatterBatch(group or self.group, self.sources,
+                                         self.seed, self.output_mode)
+        batch.add_transforms(*[self.column(name) for name, _, _ in COLUMNS])
+        return batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    info_parser = commands.add_parser("info",
+                                      help="Show what point caches hold")
+    info_parser.add_argument("caches", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command != "info":
+        parser.print_help()
+        return 1
+    for path in args.caches:
+        with PointCache(path) as cache:
+            stats = cache.to_batch().stats()
+        print("{0}: {1} instances of {2} sources, seed {3}, {4:.1f} MB"
+              .format(path, stats["instances"], len(stats["sources"]),
+                      stats["seed"], os.path.getsize(path) / 1024.0 / 1024.0))
+        for source, count in sorted(stats["sources"].items()):
+            print("    {0:<30} {1}".format(source, count))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
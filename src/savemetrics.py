@@ -0,0 +1,178 @@
+"""Timings of Smart Save, to find the slow shares.
+
+Every save logs a record of how long each of its phases took and how
+many bytes and files it touched. Setting SMARTSAVE_METRICS to a file
+path, or calling set_metrics_file, also appends the records there as
+JSON lines, which this script summarizes per folder or host:
+
+    python savemetrics.py metrics.jsonl --by host
+"""
+import argparse
+import collections
+import contextlib
+import json
+import logging
+import math
+import os
+import socket
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+METRICS_ENV = "SMARTSAVE_METRICS"
+HOST = socket.gethostname()
+
+_metrics_file = None
+_write_lock = threading.Lock()
+
+
+def set_metrics_file(path):
+    """Appends every save record to path, or stops if path is None."""
+    global _metrics_file
+    _metrics_file = path
+
+
+def metrics_file():
+    return _metrics_file or os.environ.get(METRICS_ENV)
+
+
+class SaveMetrics(object):
+    """The phase timings and counts of one save.
+
+    Phases may be timed from more than one thread, as long as they do
+    not overlap.
+    """
+
+    def __init__(self, folder, path=None):
+        self.start = time.time()
+        self.record = {
+            "time": self.start,
+            "host": HOST,
+            "folder": folder,
+            "path": path,
+            "phases": {},
+            "counts": {},
+        }
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Times the code in a with block as the named phase."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.time() - start)
+
+    def add_phase(self, name, seconds):
+        phases = self.record["phases"]
+        phases[name] = phases.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        counts = self.record["counts"]
+        counts[name] = counts.get(name, 0) + value
+
+    def finish(self, error=None):
+        """Logs the record, and appends it to the metrics file if set."""
+        self.record["seconds"] = time.time() - self.start
+        self.record["ok"] = error is None
+        if error is not None:
+            self.record["error"] = str(error)
+        log.info("Save of %s took %.2fs", self.record["path"],
+                 self.record["seconds"], extra={"save_metrics": self.record})
+        path = metrics_file()
+        if path:
+            _append(path, self.record)
+        return self.record
+
+
+def _append(path, record):
+    line = json.dumps(record, sort_keys=True) + "\n"
+    with _write_lock:
+        try:
+            with open(path, "a") as metrics:
+                metrics.write(line)
+        except (IOError, OSError) as err:
+            log.warning("Could not write save metrics to %s: %s", path, err)
+
+
+def read_records(paths):
+    """Reads the records of metrics files, skipping broken lines."""
+    records = []
+    for path in paths:
+        with open(path) as metrics:
+            for line in metrics:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def percentile(values, fraction):
+    """Returns the nearest rank percentile of a list of numbers."""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    rank = max(int(math.ceil(fraction * len(values))) - 1, 0)
+    return values[rank]
+
+
+def summarize(records, key="folder"):
+    """Groups records by a key and takes the p50 and p95 of each phase.
+
+    Returns
+        list: A summary dict per group, the slowest p95 first
+    """
+    groups = collections.defaultdict(list)
+    for record in records:
+        groups[record.get(key)].append(record)
+    summaries = []
+    for group, members in groups.items():
+        seconds = [record["seconds"] for record in members]
+        phases = collections.defaultdict(list)
+        for record in members:
+            for name, value in record["phases"].items():
+                phases[name].append(value)
+        written = sum(record["counts"].get("bytes_written", 0)
+                      for record in members)
+        summaries.append({
+            key: group,
+            "saves": len(members),
+            "failed": sum(1 for record in members if not record["ok"]),
+            "p50": percentile(seconds, 0.5),
+            "p95": percentile(seconds, 0.95),
+            "mb_per_second": written / 1024.0 / 1024.0 / max(sum(seconds),
+                                                             1e-9),
+            "phases": dict(
+                (name, (percentile(values, 0.5), percentile(values, 0.95)))
+                for name, values in phases.items()),
+        })
+    summaries.sort(key=lambda summary: summary["p95"], reverse=True)
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("metrics", nargs="+", help="JSON lines files")
+    parser.add_argument("--by", default="folder", choices=["folder", "host"])
+    parser.add_argument("--json", help="Also write the summary to this file")
+    args = parser.parse_args(argv)
+
+    summaries = summarize(read_records(args.metrics), args.by)
+    for summary in summaries:
+        print("{0}  {saves} saves  {failed} failed  p50 {p50:.2f}s  "
+              "p95 {p95:.2f}s  {mb_per_second:.1f} MB/s".format(
+                  summary[args.by], **summary))
+        for name, (p50, p95) in sorted(summary["phases"].items()):
+            print("    {0:<12} p50 {1:7.3f}s  p95 {2:7.3f}s".format(
+                name, p50, p95))
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(summaries, json_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
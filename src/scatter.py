@@ -1,14 +1,21 @@
 import logging
-import random
+import os
+import tempfile
+import time
 
 from PySide2 import QtWidgets, QtCore
 from shiboken2 import wrapInstance
 import maya.OpenMayaUI as omui
-import maya.cmds as cmds
-import pymel.core as pmc
+
+import scattercore
+from scattermaya import (CHUNK_SIZE, MAX_SEED, OUTPUT_INSTANCER,
+                         OUTPUT_TRANSFORMS, Scatterer)
 
 log = logging.getLogger(__name__)
 
+PROFILE_SUMMARY_LINES = 5
+RESULT_CACHE_FOLDER = os.path.join(tempfile.gettempdir(), "scatter_cache")
+
 
 def maya_main_window():
     """Return the maya main window widget"""
@@ -44,7 +51,11 @@ class ScatterUI(QtWidgets.QDialog):
         self.alignment_button = QtWidgets.QCheckBox("Align instances to "
                                                     "surface normals")
         self.scatter_density_layout = self._create_scatter_density_spinbox()
+        self.output_mode_layout = self._create_output_mode_combobox()
+        self.seed_layout = self._create_seed_ui()
         self.scatter_buttons_layout = self._create_scatter_buttons()
+        self.cull_layout = self._create_cull_ui()
+        self.progress_layout = self._create_progress_ui()
         self.main_layout = QtWidgets.QVBoxLayout()
         self.main_layout.addWidget(self.title_label)
         self.main_layout.addWidget(self.description_label)
@@ -52,8 +63,12 @@ class ScatterUI(QtWidgets.QDialog):
         self.main_layout.addLayout(self.vector_array)
         self.main_layout.addWidget(self.alignment_button)
         self.main_layout.addLayout(self.scatter_density_layout)
+        self.main_layout.addLayout(self.output_mode_layout)
+        self.main_layout.addLayout(self.seed_layout)
         self.main_layout.addStretch()
         self.main_layout.addLayout(self.scatter_buttons_layout)
+        self.main_layout.addLayout(self.cull_layout)
+        self.main_layout.addLayout(self.progress_layout)
         self.setLayout(self.main_layout)
         self._set_ui_properties_from_scatter()
 
@@ -102,15 +117,59 @@ class ScatterUI(QtWidgets.QDialog):
         return spinbox
 
     def _create_scatter_density_spinbox(self):
+        self.sampling_mode_combobox = QtWidgets.QComboBox()
+        self.sampling_mode_combobox.addItem("On vertices",
+                                            scattercore.SAMPLE_VERTICES)
+        self.sampling_mode_combobox.addItem("On surface (area weighted)",
+                                            scattercore.SAMPLE_AREA)
+        self.sampling_mode_combobox.addItem("On surface (Poisson disk)",
+                                            scattercore.SAMPLE_POISSON)
         self.scatter_density_spinbox = self._create_vector_component_spinbox()
         self.scatter_density_spinbox.setMinimum(0)
         self.scatter_density_spinbox.setMaximum(1)
         self.scatter_density_label = QtWidgets.QLabel("Fraction of vertices "
                                                       "to scatter")
+        self.min_distance_spinbox = self._create_vector_component_spinbox()
+        self.min_distance_spinbox.setMinimum(0)
+        self.min_distance_label = QtWidgets.QLabel("Minimum spacing")
+
+        layout = QtWidgets.QGridLayout()
+        layout.addWidget(self.sampling_mode_combobox, 0, 0, 1, 2)
+        layout.addWidget(self.scatter_density_spinbox, 1, 0)
+        layout.addWidget(self.scatter_density_label, 1, 1)
+        layout.addWidget(self.min_distance_spinbox, 2, 0)
+        layout.addWidget(self.min_distance_label, 2, 1)
+        layout.setColumnStretch(2, 100)
+        return layout
+
+    def _create_output_mode_combobox(self):
+        self.output_mode_combobox = QtWidgets.QComboBox()
+        self.output_mode_combobox.addItem("Instance transforms",
+                                          OUTPUT_TRANSFORMS)
+        self.output_mode_combobox.addItem("Particle instancer",
+                                          OUTPUT_INSTANCER)
+        self.output_mode_label = QtWidgets.QLabel("Output")
+
+        layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.output_mode_combobox)
+        layout.addWidget(self.output_mode_label)
+        layout.addStretch()
+        return layout
+
+    def _create_seed_ui(self):
+        self.fixed_seed_checkbox = QtWidgets.QCheckBox("Fixed seed")
+        self.fixed_seed_checkbox.setToolTip(
+            "Scatter the same way every time. Only scatters with a fixed "
+            "seed are cached.")
+        self.seed_spinbox = QtWidgets.QSpinBox()
+        self.seed_spinbox.setRange(0, MAX_SEED)
+        self.seed_spinbox.setFixedWidth(100)
+        self.seed_spinbox.setToolTip("Scatters without a fixed seed fill "
+                                     "in the seed they used")
 
         layout = QtWidgets.QHBoxLayout()
-        layout.addWidget(self.scatter_density_spinbox)
-        layout.addWidget(self.scatter_density_label)
+        layout.addWidget(self.fixed_seed_checkbox)
+        layout.addWidget(self.seed_spinbox)
         layout.addStretch()
         return layout
 
@@ -131,7 +190,25 @@ class ScatterUI(QtWidgets.QDialog):
         self.sources_selected_label.setAlignment(QtCore.Qt.AlignCenter)
 
         self.scatter_button = QtWidgets.QPushButton("Scatter")
+        self.scatter_button.setToolTip(
+            "Scatter in steps of {0} instances, so Maya stays responsive. "
+            "Ctrl+Z undoes one step at a time, Undo removes the whole "
+            "scatter".format(CHUNK_SIZE))
         self.undo_button = QtWidgets.QPushButton("Undo")
+        self.undo_button.setToolTip(
+            "Delete the last scatter in one step, however many steps it "
+            "took")
+        self.reapply_button = QtWidgets.QPushButton("Reapply")
+        self.reapply_button.setToolTip("Bring back the last undone scatter")
+        self.reapply_button.setEnabled(False)
+        self.export_button = QtWidgets.QPushButton("Export...")
+        self.export_button.setToolTip(
+            "Write the instances of the last scatter to a point cache or "
+            "CSV file")
+        self.export_button.setEnabled(False)
+        self.import_button = QtWidgets.QPushButton("Import...")
+        self.import_button.setToolTip("Scatter the instances of a point "
+                                      "cache again")
 
         layout = QtWidgets.QGridLayout()
         layout.addWidget(self.set_scatter_targets_button, 0, 0)
@@ -145,6 +222,70 @@ class ScatterUI(QtWidgets.QDialog):
 
         layout.addWidget(self.scatter_button, 3, 0)
         layout.addWidget(self.undo_button, 3, 1)
+        layout.addWidget(self.reapply_button, 4, 0)
+        layout.addWidget(self.export_button, 4, 1)
+        layout.addWidget(self.import_button, 5, 1)
+        return layout
+
+    def _create_cull_ui(self):
+        self.cull_camera_line_edit = QtWidgets.QLineEdit()
+        self.cull_camera_line_edit.setFixedWidth(100)
+        self.cull_distance_spinbox = self._create_vector_component_spinbox()
+        self.cull_distance_spinbox.setMinimum(0)
+        self.cull_distance_spinbox.setMaximum(1000000)
+        self.cull_distance_spinbox.setFixedWidth(80)
+        self.cull_distance_spinbox.setToolTip("0 keeps every distance")
+        self.cull_frustum_checkbox = QtWidgets.QCheckBox("Frustum")
+        self.cull_lod_checkbox = QtWidgets.QCheckBox("LOD")
+        self.cull_lod_checkbox.setToolTip(
+            "Use the sources as levels of detail, the most detailed first, "
+            "in even bands up to the distance, or to the farthest kept "
+            "instance at 0")
+        self.cull_button = QtWidgets.QPushButton("Cull")
+        self.cull_button.setToolTip(
+            "Keep what the camera sees of the last scatter. Cull again "
+            "after moving the camera.")
+        self.cull_button.setEnabled(False)
+
+        layout = QtWidgets.QGridLayout()
+        layout.addWidget(QtWidgets.QLabel("Camera"), 0, 0)
+        layout.addWidget(self.cull_camera_line_edit, 0, 1)
+        layout.addWidget(QtWidgets.QLabel("Max distance"), 0, 2)
+        layout.addWidget(self.cull_distance_spinbox, 0, 3)
+        layout.addWidget(self.cull_frustum_checkbox, 1, 0)
+        layout.addWidget(self.cull_lod_checkbox, 1, 1)
+        layout.addWidget(self.cull_button, 1, 2, 1, 2)
+        return layout
+
+    def _create_progress_ui(self):
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.scatter_status_label = QtWidgets.QLabel("")
+        self.scatter_timer = QtCore.QTimer(self)
+        self.scatter_timer.setInterval(0)
+        self.profile_checkbox = QtWidgets.QCheckBox("Profile")
+        self.profile_checkbox.setToolTip(
+            "Time every phase of the scatter and save a cProfile dump")
+        self.profile_label = QtWidgets.QLabel("")
+        self.profile_label.setTextInteractionFlags(
+            QtCore.Qt.TextSelectableByMouse)
+        self.cache_label = QtWidgets.QLabel("")
+        self.cache_label.setToolTip(
+            "Scatters with a fixed seed are cached, and reused when "
+            "scattered again with the same settings")
+        self.disk_cache_checkbox = QtWidgets.QCheckBox("Cache on disk")
+        self.disk_cache_checkbox.setToolTip(
+            "Also keep cached scatters in " + RESULT_CACHE_FOLDER)
+
+        layout = QtWidgets.QGridLayout()
+        layout.addWidget(self.progress_bar, 0, 0)
+        layout.addWidget(self.cancel_button, 0, 1)
+        layout.addWidget(self.scatter_status_label, 1, 0)
+        layout.addWidget(self.profile_checkbox, 1, 1)
+        layout.addWidget(self.profile_label, 2, 0, 1, 2)
+        layout.addWidget(self.cache_label, 3, 0)
+        layout.addWidget(self.disk_cache_checkbox, 3, 1)
         return layout
 
     def create_connections(self):
@@ -159,8 +300,19 @@ class ScatterUI(QtWidgets.QDialog):
         self.select_scatter_sources_button.clicked.connect(
             self.scatterer.select_scatter_sources)
 
+        self.sampling_mode_combobox.currentIndexChanged.connect(
+            self._update_sampling_mode_ui)
+        self.fixed_seed_checkbox.toggled.connect(
+            self.seed_spinbox.setEnabled)
+
         self.scatter_button.clicked.connect(self._scatter)
-        self.undo_button.clicked.connect(self.scatterer.delete_scatters)
+        self.cancel_button.clicked.connect(self._cancel_scatter)
+        self.scatter_timer.timeout.connect(self._step_scatter)
+        self.undo_button.clicked.connect(self._undo_scatter)
+        self.reapply_button.clicked.connect(self._reapply_scatter)
+        self.export_button.clicked.connect(self._export_scatter)
+        self.import_button.clicked.connect(self._import_scatter)
+        self.cull_button.clicked.connect(self._cull_scatter)
         return
 
     def _set_scatter_targets(self):
@@ -173,11 +325,124 @@ class ScatterUI(QtWidgets.QDialog):
         self.sources_selected_label.setText(
             str(len(self.scatterer.scatter_sources)) + " sources selected")
 
+    def _update_sampling_mode_ui(self):
+        mode = self.sampling_mode_combobox.currentData()
+        if mode == scattercore.SAMPLE_VERTICES:
+            self.scatter_density_spinbox.setMaximum(1)
+            self.scatter_density_label.setText("Fraction of vertices to "
+                                               "scatter")
+        else:
+            self.scatter_density_spinbox.setMaximum(100)
+            self.scatter_density_label.setText("Points per target vertex")
+        self.min_distance_spinbox.setEnabled(
+            mode == scattercore.SAMPLE_POISSON)
+
     def _scatter(self):
         self._set_scatter_properties_from_ui()
-        self.scatterer.scatter()
-        self._set_scatter_properties_from_ui()
-        return
+        self._start_scatter(self.scatterer.scatter_job())
+
+    def _reapply_scatter(self):
+        self._start_scatter(self.scatterer.reapply_job())
+
+    def _cull_scatter(self):
+        self._set_cull_properties_from_ui()
+        self._start_scatter(self.scatterer.cull_job())
+
+    def _start_scatter(self, job):
+        self.scatter_job = job
+        self.scatter_button.setEnabled(False)
+        self.undo_button.setEnabled(False)
+        self.reapply_button.setEnabled(False)
+        self.export_button.setEnabled(False)
+        self.cull_button.setEnabled(False)
+        self.import_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.progress_bar.setValue(0)
+        self.scatter_status_label.setText("Scattering...")
+        self.profile_label.setText("")
+        self.scatter_timer.start()
+
+    def _step_scatter(self):
+        if self.scatter_job.step():
+            if self.scatter_job.total is None:
+                self.progress_bar.setRange(0, 0)
+            else:
+                self.progress_bar.setRange(0, self.scatter_job.total)
+                self.progress_bar.setValue(self.scatter_job.done)
+        else:
+            self._finish_scatter()
+
+    def _cancel_scatter(self):
+        self.scatter_job.cancel()
+        self._finish_scatter()
+
+    def _finish_scatter(self):
+        self.scatter_timer.stop()
+        self.scatter_button.setEnabled(True)
+        self.import_button.setEnabled(True)
+        self._update_batch_buttons()
+        self.cancel_button.setEnabled(False)
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(0 if self.scatter_job.cancelled else 1)
+        self.scatter_status_label.setText(
+            "{verb} {done} instances in {seconds:.2f}s ({rate:.0f}/s)".format(
+                verb="Cancelled after" if self.scatter_job.cancelled
+                else "Scattered",
+                done=self.scatter_job.done,
+                seconds=self.scatter_job.seconds,
+                rate=self.scatter_job.instances_per_second))
+        batch = self.scatter_job.batch
+        if batch is None:
+            # Cancelled before the first step, so nothing was made.
+            self.scatter_status_label.setText("Cancelled")
+        else:
+            stats = batch.stats()
+            if not self.fixed_seed_checkbox.isChecked() and \
+                    stats["seed"] is not None:
+                self.seed_spinbox.setValue(stats["seed"])
+            self.scatter_status_label.setText(
+                self.scatter_status_label.text() +
+                ", seed {seed}, {kb:.0f} KB".format(
+                    seed=stats["seed"], kb=stats["nbytes"] / 1024.0))
+        self._update_cache_label()
+        profile = self.scatter_job.profile
+        if profile is not None:
+            self.profile_label.setText("\n".join(
+                profile.summary(PROFILE_SUMMARY_LINES) +
+                ["Saved to " + profile.dump_path]))
+
+    def _update_cache_label(self):
+        cache = self.scatterer.result_cache
+        self.cache_label.setText(
+            "Result cache: {0} hits, {1} misses".format(cache.hits,
+                                                        cache.misses))
+
+    def _undo_scatter(self):
+        self.scatterer.delete_scatters()
+        self._update_batch_buttons()
+
+    def _update_batch_buttons(self):
+        self.undo_button.setEnabled(bool(self.scatterer.scatter_instances))
+        self.export_button.setEnabled(
+            bool(self.scatterer.scatter_instances))
+        self.cull_button.setEnabled(bool(self.scatterer.scatter_instances))
+        self.reapply_button.setEnabled(
+            bool(self.scatterer.deleted_scatters))
+
+    def _export_scatter(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export Scatter", "",
+            "Point caches (*.pcache);;CSV files (*.csv)")
+        if path:
+            self.scatterer.export_scatter(path)
+            log.info("Exported %s to %s",
+                     self.scatterer.scatter_instances[-1].group, path)
+
+    def _import_scatter(self):
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Import Scatter", "", "Point caches (*.pcache)")
+        if path:
+            self._start_scatter(self.scatterer.import_job(path))
 
     def _set_ui_properties_from_scatter(self):
         i = 0
@@ -191,6 +456,29 @@ class ScatterUI(QtWidgets.QDialog):
 
         self.alignment_button.setChecked(self.scatterer.alignment)
         self.scatter_density_spinbox.setValue(self.scatterer.scatter_density)
+        self.sampling_mode_combobox.setCurrentIndex(
+            self.sampling_mode_combobox.findData(
+                self.scatterer.sampling_mode))
+        self.min_distance_spinbox.setValue(self.scatterer.min_distance)
+        self._update_sampling_mode_ui()
+        self.output_mode_combobox.setCurrentIndex(
+            self.output_mode_combobox.findData(self.scatterer.output_mode))
+        self.fixed_seed_checkbox.setChecked(self.scatterer.seed is not None)
+        self.seed_spinbox.setEnabled(self.scatterer.seed is not None)
+        self.seed_spinbox.setValue(self.scatterer.seed or 0)
+        self.cull_camera_line_edit.setText(self.scatterer.cull_camera)
+        self.cull_distance_spinbox.setValue(self.scatterer.cull_distance)
+        self.cull_frustum_checkbox.setChecked(self.scatterer.cull_frustum)
+        self.cull_lod_checkbox.setChecked(self.scatterer.cull_lod)
+        self.disk_cache_checkbox.setChecked(
+            self.scatterer.result_cache.folder is not None)
+        self._update_cache_label()
+
+    def _set_cull_properties_from_ui(self):
+        self.scatterer.cull_camera = self.cull_camera_line_edit.text()
+        self.scatterer.cull_distance = self.cull_distance_spinbox.value()
+        self.scatterer.cull_frustum = self.cull_frustum_checkbox.isChecked()
+        self.scatterer.cull_lod = self.cull_lod_checkbox.isChecked()
 
     def _set_scatter_properties_from_ui(self):
         i = 0
@@ -204,123 +492,17 @@ class ScatterUI(QtWidgets.QDialog):
 
         self.scatterer.alignment = self.alignment_button.checkState()
         self.scatterer.scatter_density = self.scatter_density_spinbox.value()
-
-
-def random_between_two_vectors(vec1, vec2):
-    result = [0, 0, 0]
-    result[0] = random.uniform(vec1[0], vec2[0])
-    result[1] = random.uniform(vec1[1], vec2[1])
-    result[2] = random.uniform(vec1[2], vec2[2])
-    return result
-
-
-class Scatterer(object):
-
-    def __init__(self):
-        self.scatter_targets = []
-        self.scatter_sources = []
-        self.scatter_instances = []
-        self.alignment = True
-        self.scatter_density = 1
-
-        # Scale Min    X Y Z
-        # Scale Max    X Y Z
-        # Rotation Min X Y Z
-        # Rotation Max X Y Z
-        # Position Min X Y Z
-        # Position Max X Y Z
-        w, h = 3, 6
-        self.attribute_array = [[0 for x in range(w)] for y in range(h)]
-        self.attribute_array[0] = [1, 1, 1]
-        self.attribute_array[1] = [1, 1, 1]
-
-    def set_scatter_targets(self):
-        self.scatter_targets = pmc.ls(os=True, fl=True)
-
-    def add_scatter_targets(self):
-        self.scatter_targets.extend(pmc.ls(os=True, fl=True))
-
-    def select_scatter_targets(self):
-        pmc.select(self.scatter_targets)
-
-    def set_scatter_sources(self):
-        self.scatter_sources = pmc.ls(os=True, fl=True)
-
-    def add_scatter_sources(self):
-        self.scatter_sources.extend(pmc.ls(os=True, fl=True))
-
-    def select_scatter_sources(self):
-        pmc.select(self.scatter_sources)
-
-    def scatter(self):
-        all_vertexes = []
-        self.scatter_instances.append([])
-
-        for target in self.scatter_targets:
-            if type(target) == pmc.general.MeshVertex:
-                all_vertexes.append(target)
-            else:
-                all_vertexes.extend(target.vtx)
-
-        vertexes = range(len(all_vertexes))
-        random.shuffle(vertexes)
-        vertexes = vertexes[:int(self.scatter_density * len(vertexes))]
-
-        for i in vertexes:
-            vertex = all_vertexes[i]
-
-            # Get the average normal of the vertex
-            # pmc.select(vertex, r=True)
-            # a = pmc.polyNormalPerVertex(q=True, xyz=True)
-            # num_normals = len(a) / 3
-            # average_normal = [0, 0, 0]
-            # i = 0
-            # while i < len(a):
-            #     average_normal[i % 3] += a[i] / num_normals
-            #     i += 1
-            # # print(average_normal)
-
-            new_instance = pmc.instance(random.choice(self.scatter_sources))
-            self.scatter_instances[-1].append(new_instance)
-
-            position = pmc.pointPosition(vertex, w=True)
-            pmc.move(position[0], position[1], position[2],
-                     new_instance, a=True, ws=True)
-
-            if self.alignment:
-                pmc.normalConstraint(vertex, new_instance)
-                pmc.normalConstraint(vertex, new_instance, rm=True)
-
-            scale = random_between_two_vectors(
-                self.attribute_array[0], self.attribute_array[1])
-            rotation = random_between_two_vectors(
-                self.attribute_array[2], self.attribute_array[3])
-            position = random_between_two_vectors(
-                self.attribute_array[4], self.attribute_array[5])
-
-            pmc.scale(new_instance,
-                      scale[0], scale[1], scale[2],
-                      r=True)
-            pmc.rotate(new_instance,
-                       rotation[0], rotation[1], rotation[2],
-                       r=True)
-            pmc.move(position[0], position[1], position[2],
-                     new_instance,
-                     r=True, os=True, wd=True)
-
-        # hello = cmds.polyListComponentConversion(tv=True)
-        # print(hello[0])
-
-        # vertices = cmds.polyEvaluate(scatter_target, v=True)
-        # i = 0
-        # while i < vertices:
-        #     print(scatter_target.vtx)
-        #     i += 1
-        #print(cmds.filterExpand(selectionMask=31))
-        #self.scatterTargetsVertices.append(vertices)
-
-        return
-
-    def delete_scatters(self):
-        if len(self.scatter_instances) > 0:
-            pmc.delete(self.scatter_instances.pop(-1))
+        self.scatterer.sampling_mode = \
+            self.sampling_mode_combobox.currentData()
+        self.scatterer.min_distance = self.min_distance_spinbox.value()
+        self.scatterer.output_mode = self.output_mode_combobox.currentData()
+        self.scatterer.seed = None
+        if self.fixed_seed_checkbox.isChecked():
+            self.scatterer.seed = self.seed_spinbox.value()
+        self.scatterer.profiling = self.profile_checkbox.isChecked()
+        self.scatterer.result_cache.folder = (
+            RESULT_CACHE_FOLDER if self.disk_cache_checkbox.isChecked()
+            else None)
+        self.scatterer.profile_path = os.path.join(
+            tempfile.gettempdir(),
+            time.strftime("scatter_%Y%m%d_%H%M%S.prof"))
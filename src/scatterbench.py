@@ -0,0 +1,262 @@
+"""Headless benchmark of the scatter core.
+
+Times the Maya independent part of a scatter on synthetic meshes and
+reports throughput and peak memory, so it can run on a plain CI box:
+
+    python scatterbench.py --sizes 1000 100000 1000000
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import scattercore
+import scatterpool
+
+ATTRIBUTE_ARRAY = [[0.5, 0.5, 0.5], [1.5, 1.5, 1.5],
+                   [-180, -180, -180], [180, 180, 180],
+                   [-0.1, -0.1, -0.1], [0.1, 0.1, 0.1]]
+
+
+class SyntheticMeshReader(object):
+    """Stands in for the OpenMaya reader with a bumpy square grid."""
+
+    def __init__(self, vertex_count, seed=0):
+        side = max(int(round(math.sqrt(vertex_count))), 2)
+        self.vertex_count = side * side
+        rng = random.Random(seed)
+        self.positions, self.normals, self.triangles = [], [], []
+        for i in range(self.vertex_count):
+            x, z = divmod(i, side)
+            self.positions.extend((x, rng.uniform(-0.2, 0.2), z))
+            self.normals.extend((rng.uniform(-0.1, 0.1), 1.0,
+                                 rng.uniform(-0.1, 0.1)))
+        for x in range(side - 1):
+            for z in range(side - 1):
+                corner = x * side + z
+                self.triangles.extend((corner, corner + 1, corner + side,
+                                       corner + 1, corner + side + 1,
+                                       corner + side))
+
+    def read_mesh(self, mesh_name):
+        return self.positions, self.normals
+
+    def read_triangles(self, mesh_name):
+        return self.triangles
+
+    def signature(self, mesh_name):
+        return ("|" + mesh_name, self.vertex_count)
+
+
+class PhaseTimer(object):
+
+    def __init__(self):
+        self.phases = []
+
+    def time(self, name, func, *args):
+        start = time.time()
+        result = func(*args)
+        self.phases.append((name, time.time() - start))
+        return result
+
+    @property
+    def total(self):
+        return sum(seconds for _, seconds in self.phases)
+
+
+def _start_memory_tracking(trace):
+    if trace and tracemalloc is not None:
+        tracemalloc.start()
+
+
+def _peak_memory_mb():
+    """Returns the traced peak, or the process high water mark."""
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak / 1024.0 / 1024.0
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_scatter(vertex_count, density=1.0, align=True, seed=0,
+                trace_memory=True, strategy=scattercore.SAMPLING_AUTO,
+                mode=scattercore.SAMPLE_VERTICES, min_distance=0.0,
+                reader=None):
+    """Runs one scatter without touching a scene.
+
+    tracemalloc slows down the pure Python fallback a lot, so it can be
+    turned off to time that path. Passing the MeshCache of an earlier
+    run times a re-scatter with only the parameters changed.
+
+    Returns
+        dict: The phase timings, throughput and peak memory of the run
+    """
+    if reader is None:
+        reader = SyntheticMeshReader(vertex_count, seed)
+    settings = scattercore.ScatterSettings(
+        ATTRIBUTE_ARRAY, density, align, seed, strategy, mode, min_distance)
+    timer = PhaseTimer()
+    _start_memory_tracking(trace_memory)
+    samples, plan = timer.time("plan", _plan, reader, settings)
+    matrices = timer.time("transforms", scattercore.plan_transforms,
+                          samples, plan, align)
+    timer.time("decompose", scattercore.decompose_transforms, matrices)
+    peak = _peak_memory_mb()
+    return {
+        "vertices": vertex_count,
+        "instances": len(plan),
+        "phases": dict(timer.phases),
+        "seconds": timer.total,
+        "instances_per_second": len(plan) / max(timer.total, 1e-9),
+        "peak_memory_mb": peak,
+    }
+
+
+def run_parallel(vertex_count, target_count, workers, density=1.0,
+                 align=True, seed=0, mode=scattercore.SAMPLE_VERTICES,
+                 min_distance=0.0):
+    """Times the compute phase of a multi-target scatter over workers.
+
+    The meshes are read into a cache before timing, as they would be by
+    an earlier scatter, and the worker pool is started before timing
+    too, so only sampling, transforms and handing the meshes to the
+    workers are measured. Starting the pool is reported on its own.
+
+    Returns
+        dict: The timing and throughput of the run
+    """
+    reader = scattercore.MeshCache(SyntheticMeshReader(vertex_count, seed))
+    targets = ["benchMesh{0}".format(i) for i in range(target_count)]
+    for target in targets:
+        reader.mesh_data(target)
+    settings = scattercore.ScatterSettings(
+        ATTRIBUTE_ARRAY, density, align, seed, mode=mode,
+        min_distance=min_distance)
+    pool = None
+    pool_seconds = 0.0
+    if workers > 1 and scatterpool.parallel_available():
+        start = time.time()
+        pool = scatterpool.start_pool(workers)
+        pool_seconds = time.time() - start
+    try:
+        start = time.time()
+        instances = sum(len(matrices) for _, matrices in
+                        scatterpool.iter_target_transforms(
+                            targets, reader, 4, settings, workers, pool))
+        seconds = time.time() - start
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+    return {
+        "targets": target_count,
+        "workers": workers,
+        "instances": instances,
+        "pool_seconds": pool_seconds,
+        "seconds": seconds,
+        "instances_per_second": instances / max(seconds, 1e-9),
+    }
+
+
+def _plan(reader, settings):
+    return next(scattercore.iter_plans(["benchMesh"], reader, 4, settings))
+
+
+def _run_sizes(args):
+    results = []
+    for size in args.sizes:
+        cache = scattercore.MeshCache(SyntheticMeshReader(size, args.seed))
+        for _ in range(args.repeat):
+            result = run_scatter(size, args.density, args.align, args.seed,
+                                 args.trace_memory, args.strategy, args.mode,
+                                 args.min_distance, cache)
+            _print_result(result)
+            results.append(result)
+    return results
+
+
+def _run_parallel_sizes(args):
+    results = []
+    for size in args.sizes:
+        baseline = None
+        for workers in args.workers:
+            result = run_parallel(size, args.targets, workers, args.density,
+                                  args.align, args.seed, args.mode,
+                                  args.min_distance)
+            baseline = baseline or result["seconds"]
+            result["speedup"] = baseline / max(result["seconds"], 1e-9)
+            print("{targets} targets  {workers} workers  "
+                  "{instances:>9d} instances  {seconds:8.3f}s  "
+                  "{instances_per_second:12.0f}/s  "
+                  "x{speedup:.2f}  pool start {pool_seconds:.2f}s".format(
+                      **result))
+            results.append(result)
+    return results
+
+
+def _print_result(result):
+    phases = "  ".join("{0} {1:.3f}s".format(name, seconds)
+                       for name, seconds in sorted(result["phases"].items()))
+    print("{instances:>9d} instances  {seconds:8.3f}s  "
+          "{instances_per_second:12.0f}/s  {peak_memory_mb:8.1f} MB  "
+          "".format(**result) + phases)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 100000, 1000000])
+    parser.add_argument("--density", type=float, default=1.0)
+    parser.add_argument("--no-align", dest="align", action="store_false")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--strategy", default=scattercore.SAMPLING_AUTO,
+                        choices=[scattercore.SAMPLING_AUTO,
+                                 scattercore.SAMPLING_SPARSE,
+                                 scattercore.SAMPLING_SHUFFLE])
+    parser.add_argument("--no-trace-memory", dest="trace_memory",
+                        action="store_false",
+                        help="Report the process high water mark instead "
+                             "of tracing allocations")
+    parser.add_argument("--mode", default=scattercore.SAMPLE_VERTICES,
+                        choices=[scattercore.SAMPLE_VERTICES,
+                                 scattercore.SAMPLE_AREA,
+                                 scattercore.SAMPLE_POISSON])
+    parser.add_argument("--min-distance", type=float, default=0.0)
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Scatter every size this many times, reusing "
+                             "the cached mesh data")
+    parser.add_argument("--targets", type=int, default=0,
+                        help="Instead time the compute phase of a scatter "
+                             "over this many target meshes of each size")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, 4, 8],
+                        help="Worker counts to time with --targets")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--fail-below", type=float, default=0,
+                        help="Exit with an error if any run is slower than "
+                             "this many instances per second")
+    args = parser.parse_args(argv)
+
+    print("numpy: {0}".format("yes" if scattercore.np is not None else "no"))
+    if args.targets:
+        results = _run_parallel_sizes(args)
+    else:
+        results = _run_sizes(args)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+    slow = [r for r in results
+            if r["instances"] and r["instances_per_second"] < args.fail_below]
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
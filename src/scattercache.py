@@ -0,0 +1,115 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+
+import scattercore
+
+log = logging.getLogger(__name__)
+
+RESULT_CACHE_BYTES = 256 * 1024 * 1024
+# Part of every key, to change whenever the same settings start to give
+# other transforms, so results cached on disk before are not used.
+KEY_VERSION = 4
+
+
+def result_key(reader, targets, sources, settings, source_matrices=None):
+    """Hashes everything a scatter's transforms depend on.
+
+    Targets are identified by a digest of the positions and normals of
+    their meshes, so any edit to a mesh gives a new key, and so do
+    meshes of the same name in other scenes. Through reader, a
+    MeshCache, a mesh is only read and hashed again once it changed.
+    source_matrices are the world matrices of the sources, whose scale
+    and rotation the instances keep.
+
+    Returns
+        str: The key, or None if the scatter can not be cached
+    """
+    if settings.seed is None:
+        return None
+    digests = [scattercore.mesh_digest(reader, name) for name, _ in
+               scattercore.parse_scatter_targets(targets)]
+    payload = json.dumps([
+        KEY_VERSION, digests, list(targets), list(sources),
+        [list(row) for row in settings.attribute_array],
+        bool(settings.alignment), settings.density, settings.seed,
+        settings.strategy, settings.mode, settings.min_distance,
+        source_matrices], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+    """Keeps the transforms of recent scatters by their result_key.
+
+    Past max_bytes the least recently used scatters are dropped. Given a
+    folder, every scatter is also kept there as a point cache, which
+    outlives the session.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES, folder=None):
+        self.max_bytes = max_bytes
+        self.folder = folder
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        """Returns the ScatterBatch stored under key, or None."""
+        batch = self._entries.pop(key, None)
+        if batch is None:
+            batch = self._read(key)
+        if batch is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries[key] = batch
+        self._evict(key)
+        return batch
+
+    def put(self, key, batch):
+        self._entries.pop(key, None)
+        self._entries[key] = batch
+        self._evict(key)
+        self._write(key, batch)
+
+    @property
+    def nbytes(self):
+        return sum(batch.nbytes for batch in self._entries.values())
+
+    def clear(self):
+        self._entries.clear()
+
+    def _evict(self, keep):
+        while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            del self._entries[key]
+
+    def _path(self, key):
+        import pointcache
+        return os.path.join(self.folder, key + pointcache.EXTENSION)
+
+    def _read(self, key):
+        if not self.folder or not os.path.exists(self._path(key)):
+            return None
+        import pointcache
+        try:
+            with pointcache.PointCache(self._path(key)) as cache:
+                return cache.to_batch()
+        except (IOError, OSError, ValueError) as err:
+            log.warning("Could not read cached scatter %s: %s", key, err)
+            return None
+
+    def _write(self, key, batch):
+        if not self.folder:
+            return
+        import pointcache
+        try:
+            if not os.path.isdir(self.folder):
+                os.makedirs(self.folder)
+            pointcache.write_batch(batch, self._path(key))
+        except (IOError, OSError) as err:
+            log.warning("Could not cache scatter %s: %s", key, err)
@@ -0,0 +1,273 @@
+"""Runs scatters from a recipe file, headless, for farm jobs.
+
+    mayapy scattercli.py recipe.json [recipe.yaml ...]
+
+A recipe lists scenes, and for each scene the scatters to run in it:
+
+    {
+        "defaults": {"density": 0.5, "seed": 1, "output_mode": "instancer"},
+        "scenes": [
+            {
+                "scene": "/shots/sh010/scenes/sh010_layout_v003.ma",
+                "output": "/shots/sh010/scenes/sh010_scatter_v001.ma",
+                "scatters": [
+                    {"targets": ["ground"], "sources": ["rock1", "rock2"],
+                     "scale": [[0.5, 0.5, 0.5], [2, 2, 2]],
+                     "rotation": [[0, -180, 0], [0, 180, 0]]}
+                ]
+            }
+        ]
+    }
+
+Every scene is opened, scattered and saved in the same interpreter. No
+Qt module is imported, and Maya is only loaded once a scene is run.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from scenefile import SCENE_TYPES
+
+log = logging.getLogger(__name__)
+
+ATTRIBUTE_ROWS = ("scale", "rotation", "position")
+SCATTER_DEFAULTS = {
+    "alignment": True,
+    "density": 1.0,
+    "seed": None,
+    "output_mode": "transforms",
+    "sampling_mode": "vertices",
+    "min_distance": 0.0,
+    "streaming": False,
+    "workers": 1,
+    "scale": [[1, 1, 1], [1, 1, 1]],
+    "rotation": [[0, 0, 0], [0, 0, 0]],
+    "position": [[0, 0, 0], [0, 0, 0]],
+}
+SCATTER_KEYS = set(SCATTER_DEFAULTS) | {"targets", "sources"}
+
+
+class RecipeError(ValueError):
+    """Raised when a recipe file is not valid."""
+
+
+class ScatterSpec(object):
+    """One scatter to run in a scene."""
+
+    def __init__(self, targets, sources, **settings):
+        self.targets = targets
+        self.sources = sources
+        self.settings = settings
+
+    @classmethod
+    def from_dict(cls, data, defaults=None):
+        values = dict(SCATTER_DEFAULTS)
+        values.update(defaults or {})
+        values.update(data)
+        unknown = set(values) - SCATTER_KEYS
+        if unknown:
+            raise RecipeError("Unknown scatter settings: " +
+                              ", ".join(sorted(unknown)))
+        for key in ("targets", "sources"):
+            if not values.get(key):
+                raise RecipeError("A scatter needs at least one of " + key)
+            if not isinstance(values[key], list):
+                raise RecipeError(key + " must be a list of node names")
+        for key in ATTRIBUTE_ROWS:
+            rows = values[key]
+            if len(rows) != 2 or any(len(row) != 3 for row in rows):
+                raise RecipeError(key + " must be a [min, max] pair of "
+                                  "3d vectors")
+        return cls(values.pop("targets"), values.pop("sources"), **values)
+
+    @property
+    def attribute_array(self):
+        """The settings as rows of a Scatterer attribute_array."""
+        rows = []
+        for key in ATTRIBUTE_ROWS:
+            rows.extend([list(row) for row in self.settings[key]])
+        return rows
+
+    def apply(self, scatterer):
+        """Sets up a Scatterer to run this scatter."""
+        scatterer.scatter_targets = list(self.targets)
+        scatterer.scatter_sources = list(self.sources)
+        scatterer.attribute_array = self.attribute_array
+        scatterer.alignment = self.settings["alignment"]
+        scatterer.scatter_density = self.settings["density"]
+        scatterer.seed = self.settings["seed"]
+        scatterer.output_mode = self.settings["output_mode"]
+        scatterer.sampling_mode = self.settings["sampling_mode"]
+        scatterer.min_distance = self.settings["min_distance"]
+        scatterer.streaming = self.settings["streaming"]
+        scatterer.workers = self.settings["workers"]
+
+
+class SceneJob(object):
+    """A scene to open, the scatters to run in it and where to save it."""
+
+    def __init__(self, scene, output, scatters):
+        self.scene = scene
+        self.output = output
+        self.scatters = scatters
+
+    @classmethod
+    def from_dict(cls, data, defaults=None, folder=""):
+        if "scene" not in data:
+            raise RecipeError("Every scene entry needs a \"scene\" path")
+        scene = os.path.join(folder, data["scene"])
+        output = data.get("output")
+        if output:
+            output = os.path.join(folder, output)
+        else:
+            stem, ext = os.path.splitext(scene)
+            output = stem + "_scattered" + ext
+        if os.path.splitext(output)[1] not in SCENE_TYPES:
+            raise RecipeError("Can not save a scene as " + output)
+        scatters = [ScatterSpec.from_dict(scatter, defaults)
+                    for scatter in data.get("scatters", [])]
+        return cls(scene, output, scatters)
+
+
+def parse_recipe(data, folder=""):
+    """Turns the contents of a recipe into scene jobs.
+
+    Relative scene paths are relative to folder.
+
+    Returns
+        list: The SceneJob of every scene in the recipe
+    """
+    if not isinstance(data, dict) or "scenes" not in data:
+        raise RecipeError("A recipe needs a \"scenes\" list")
+    defaults = data.get("defaults", {})
+    return [SceneJob.from_dict(scene, defaults, folder)
+            for scene in data["scenes"]]
+
+
+def load_recipe(path):
+    """Reads a JSON or YAML recipe file.
+
+    Returns
+        list: The SceneJob of every scene in the recipe
+    """
+    with open(path) as recipe_file:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            if yaml is None:
+                raise RecipeError("PyYAML is needed to read " + path)
+            data = yaml.safe_load(recipe_file)
+        else:
+            data = json.load(recipe_file)
+    return parse_recipe(data, os.path.dirname(os.path.abspath(path)))
+
+
+class MayaSession(object):
+    """Opens and saves scenes in a standalone Maya."""
+
+    def __init__(self):
+        self._cmds = None
+
+    @property
+    def cmds(self):
+        if self._cmds is None:
+            import maya.standalone
+            try:
+                maya.standalone.initialize(name="python")
+            except RuntimeError:
+                pass
+            import maya.cmds
+            self._cmds = maya.cmds
+        return self._cmds
+
+    def open_scene(self, path):
+        self.cmds.file(path, open=True, force=True)
+
+    def save_scene(self, path):
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.cmds.file(rename=path)
+        self.cmds.file(save=True, force=True,
+                       type=SCENE_TYPES[os.path.splitext(path)[1]])
+
+
+def _default_scatterer():
+    import scattermaya
+    return scattermaya.Scatterer()
+
+
+def run_jobs(jobs, session=None, scatterer_factory=_default_scatterer):
+    """Opens, scatters and saves every scene, one after the other.
+
+    A scene that fails is logged and skipped, the others still run.
+
+    Returns
+        list: A result dict for every scene
+    """
+    session = session or MayaSession()
+    results = []
+    for job in jobs:
+        start = time.time()
+        result = {"scene": job.scene, "output": job.output, "instances": 0}
+        try:
+            session.open_scene(job.scene)
+            for spec in job.scatters:
+                scatterer = scatterer_factory()
+                spec.apply(scatterer)
+                scatter_job = scatterer.scatter_job()
+                while scatter_job.step():
+                    pass
+                result["instances"] += scatter_job.done
+            session.save_scene(job.output)
+            result["status"] = "ok"
+        except Exception as err:
+            log.exception("Scattering %s failed", job.scene)
+            result["status"] = "failed"
+            result["error"] = str(err)
+        result["seconds"] = time.time() - start
+        log.info("%s: %s, %d instances in %.1fs", job.scene,
+                 result["status"], result["instances"], result["seconds"])
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recipes", nargs="+")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only check the recipes and list the scenes")
+    parser.add_argument("--report", help="Write the results as JSON here")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose
+                        else logging.INFO)
+
+    jobs = []
+    for path in args.recipes:
+        jobs.extend(load_recipe(path))
+
+    if args.dry_run:
+        for job in jobs:
+            print("{0} -> {1} ({2} scatters)".format(
+                job.scene, job.output, len(job.scatters)))
+        return 0
+
+    results = run_jobs(jobs)
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump(results, report_file, indent=2)
+    failed = [result for result in results if result["status"] != "ok"]
+    log.info("%d of %d scenes scattered", len(results) - len(failed),
+             len(results))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1542 @@
+import array
+import bisect
+import collections
+import csv
+import hashlib
+import math
+import random
+import re
+import sys
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+WORLD_UP = (0.0, 1.0, 0.0)
+FALLBACK_UP = (0.0, 0.0, 1.0)
+
+SAMPLING_AUTO = "auto"
+SAMPLING_SPARSE = "sparse"
+SAMPLING_SHUFFLE = "shuffle"
+SPARSE_DENSITY = 0.25
+
+SAMPLE_VERTICES = "vertices"
+SAMPLE_AREA = "area"
+SAMPLE_POISSON = "poisson"
+POISSON_ATTEMPTS = 100
+
+MESH_CACHE_BYTES = 512 * 1024 * 1024
+# Digests are a few bytes each, so many more are kept than meshes.
+MESH_DIGESTS_KEPT = 1024
+PYTHON_ROW_BYTES = 150
+
+VERTEX_PATTERN = re.compile(
+    r"^(?P<node>.+)\.vtx\[(?P<start>\d+)(?::(?P<end>\d+))?\]$")
+
+
+def random_between_two_vectors(vec1, vec2, rng=random):
+    result = [0, 0, 0]
+    result[0] = rng.uniform(vec1[0], vec2[0])
+    result[1] = rng.uniform(vec1[1], vec2[1])
+    result[2] = rng.uniform(vec1[2], vec2[2])
+    return result
+
+
+def sample_attributes(attribute_array, count, seed=None):
+    """Draws the scale, rotation and position offset of every instance.
+
+    Each pair of rows in attribute_array is a min/max range. With NumPy
+    the three (count, 3) arrays come from one batched call, otherwise
+    they are drawn one instance at a time.
+
+    Returns
+        tuple: The scale, rotation and offset arrays
+    """
+    if np is not None:
+        return _sample_attributes_numpy(attribute_array, count, seed)
+    return _sample_attributes_python(attribute_array, count, seed)
+
+
+def _sample_attributes_numpy(attribute_array, count, seed):
+    rng = np.random.RandomState(seed)
+    low = np.asarray(attribute_array[0::2], dtype=np.float64)
+    high = np.asarray(attribute_array[1::2], dtype=np.float64)
+    draws = rng.uniform(low, high, size=(count, 3, 3))
+    return draws[:, 0], draws[:, 1], draws[:, 2]
+
+
+def _sample_attributes_python(attribute_array, count, seed):
+    rng = random.Random(seed)
+    scales, rotations, offsets = [], [], []
+    for _ in range(count):
+        scales.append(random_between_two_vectors(
+            attribute_array[0], attribute_array[1], rng))
+        rotations.append(random_between_two_vectors(
+            attribute_array[2], attribute_array[3], rng))
+        offsets.append(random_between_two_vectors(
+            attribute_array[4], attribute_array[5], rng))
+    return scales, rotations, offsets
+
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1],
+            a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0])
+
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def _normalize(vec):
+    length = math.sqrt(vec[0] * vec[0] + vec[1] * vec[1] + vec[2] * vec[2])
+    if length < 1e-9:
+        return None
+    return (vec[0] / length, vec[1] / length, vec[2] / length)
+
+
+def _mult_3x3(a, b):
+    return [[sum(a[i][k] * b[k][j] for k in range(3)) for j in range(3)]
+            for i in range(3)]
+
+
+def euler_to_matrix(rotation):
+    """Returns the 3x3 matrix of an xyz euler rotation in degrees.
+
+    Matrices use Maya's row vector convention, so a point is transformed
+    with point * matrix.
+    """
+    x, y, z = [math.radians(angle) for angle in rotation]
+    rot_x = [[1, 0, 0],
+             [0, math.cos(x), math.sin(x)],
+             [0, -math.sin(x), math.cos(x)]]
+    rot_y = [[math.cos(y), 0, -math.sin(y)],
+             [0, 1, 0],
+             [math.sin(y), 0, math.cos(y)]]
+    rot_z = [[math.cos(z), math.sin(z), 0],
+             [-math.sin(z), math.cos(z), 0],
+             [0, 0, 1]]
+    return _mult_3x3(_mult_3x3(rot_x, rot_y), rot_z)
+
+
+def aligned_basis(normal):
+    """Returns the rotation a normalConstraint gives for a normal.
+
+    Like the constraint defaults, the X axis aims along the normal and
+    the Y axis points as close to world up as possible. When the normal
+    is parallel to world up the Z axis is kept instead.
+    """
+    x_axis = _normalize(normal)
+    if x_axis is None:
+        return [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+    z_axis = _normalize(_cross(x_axis, WORLD_UP))
+    if z_axis is None:
+        y_axis = _normalize(_cross(FALLBACK_UP, x_axis))
+        z_axis = _cross(x_axis, y_axis)
+    else:
+        y_axis = _cross(z_axis, x_axis)
+    return [list(x_axis), list(y_axis), list(z_axis)]
+
+
+def compose_transforms(positions, normals, scales, rotations, offsets,
+                       align=True, bases=None):
+    """Builds the world matrix of every instance.
+
+    Each matrix is scale * normal alignment * random rotation, the
+    order in which the constraint path scales, aligns and then rotates
+    in world space, moved to the vertex position plus the offset in the
+    rotated axes. Without alignment, bases is the 3x3 rotation every
+    instance starts from, if any, as an instance keeps the rotation of
+    its source.
+
+    Returns
+        list: A flat 16 float world matrix for every instance
+    """
+    if np is not None:
+        return _compose_transforms_numpy(positions, normals, scales,
+                                         rotations, offsets, align, bases)
+    return _compose_transforms_python(positions, normals, scales,
+                                      rotations, offsets, align, bases)
+
+
+def _compose_transforms_python(positions, normals, scales, rotations,
+                               offsets, align, bases):
+    matrices = []
+    for i in range(len(positions)):
+        rotation = euler_to_matrix(rotations[i])
+        if align:
+            rotation = _mult_3x3(aligned_basis(normals[i]), rotation)
+        elif bases is not None:
+            rotation = _mult_3x3(bases[i], rotation)
+        matrix = []
+        for row in range(3):
+            matrix.extend([scales[i][row] * c for c in rotation[row]])
+            matrix.append(0.0)
+        for axis in range(3):
+            matrix.append(positions[i][axis] + sum(
+                offsets[i][row] * rotation[row][axis] for row in range(3)))
+        matrix.append(1.0)
+        matrices.append(matrix)
+    return matrices
+
+
+def _euler_to_matrices(rotations):
+    x, y, z = np.radians(np.asarray(rotations, dtype=np.float64)).T
+    cx, sx, cy, sy, cz, sz = (np.cos(x), np.sin(x), np.cos(y), np.sin(y),
+                              np.cos(z), np.sin(z))
+    matrices = np.empty((len(x), 3, 3))
+    matrices[:, 0, 0] = cy * cz
+    matrices[:, 0, 1] = cy * sz
+    matrices[:, 0, 2] = -sy
+    matrices[:, 1, 0] = sx * sy * cz - cx * sz
+    matrices[:, 1, 1] = sx * sy * sz + cx * cz
+    matrices[:, 1, 2] = sx * cy
+    matrices[:, 2, 0] = cx * sy * cz + sx * sz
+    matrices[:, 2, 1] = cx * sy * sz - sx * cz
+    matrices[:, 2, 2] = cx * cy
+    return matrices
+
+
+def _aligned_bases(normals):
+    normals = np.asarray(normals, dtype=np.float64)
+    lengths = np.linalg.norm(normals, axis=1)
+    valid = lengths >= 1e-9
+    x_axis = np.where(valid[:, None], normals, (1.0, 0.0, 0.0))
+    x_axis /= np.linalg.norm(x_axis, axis=1)[:, None]
+    z_axis = np.cross(x_axis, WORLD_UP)
+    z_lengths = np.linalg.norm(z_axis, axis=1)
+    parallel = z_lengths < 1e-9
+    z_axis[~parallel] /= z_lengths[~parallel][:, None]
+    y_axis = np.cross(z_axis, x_axis)
+    if parallel.any():
+        y_axis[parallel] = np.cross(FALLBACK_UP, x_axis[parallel])
+        y_axis[parallel] /= np.linalg.norm(
+            y_axis[parallel], axis=1)[:, None]
+        z_axis[parallel] = np.cross(x_axis[parallel], y_axis[parallel])
+    return np.stack((x_axis, y_axis, z_axis), axis=1)
+
+
+def _compose_transforms_numpy(positions, normals, scales, rotations,
+                              offsets, align, bases):
+    count = len(positions)
+    rotation = _euler_to_matrices(rotations)
+    if align:
+        rotation = np.matmul(_aligned_bases(normals), rotation)
+    elif bases is not None:
+        rotation = np.matmul(np.asarray(bases, dtype=np.float64), rotation)
+    matrices = np.zeros((count, 4, 4))
+    matrices[:, :3, :3] = \
+        np.asarray(scales, dtype=np.float64)[:, :, None] * rotation
+    matrices[:, 3, :3] = np.asarray(positions, dtype=np.float64) + \
+        np.einsum("ni,nij->nj", np.asarray(offsets, dtype=np.float64),
+                  rotation)
+    matrices[:, 3, 3] = 1.0
+    return matrices.reshape(count, 16)
+
+
+def decompose_transforms(matrices):
+    """Splits flat world matrices into translation, rotation and scale.
+
+    Rotations are xyz euler angles in degrees. A mirrored matrix gets a
+    negative X scale, so rebuilding it with trs_matrices gives the same
+    matrix back.
+
+    Returns
+        tuple: The translation, rotation and scale arrays
+    """
+    if np is not None:
+        return _decompose_transforms_numpy(matrices)
+    return _decompose_transforms_python(matrices)
+
+
+def _rotation_to_euler(r00, r01, r02, r10, r11, r12, r22):
+    sin_y = max(-1.0, min(1.0, -r02))
+    y = math.asin(sin_y)
+    if abs(math.cos(y)) > 1e-6:
+        x = math.atan2(r12, r22)
+        z = math.atan2(r01, r00)
+    else:
+        x = math.atan2(sin_y * r10, r11)
+        z = 0.0
+    return [math.degrees(x), math.degrees(y), math.degrees(z)]
+
+
+def _decompose_transforms_python(matrices):
+    translations, rotations, scales = [], [], []
+    for matrix in matrices:
+        rows = [matrix[0:3], matrix[4:7], matrix[8:11]]
+        scale = [math.sqrt(sum(c * c for c in row)) for row in rows]
+        rows = [[c / (length or 1.0) for c in row]
+                for row, length in zip(rows, scale)]
+        if _dot(rows[0], _cross(rows[1], rows[2])) < 0:
+            scale[0] = -scale[0]
+            rows[0] = [-c for c in rows[0]]
+        translations.append(list(matrix[12:15]))
+        rotations.append(_rotation_to_euler(
+            rows[0][0], rows[0][1], rows[0][2], rows[1][0], rows[1][1],
+            rows[1][2], rows[2][2]))
+        scales.append(scale)
+    return translations, rotations, scales
+
+
+def _decompose_transforms_numpy(matrices):
+    matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+    scales = np.linalg.norm(matrices[:, :3, :3], axis=2)
+    lengths = np.where(scales == 0, 1.0, scales)
+    rows = matrices[:, :3, :3] / lengths[:, :, None]
+    mirrored = np.linalg.det(rows) < 0
+    scales[mirrored, 0] *= -1
+    rows[mirrored, 0] *= -1
+    sin_y = np.clip(-rows[:, 0, 2], -1.0, 1.0)
+    y = np.arcsin(sin_y)
+    locked = np.abs(np.cos(y)) <= 1e-6
+    x = np.where(locked,
+                 np.arctan2(sin_y * rows[:, 1, 0], rows[:, 1, 1]),
+                 np.arctan2(rows[:, 1, 2], rows[:, 2, 2]))
+    z = np.where(locked, 0.0, np.arctan2(rows[:, 0, 1], rows[:, 0, 0]))
+    rotations = np.degrees(np.stack((x, y, z), axis=1))
+    return matrices[:, 3, :3].copy(), rotations, scales
+
+
+def trs_matrices(positions, rotations, scales):
+    """Builds world matrices from translations, xyz euler rotations in
+    degrees and scales, the reverse of decompose_transforms.
+
+    Returns
+        list: A flat 16 float world matrix for every instance
+    """
+    offsets = [(0.0, 0.0, 0.0)] * len(positions)
+    if np is not None:
+        offsets = np.zeros((len(positions), 3))
+    return compose_transforms(positions, None, scales, rotations, offsets,
+                              align=False)
+
+
+def parse_scatter_targets(targets):
+    """Groups scatter targets by the mesh they belong to.
+
+    Targets can be whole objects or vertices such as "pCube1.vtx[3]".
+
+    Returns
+        list: (mesh name, vertex indices) pairs, where the indices are
+            None if the whole mesh was selected
+    """
+    meshes = []
+    indices_by_mesh = {}
+    for target in targets:
+        name = str(target)
+        match = VERTEX_PATTERN.match(name)
+        if match:
+            name = match.group("node")
+            start = int(match.group("start"))
+            end = int(match.group("end") or start)
+            indices = range(start, end + 1)
+        else:
+            indices = None
+        if name not in indices_by_mesh:
+            meshes.append(name)
+            indices_by_mesh[name] = []
+        if indices is None or indices_by_mesh[name] is None:
+            indices_by_mesh[name] = None
+        else:
+            indices_by_mesh[name].extend(indices)
+    return [(name, indices_by_mesh[name]) for name in meshes]
+
+
+def _to_rows(flat):
+    """Turns a flat [x, y, z, x, y, z, ...] sequence into 3d rows.
+
+    Sequences that already are rows are returned as they are.
+    """
+    if np is not None:
+        return np.asarray(flat, dtype=np.float64).reshape(-1, 3)
+    if len(flat) and isinstance(flat[0], (tuple, list)):
+        return flat
+    return list(zip(flat[0::3], flat[1::3], flat[2::3]))
+
+
+def _take_rows(rows, indices):
+    if np is not None:
+        return rows[np.asarray(indices, dtype=np.intp)]
+    return [rows[i] for i in indices]
+
+
+class MeshSamples(object):
+    """Vertex positions and normals of every scatter target."""
+
+    def __init__(self):
+        self.names = []
+        self.positions = []
+        self.normals = []
+        self.vertices = []
+        self._offsets = [0]
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def add(self, name, positions, normals, vertices=None):
+        """Adds the samples of a target.
+
+        vertices holds the mesh vertex of every sample, or is True when
+        the samples are all the vertices of the mesh in order. It is None
+        for points on the surface.
+        """
+        self.names.append(name)
+        self.positions.append(positions)
+        self.normals.append(normals)
+        self.vertices.append(vertices)
+        self._offsets.append(self._offsets[-1] + len(positions))
+
+    def vertex(self, index):
+        """Looks up a vertex by its index across all targets.
+
+        Returns
+            tuple: The target name, position and normal of the vertex
+        """
+        target = bisect.bisect_right(self._offsets, index) - 1
+        local = index - self._offsets[target]
+        return (self.names[target], self.positions[target][local],
+                self.normals[target][local])
+
+    def component(self, index):
+        """Returns what a sample lies on, such as "pCube1.vtx[3]" for a
+        vertex, or the mesh name for a point on its surface."""
+        target = bisect.bisect_right(self._offsets, index) - 1
+        vertices = self.vertices[target]
+        if vertices is None:
+            return self.names[target]
+        vertex = index - self._offsets[target]
+        if vertices is not True:
+            vertex = vertices[vertex]
+        return "{0}.vtx[{1}]".format(self.names[target], int(vertex))
+
+    def gather(self, indices):
+        """Looks up many vertices by their index across all targets.
+
+        Returns
+            tuple: The positions and normals of the vertices
+        """
+        if np is not None and self.names:
+            indices = np.asarray(indices, dtype=np.intp)
+            targets = np.searchsorted(self._offsets, indices,
+                                      side="right") - 1
+            positions = np.empty((len(indices), 3))
+            normals = np.empty((len(indices), 3))
+            for target in np.unique(targets):
+                mask = targets == target
+                local = indices[mask] - self._offsets[target]
+                positions[mask] = self.positions[target][local]
+                normals[mask] = self.normals[target][local]
+            return positions, normals
+        positions, normals = [], []
+        for i in indices:
+            _, position, normal = self.vertex(i)
+            positions.append(position)
+            normals.append(normal)
+        return positions, normals
+
+
+def iter_mesh_samples(targets, reader):
+    """Reads the scatter targets one mesh at a time.
+
+    Each mesh is read with one bulk call to the reader, no matter how
+    many of its vertices are targeted.
+
+    Yields
+        MeshSamples: The vertex data of a single target mesh
+    """
+    for name, indices in parse_scatter_targets(targets):
+        yield vertex_samples(mesh_data(reader, name), indices)
+
+
+def vertex_samples(mesh, indices=None):
+    """Returns the targeted vertices of a mesh.
+
+    Returns
+        MeshSamples: The vertex data of the mesh
+    """
+    positions, normals = mesh.positions, mesh.normals
+    if indices is not None:
+        positions = _take_rows(positions, indices)
+        normals = _take_rows(normals, indices)
+    samples = MeshSamples()
+    samples.add(mesh.name, positions, normals,
+                True if indices is None else indices)
+    return samples
+
+
+def _merge_samples(samples_iter):
+    samples = MeshSamples()
+    for target_samples in samples_iter:
+        samples.add(target_samples.names[0], target_samples.positions[0],
+                    target_samples.normals[0], target_samples.vertices[0])
+    return samples
+
+
+def read_mesh_samples(targets, reader):
+    """Reads the vertex positions and normals of the scatter targets.
+
+    Returns
+        MeshSamples: The vertex data of every target
+    """
+    return _merge_samples(iter_mesh_samples(targets, reader))
+
+
+def _to_triangles(flat):
+    """Turns a flat vertex index sequence into rows of 3 indices."""
+    if np is not None:
+        return np.asarray(flat, dtype=np.intp).reshape(-1, 3)
+    flat = list(flat)
+    return list(zip(flat[0::3], flat[1::3], flat[2::3]))
+
+
+def _triangles_within(triangles, indices):
+    """Keeps the triangles whose vertices are all in indices.
+
+    The kept triangles are renumbered to the order of indices.
+    """
+    renumber = dict((index, i) for i, index in enumerate(indices))
+    kept = [tuple(renumber[v] for v in triangle) for triangle in triangles
+            if all(v in renumber for v in triangle)]
+    if np is not None:
+        return np.asarray(kept, dtype=np.intp).reshape(-1, 3)
+    return kept
+
+
+class SurfaceTable(object):
+    """The triangles of a mesh, ready for area weighted sampling.
+
+    A cumulative area table is built once, after which each sample is a
+    binary search for its triangle plus a random barycentric point.
+    """
+
+    def __init__(self, positions, normals, triangles):
+        self.positions = positions
+        self.normals = normals
+        self.triangles = triangles
+        if np is not None:
+            corners = positions[triangles] if len(triangles) else \
+                np.zeros((0, 3, 3))
+            areas = 0.5 * np.linalg.norm(np.cross(
+                corners[:, 1] - corners[:, 0],
+                corners[:, 2] - corners[:, 0]), axis=1)
+            self.cumulative_areas = np.cumsum(areas)
+        else:
+            self.cumulative_areas = []
+            total = 0.0
+            for a, b, c in triangles:
+                edge1 = [positions[b][i] - positions[a][i] for i in range(3)]
+                edge2 = [positions[c][i] - positions[a][i] for i in range(3)]
+                cross = _cross(edge1, edge2)
+                total += 0.5 * math.sqrt(sum(x * x for x in cross))
+                self.cumulative_areas.append(total)
+
+    @property
+    def area(self):
+        if len(self.cumulative_areas) == 0:
+            return 0.0
+        return float(self.cumulative_areas[-1])
+
+    def sample(self, count, rng):
+        """Picks count random points, evenly spread over the surface.
+
+        Normals are interpolated from the vertex normals.
+
+        Returns
+            tuple: The positions and normals of the points
+        """
+        if count <= 0 or self.area <= 0:
+            return _to_rows([]), _to_rows([])
+        if np is not None:
+            return self._sample_numpy(count, rng)
+        positions, normals = [], []
+        for _ in range(count):
+            index = bisect.bisect_right(self.cumulative_areas,
+                                        rng.uniform(0, self.area))
+            index = min(index, len(self.triangles) - 1)
+            weights = self._barycentric(rng.random(), rng.random())
+            corners = self.triangles[index]
+            positions.append(self._interpolate(self.positions, corners,
+                                               weights))
+            normals.append(self._interpolate(self.normals, corners, weights))
+        return positions, normals
+
+    def _sample_numpy(self, count, rng):
+        np_rng = np.random.RandomState(rng.randrange(2 ** 32))
+        indices = np.searchsorted(self.cumulative_areas,
+                                  np_rng.uniform(0, self.area, count),
+                                  side="right")
+        corners = self.triangles[np.minimum(indices,
+                                            len(self.triangles) - 1)]
+        root = np.sqrt(np_rng.random_sample(count))
+        v = np_rng.random_sample(count)
+        weights = np.stack((1 - root, root * (1 - v), root * v), axis=1)
+        positions = np.einsum("nk,nkj->nj", weights, self.positions[corners])
+        normals = np.einsum("nk,nkj->nj", weights, self.normals[corners])
+        return positions, normals
+
+    @staticmethod
+    def _barycentric(u, v):
+        root = math.sqrt(u)
+        return (1 - root, root * (1 - v), root * v)
+
+    @staticmethod
+    def _interpolate(rows, corners, weights):
+        return tuple(sum(weights[k] * rows[corners[k]][i] for k in range(3))
+                     for i in range(3))
+
+
+class SpatialHash(object):
+    """A uniform grid of points for constant time neighbour queries.
+
+    The cells are as wide as the search radius, so a query only has to
+    look at the 27 cells around a point.
+    """
+
+    def __init__(self, radius):
+        self.radius = radius
+        self._cells = {}
+
+    def _cell(self, point):
+        return (int(math.floor(point[0] / self.radius)),
+                int(math.floor(point[1] / self.radius)),
+                int(math.floor(point[2] / self.radius)))
+
+    def has_neighbour(self, point):
+        """Returns whether a point lies within the radius of this one."""
+        radius_squared = self.radius * self.radius
+        x, y, z = self._cell(point)
+        for i in (x - 1, x, x + 1):
+            for j in (y - 1, y, y + 1):
+                for k in (z - 1, z, z + 1):
+                    for other in self._cells.get((i, j, k), ()):
+                        distance = ((point[0] - other[0]) ** 2 +
+                                    (point[1] - other[1]) ** 2 +
+                                    (point[2] - other[2]) ** 2)
+                        if distance < radius_squared:
+                            return True
+        return False
+
+    def add(self, point):
+        self._cells.setdefault(self._cell(point), []).append(point)
+
+
+def _row_bytes(rows):
+    """Returns rows of floats as little endian doubles."""
+    if np is not None:
+        return np.ascontiguousarray(rows, dtype="<f8").tobytes()
+    typed = array.array("d", [c for row in rows for c in row])
+    if sys.byteorder != "little":
+        typed.byteswap()
+    if hasattr(typed, "tobytes"):
+        return typed.tobytes()
+    return typed.tostring()
+
+
+class MeshData(object):
+    """The vertex rows of one mesh, with its triangles read on demand."""
+
+    def __init__(self, reader, name):
+        self._reader = reader
+        self.name = name
+        self._triangles = None
+        self._surface = None
+        self._digest = None
+        if reader is not None:
+            positions, normals = reader.read_mesh(name)
+            self.positions = _to_rows(positions)
+            self.normals = _to_rows(normals)
+
+    @classmethod
+    def from_arrays(cls, name, positions, normals, triangles=None):
+        """Wraps mesh data that was already read, e.g. in a worker."""
+        mesh = cls(None, name)
+        mesh.positions = _to_rows(positions)
+        mesh.normals = _to_rows(normals)
+        if triangles is not None:
+            mesh._triangles = _to_triangles(triangles)
+        return mesh
+
+    @property
+    def triangles(self):
+        if self._triangles is None:
+            self._triangles = _to_triangles(
+                self._reader.read_triangles(self.name))
+        return self._triangles
+
+    @property
+    def surface(self):
+        """The SurfaceTable of the whole mesh."""
+        if self._surface is None:
+            self._surface = SurfaceTable(self.positions, self.normals,
+                                         self.triangles)
+        return self._surface
+
+    @property
+    def digest(self):
+        """A sha1 of the vertex positions and normals, taken once.
+
+        It is the same with or without NumPy.
+        """
+        if self._digest is None:
+            digest = hashlib.sha1()
+            for rows in (self.positions, self.normals):
+                digest.update(_row_bytes(rows))
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    @property
+    def nbytes(self):
+        """Roughly how much memory the mesh data takes up."""
+        arrays = [self.positions, self.normals]
+        if self._triangles is not None:
+            arrays.append(self._triangles)
+        if self._surface is not None:
+            arrays.append(self._surface.cumulative_areas)
+        if np is not None:
+            return sum(np.asarray(array).nbytes for array in arrays)
+        return sum(len(array) for array in arrays) * PYTHON_ROW_BYTES
+
+
+class MeshCache(object):
+    """Keeps the data of recently scattered meshes between scatters.
+
+    Entries are keyed by DAG path and checked against the reader's cheap
+    signature (topology counts and world matrix) on every use. Readers
+    that can watch meshes also mark an entry stale as soon as its mesh
+    is edited. Past max_bytes the least recently used meshes are
+    dropped. The digests of meshes are kept apart, and watched on their
+    own, so they outlive the data they were taken from. The cache can
+    be used anywhere a reader can.
+    """
+
+    def __init__(self, reader, max_bytes=MESH_CACHE_BYTES):
+        self.reader = reader
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._stale = set()
+        self._digests = collections.OrderedDict()
+        self._stale_digests = set()
+
+    def read_mesh(self, name):
+        mesh = self.mesh_data(name)
+        return mesh.positions, mesh.normals
+
+    def read_triangles(self, name):
+        return self.mesh_data(name).triangles
+
+    def mesh_data(self, name):
+        """Returns the data of a mesh, reading it only if it changed.
+
+        Returns
+            MeshData: The cached or freshly read mesh data
+        """
+        if not hasattr(self.reader, "signature"):
+            return MeshData(self.reader, name)
+        signature = self.reader.signature(name)
+        key = signature[0]
+        entry = self._entries.pop(key, None)
+        if entry is not None and (entry[0] != signature or
+                                  key in self._stale):
+            self._unwatch(entry)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            self._stale.discard(key)
+            entry = (signature, MeshData(self.reader, name),
+                     self._watch(name, key))
+        else:
+            self.hits += 1
+        self._entries[key] = entry
+        self._evict(key)
+        return entry[1]
+
+    def digest(self, name):
+        """Returns the digest of a mesh, reading the mesh only if it
+        changed since the digest was taken.
+
+        Returns
+            str: The MeshData digest of the mesh
+        """
+        if not hasattr(self.reader, "signature"):
+            return MeshData(self.reader, name).digest
+        signature = self.reader.signature(name)
+        key = signature[0]
+        entry = self._digests.pop(key, None)
+        if entry is not None and (entry[0] != signature or
+                                  key in self._stale_digests):
+            self._unwatch(entry)
+            entry = None
+        if entry is None:
+            self._stale_digests.discard(key)
+            entry = (signature, self.mesh_data(name).digest,
+                     self._watch(name, key))
+        self._digests[key] = entry
+        while len(self._digests) > MESH_DIGESTS_KEPT:
+            dropped, oldest = self._digests.popitem(last=False)
+            self._unwatch(oldest)
+            self._stale_digests.discard(dropped)
+        return entry[1]
+
+    @property
+    def nbytes(self):
+        return sum(entry[1].nbytes for entry in self._entries.values())
+
+    def invalidate(self, key):
+        """Marks the mesh at a DAG path as needing to be read again."""
+        self._stale.add(key)
+        self._stale_digests.add(key)
+
+    def clear(self):
+        for entries in (self._entries, self._digests):
+            for entry in entries.values():
+                self._unwatch(entry)
+            entries.clear()
+        self._stale.clear()
+        self._stale_digests.clear()
+
+    def _evict(self, keep):
+        while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self._unwatch(self._entries.pop(key))
+            self._stale.discard(key)
+
+    def _watch(self, name, key):
+        if not hasattr(self.reader, "watch"):
+            return None
+        return self.reader.watch(name, lambda: self.invalidate(key))
+
+    def _unwatch(self, entry):
+        if entry[2] is not None:
+            self.reader.unwatch(entry[2])
+
+
+def mesh_data(reader, name):
+    """Reads a mesh through a reader, or a MeshCache if given one.
+
+    Returns
+        MeshData: The data of the mesh
+    """
+    if isinstance(reader, MeshCache):
+        return reader.mesh_data(name)
+    return MeshData(reader, name)
+
+
+def mesh_digest(reader, name):
+    """Returns the digest of a mesh, kept by a MeshCache if given one.
+
+    Returns
+        str: The MeshData digest of the mesh
+    """
+    if isinstance(reader, MeshCache):
+        return reader.digest(name)
+    return MeshData(reader, name).digest
+
+
+def sample_poisson(table, count, grid, rng, attempts=POISSON_ATTEMPTS):
+    """Picks up to count points on a surface, no two closer than the grid
+    radius.
+
+    Candidates are drawn area weighted and rejected when they have a
+    neighbour in the grid, giving a blue noise distribution. Sampling
+    stops early once attempts candidates in a row have been rejected.
+
+    Returns
+        tuple: The positions and normals of the accepted points
+    """
+    positions, normals = [], []
+    rejected = 0
+    while len(positions) < count and rejected < attempts:
+        candidates, candidate_normals = table.sample(
+            max(count - len(positions), 1), rng)
+        if len(candidates) == 0:
+            break
+        for i in range(len(candidates)):
+            point = tuple(float(c) for c in candidates[i])
+            if grid.has_neighbour(point):
+                rejected += 1
+                if rejected >= attempts:
+                    break
+                continue
+            rejected = 0
+            grid.add(point)
+            positions.append(point)
+            normals.append(candidate_normals[i])
+            if len(positions) >= count:
+                break
+    return _to_rows([c for p in positions for c in p]), \
+        _to_rows([c for n in normals for c in n])
+
+
+def iter_surface_samples(targets, reader, settings, seed):
+    """Scatters points over the surface of the target meshes.
+
+    Vertex targets limit a mesh to the triangles between the selected
+    vertices. Poisson disk spacing is kept across all the targets.
+
+    Yields
+        MeshSamples: The sampled points of a single target mesh
+    """
+    grid = _poisson_grid(settings)
+    for index, (name, indices) in enumerate(parse_scatter_targets(targets)):
+        rng = random.Random(target_seed(seed, index))
+        yield surface_samples(mesh_data(reader, name), indices, settings,
+                              rng, grid)
+
+
+def _poisson_grid(settings):
+    if settings.mode == SAMPLE_POISSON and settings.min_distance > 0:
+        return SpatialHash(settings.min_distance)
+    return None
+
+
+def surface_samples(mesh, indices, settings, rng, grid=None):
+    """Scatters points over the surface of one mesh.
+
+    Returns
+        MeshSamples: The sampled points of the mesh
+    """
+    if indices is None:
+        table = mesh.surface
+    else:
+        table = SurfaceTable(
+            _take_rows(mesh.positions, indices),
+            _take_rows(mesh.normals, indices),
+            _triangles_within(mesh.triangles, indices))
+    count = int(settings.density * len(table.positions))
+    if grid is not None:
+        points, point_normals = sample_poisson(table, count, grid, rng)
+    else:
+        points, point_normals = table.sample(count, rng)
+    samples = MeshSamples()
+    samples.add(mesh.name, points, point_normals)
+    return samples
+
+
+def target_seed(seed, target_index):
+    """Derives the seed of one target from the seed of the scatter.
+
+    The same seed and target index always give the same result, no
+    matter which process computes it.
+    """
+    key = "{0}:{1}".format(seed, target_index).encode("utf-8")
+    return zlib.crc32(key) & 0xffffffff
+
+
+def sample_sparse(population, count, rng):
+    """Picks count distinct indices below population in O(count).
+
+    Uses Robert Floyd's algorithm, so the index list is never built.
+
+    Returns
+        list: The picked indices in ascending order
+    """
+    selected = set()
+    for j in range(population - count, population):
+        pick = rng.randint(0, j)
+        selected.add(j if pick in selected else pick)
+    return sorted(selected)
+
+
+def _sample_sparse_numpy(population, count, rng):
+    np_rng = np.random.RandomState(rng.randrange(2 ** 32))
+    if count > population // 2:
+        # Redrawing would mostly hit picked indices by now, so a
+        # permutation is cheaper.
+        return np.sort(np_rng.permutation(population)[:count])
+    selected = np.empty(0, dtype=np.intp)
+    while len(selected) < count:
+        draws = np_rng.randint(population, size=2 * (count - len(selected)))
+        selected = np.unique(np.concatenate((selected, draws)))
+    if len(selected) > count:
+        np_rng.shuffle(selected)
+        selected = np.sort(selected[:count])
+    return selected
+
+
+def sample_shuffle(population, count, rng):
+    """Picks count distinct indices below population with a shuffle.
+
+    Costs O(population), but is faster than sparse sampling once most
+    of the population is picked.
+
+    Returns
+        list: The picked indices in ascending order
+    """
+    if np is not None:
+        np_rng = np.random.RandomState(rng.randrange(2 ** 32))
+        return np.sort(np_rng.permutation(population)[:count])
+    vertexes = list(range(population))
+    rng.shuffle(vertexes)
+    return sorted(vertexes[:count])
+
+
+def choose_vertices(count, density, rng, strategy=SAMPLING_AUTO):
+    """Picks the fraction of vertices to scatter to.
+
+    Returns
+        list: The picked vertex indices in ascending order
+    """
+    picked = int(density * count)
+    if strategy == SAMPLING_AUTO:
+        if picked <= count * SPARSE_DENSITY:
+            strategy = SAMPLING_SPARSE
+        else:
+            strategy = SAMPLING_SHUFFLE
+    if strategy == SAMPLING_SHUFFLE:
+        return sample_shuffle(count, picked, rng)
+    if np is not None:
+        return _sample_sparse_numpy(count, picked, rng)
+    return sample_sparse(count, picked, rng)
+
+
+def choose_sources(count, source_count, rng):
+    """Picks a random source index for every instance."""
+    if np is not None:
+        source_rng = np.random.RandomState(rng.randrange(2 ** 32))
+        return source_rng.randint(source_count, size=count)
+    return [rng.randrange(source_count) for _ in range(count)]
+
+
+class ScatterPlan(object):
+    """The random choices of one scatter, made before the scene is touched.
+    """
+
+    def __init__(self, vertexes, source_indices, scales, rotations,
+                 offsets):
+        self.vertexes = vertexes
+        self.source_indices = source_indices
+        self.scales = scales
+        self.rotations = rotations
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.vertexes)
+
+
+def plan_scatter(vertex_count, source_count, attribute_array, density,
+                 seed=None, strategy=SAMPLING_AUTO):
+    """Makes every random choice of a scatter from one seed.
+
+    Returns
+        ScatterPlan: The chosen vertices, sources and attributes
+    """
+    rng = random.Random(seed)
+    vertexes = choose_vertices(vertex_count, density, rng, strategy)
+    scales, rotations, offsets = sample_attributes(
+        attribute_array, len(vertexes), seed)
+    source_indices = choose_sources(len(vertexes), source_count, rng)
+    return ScatterPlan(vertexes, source_indices, scales, rotations, offsets)
+
+
+def plan_transforms(samples, plan, align=True, sources=None):
+    """Builds the world matrices of a planned scatter.
+
+    Given the flat 16 float world matrix of every source, each instance
+    keeps the scale of its source, and its rotation too when not
+    aligned, as an instance made by the constraint path does.
+
+    Returns
+        list: A flat 16 float world matrix for every instance
+    """
+    positions, normals = samples.gather(plan.vertexes)
+    scales, bases = plan.scales, None
+    if sources is not None:
+        scales, bases = _source_transforms(sources, plan.source_indices,
+                                           scales)
+    return compose_transforms(positions, normals, scales, plan.rotations,
+                              plan.offsets, align, None if align else bases)
+
+
+def _source_transforms(sources, source_indices, scales):
+    """Returns the scales of the instances times those of their sources,
+    and the rotation matrix of the source of every instance.
+    """
+    _, rotations, source_scales = decompose_transforms(sources)
+    if np is not None:
+        indices = np.asarray(source_indices, dtype=np.int64)
+        scales = np.asarray(scales, dtype=np.float64).reshape(-1, 3) * \
+            np.asarray(source_scales)[indices]
+        return scales, _euler_to_matrices(rotations)[indices]
+    bases = [euler_to_matrix(rotation) for rotation in rotations]
+    scales = [[s * t for s, t in zip(scale, source_scales[index])]
+              for scale, index in zip(scales, source_indices)]
+    return scales, [bases[index] for index in source_indices]
+
+
+class ScatterSettings(object):
+    """The parameters of a scatter that do not depend on the scene."""
+
+    def __init__(self, attribute_array, density=1.0, alignment=True,
+                 seed=None, strategy=SAMPLING_AUTO, mode=SAMPLE_VERTICES,
+                 min_distance=0.0):
+        self.attribute_array = attribute_array
+        self.density = density
+        self.alignment = alignment
+        self.seed = seed
+        self.strategy = strategy
+        self.mode = mode
+        self.min_distance = min_distance
+
+
+def iter_plans(targets, reader, source_count, settings, streaming=False):
+    """Reads the scatter targets and plans the scatter.
+
+    Every target is planned on its own by plan_target, so a seed gives
+    the same scatter whether it is streamed or computed by any number of
+    workers. When streaming, the targets are read and planned one mesh
+    at a time, so only one target's data is held at once. Otherwise all
+    of them are planned before the first is yielded.
+
+    Yields
+        tuple: The MeshSamples of each target, and its plan
+    """
+    seed = settings.seed
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    plans = (plan_target(mesh_data(reader, name), indices, source_count,
+                         settings, seed, index)
+             for index, (name, indices) in
+             enumerate(parse_scatter_targets(targets)))
+    if not streaming:
+        plans = list(plans)
+    for samples, plan in plans:
+        yield samples, plan
+
+
+def plan_target(mesh, indices, source_count, settings, seed, index):
+    """Samples and plans one target on its own.
+
+    The target is planned from a seed derived from the scatter seed and
+    its index, and surface spacing is only kept within the target, so
+    the result does not depend on any other target. This is what lets
+    targets be planned in any order or process.
+
+    Returns
+        tuple: The MeshSamples of the target and its ScatterPlan
+    """
+    seed = target_seed(seed, index)
+    if settings.mode == SAMPLE_VERTICES:
+        samples = vertex_samples(mesh, indices)
+        density = settings.density
+    else:
+        samples = surface_samples(mesh, indices, settings,
+                                  random.Random(seed),
+                                  _poisson_grid(settings))
+        density = 1.0
+    plan = plan_scatter(len(samples), source_count,
+                        settings.attribute_array, density, seed,
+                        settings.strategy)
+    return samples, plan
+
+
+class NameTable(object):
+    """Node names kept as one string and the offset each name ends at.
+
+    A list of names costs a string object per node, which adds up to
+    far more than the names themselves in a large scatter.
+    """
+
+    __slots__ = ("_text", "_pending", "_ends")
+
+    def __init__(self, names=()):
+        self._text = ""
+        self._pending = []
+        self._ends = array.array("l")
+        self.extend(names)
+
+    def extend(self, names):
+        end = self._ends[-1] if self._ends else 0
+        for name in names:
+            end += len(name)
+            self._ends.append(end)
+            self._pending.append(name)
+
+    def _flush(self):
+        if self._pending:
+            self._text += "".join(self._pending)
+            self._pending = []
+
+    def __len__(self):
+        return len(self._ends)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self._ends)
+        end = self._ends[index]
+        start = self._ends[index - 1] if index else 0
+        self._flush()
+        return self._text[start:end]
+
+    def __iter__(self):
+        self._flush()
+        start = 0
+        for end in self._ends:
+            yield self._text[start:end]
+            start = end
+
+    @property
+    def nbytes(self):
+        self._flush()
+        return (len(self._text) +
+                len(self._ends) * self._ends.itemsize)
+
+
+def _extend_array(typed, values):
+    if np is not None:
+        data = np.ascontiguousarray(values, dtype=typed.typecode).ravel()
+        if hasattr(typed, "frombytes"):
+            typed.frombytes(data.tobytes())
+        else:
+            typed.fromstring(data.tostring())
+    elif len(values) and isinstance(values[0], (tuple, list)):
+        for row in values:
+            typed.extend(row)
+    else:
+        typed.extend(values)
+
+
+def _array_values(typed):
+    if np is not None:
+        return np.frombuffer(typed, dtype=typed.typecode).copy()
+    return list(typed)
+
+
+def _array_rows(typed, width=3):
+    if np is not None:
+        return np.frombuffer(typed, dtype=typed.typecode).reshape(
+            -1, width).copy()
+    return [list(typed[i:i + width]) for i in range(0, len(typed), width)]
+
+
+class ScatterBatch(object):
+    """The instances of one scatter, kept in flat typed arrays.
+
+    Every instance takes its source index, position, xyz euler rotation
+    in degrees and scale, 52 bytes in all, and the nodes made for it are
+    kept in a NameTable. Together with the seed this is enough to undo,
+    re-create, export or inspect the scatter without asking the scene.
+    A batch made by subset keeps the whole batch it was taken from in
+    full.
+    """
+
+    __slots__ = ("group", "sources", "seed", "output_mode", "nodes", "full",
+                 "_source_indices", "_positions", "_rotations", "_scales")
+
+    def __init__(self, group, sources, seed=None, output_mode=None):
+        self.group = group
+        self.sources = list(sources)
+        self.seed = seed
+        self.output_mode = output_mode
+        self.nodes = NameTable()
+        self.full = None
+        self._source_indices = array.array("i")
+        self._positions = array.array("d")
+        self._rotations = array.array("f")
+        self._scales = array.array("f")
+
+    def add(self, source_indices, matrices):
+        """Appends instances from their source indices and world matrices.
+        """
+        positions, rotations, scales = decompose_transforms(matrices)
+        self.add_transforms(source_indices, positions, rotations, scales)
+
+    def add_transforms(self, source_indices, positions, rotations, scales):
+        _extend_array(self._source_indices, source_indices)
+        _extend_array(self._positions, positions)
+        _extend_array(self._rotations, rotations)
+        _extend_array(self._scales, scales)
+
+    def __len__(self):
+        return len(self._source_indices)
+
+    def subset(self, indices, source_indices=None):
+        """Returns a new batch of some of the instances of this one.
+
+        source_indices, if given, replace the sources of the picked
+        instances.
+        """
+        subset = ScatterBatch(self.group, self.sources, self.seed,
+                              self.output_mode)
+        subset.full = self if self.full is None else self.full
+        if source_indices is None:
+            source_indices = _take_rows(self.source_indices, indices)
+        subset.add_transforms(source_indices,
+                              _take_rows(self.positions, indices),
+                              _take_rows(self.rotations, indices),
+                              _take_rows(self.scales, indices))
+        return subset
+
+    @property
+    def source_indices(self):
+        return _array_values(self._source_indices)
+
+    @property
+    def positions(self):
+        return _array_rows(self._positions)
+
+    @property
+    def rotations(self):
+        return _array_rows(self._rotations)
+
+    @property
+    def scales(self):
+        return _array_rows(self._scales)
+
+    @property
+    def nbytes(self):
+        return sum(typed.itemsize * len(typed) for typed in (
+            self._source_indices, self._positions, self._rotations,
+            self._scales)) + self.nodes.nbytes
+
+    def matrices(self):
+        """Rebuilds the world matrix of every instance.
+
+        Returns
+            list: A flat 16 float world matrix for every instance
+        """
+        return trs_matrices(self.positions, self.rotations, self.scales)
+
+    def iter_chunks(self, chunk_size):
+        """Yields the source indices, positions, rotations and scales of
+        chunk_size instances at a time."""
+        for start in range(0, len(self), chunk_size):
+            end = start + chunk_size
+            yield (_array_values(self._source_indices[start:end]),
+                   _array_rows(self._positions[start * 3:end * 3]),
+                   _array_rows(self._rotations[start * 3:end * 3]),
+                   _array_rows(self._scales[start * 3:end * 3]))
+
+    def columns(self):
+        """Returns the typed arrays behind the batch, by name."""
+        return collections.OrderedDict((
+            ("source_indices", self._source_indices),
+            ("positions", self._positions),
+            ("rotations", self._rotations),
+            ("scales", self._scales)))
+
+    def stats(self):
+        """Sums up the batch.
+
+        Returns
+            dict: The instance count, the count of every source, the
+                bounds of the positions, the scale range and the bytes
+                the batch takes
+        """
+        if np is not None:
+            counts = np.bincount(self.source_indices,
+                                 minlength=len(self.sources)).tolist()
+        else:
+            counts = [0] * len(self.sources)
+            for index in self._source_indices:
+                counts[index] += 1
+        stats = {
+            "group": self.group,
+            "seed": self.seed,
+            "instances": len(self),
+            "nodes": len(self.nodes),
+            "sources": dict(zip(self.sources, counts)),
+            "nbytes": self.nbytes,
+        }
+        if len(self) and np is not None:
+            positions, scales = self.positions, self.scales
+            stats["bounds"] = (positions.min(axis=0).tolist(),
+                               positions.max(axis=0).tolist())
+            stats["scale"] = (float(scales.min()), float(scales.max()))
+        elif len(self):
+            positions, scales = self.positions, self.scales
+            stats["bounds"] = (
+                [min(row[axis] for row in positions) for axis in range(3)],
+                [max(row[axis] for row in positions) for axis in range(3)])
+            stats["scale"] = (min(min(row) for row in scales),
+                              max(max(row) for row in scales))
+        return stats
+
+    def iter_rows(self):
+        """Yields the source name, position, rotation and scale of every
+        instance as one flat row."""
+        for index, position, rotation, scale in zip(
+                self._source_indices, self.positions, self.rotations,
+                self.scales):
+            yield ([self.sources[index]] + [float(c) for c in position] +
+                   [float(c) for c in rotation] + [float(c) for c in scale])
+
+    def export_csv(self, path):
+        """Writes one row per instance to a CSV file."""
+        with open(path, "w") as csv_file:
+            writer = csv.writer(csv_file, lineterminator="\n")
+            writer.writerow(["source", "tx", "ty", "tz", "rx", "ry", "rz",
+                             "sx", "sy", "sz"])
+            writer.writerows(self.iter_rows())
+
+
+class CameraView(object):
+    """The view frustum of a camera, looking down its -Z axis as Maya's
+    cameras do.
+
+    Field of view angles are in degrees.
+    """
+
+    def __init__(self, matrix, horizontal_fov, vertical_fov, near=0.1,
+                 far=10000.0):
+        matrix = [float(c) for c in matrix]
+        self.position = matrix[12:15]
+        self.axes = [_normalize(matrix[0:3]) or (1.0, 0.0, 0.0),
+                     _normalize(matrix[4:7]) or (0.0, 1.0, 0.0),
+                     _normalize(matrix[8:11]) or (0.0, 0.0, 1.0)]
+        self.horizontal_fov = horizontal_fov
+        self.vertical_fov = vertical_fov
+        self.near = near
+        self.far = far
+
+    @classmethod
+    def look_at(cls, position, target, horizontal_fov=54.43,
+                vertical_fov=37.85, near=0.1, far=10000.0):
+        """Returns the view of a camera at position aimed at target."""
+        z_axis = _normalize([p - t for p, t in zip(position, target)])
+        x_axis = _normalize(_cross(WORLD_UP, z_axis)) or (1.0, 0.0, 0.0)
+        y_axis = _cross(z_axis, x_axis)
+        matrix = (list(x_axis) + [0.0] + list(y_axis) + [0.0] +
+                  list(z_axis) + [0.0] + list(position) + [1.0])
+        return cls(matrix, horizontal_fov, vertical_fov, near, far)
+
+    def _tangents(self):
+        return (math.tan(math.radians(self.horizontal_fov) / 2.0),
+                math.tan(math.radians(self.vertical_fov) / 2.0))
+
+
+def cull_mask(positions, view, max_distance=None, frustum=True,
+              radii=None):
+    """Tests which instances a camera can see.
+
+    An instance is a sphere of its radius around its position. It is
+    kept when the sphere reaches into the frustum, if frustum is set,
+    and comes within max_distance of the camera, if that is given.
+
+    Returns
+        tuple: The mask of the kept instances and the distance of every
+            instance to the camera
+    """
+    if np is not None:
+        return _cull_mask_numpy(positions, view, max_distance, frustum,
+                                radii)
+    return _cull_mask_python(positions, view, max_distance, frustum, radii)
+
+
+def _cull_mask_numpy(positions, view, max_distance, frustum, radii):
+    offsets = np.asarray(positions, dtype=np.float64).reshape(-1, 3) - \
+        np.asarray(view.position)
+    distances = np.sqrt(np.einsum("ij,ij->i", offsets, offsets))
+    radii = np.zeros(len(offsets)) if radii is None else np.asarray(radii)
+    mask = np.ones(len(offsets), dtype=bool)
+    if max_distance:
+        mask &= distances - radii <= max_distance
+    if frustum:
+        local = np.dot(offsets, np.asarray(view.axes).T)
+        depth = -local[:, 2]
+        mask &= (depth + radii >= view.near) & (depth - radii <= view.far)
+        # A sphere reaches past a side plane when its center is within
+        # its radius of the plane, measured across the plane.
+        for axis, tangent in enumerate(view._tangents()):
+            mask &= np.abs(local[:, axis]) - depth * tangent <= \
+                radii * math.sqrt(1.0 + tangent * tangent)
+    return mask, distances
+
+
+def _cull_mask_python(positions, view, max_distance, frustum, radii):
+    positions = _to_rows(positions)
+    tangents = view._tangents()
+    secants = [math.sqrt(1.0 + tangent * tangent) for tangent in tangents]
+    mask, distances = [], []
+    for i, position in enumerate(positions):
+        offset = [p - c for p, c in zip(position, view.position)]
+        distance = math.sqrt(sum(c * c for c in offset))
+        radius = radii[i] if radii is not None else 0.0
+        visible = not max_distance or distance - radius <= max_distance
+        if visible and frustum:
+            local = [sum(o * a for o, a in zip(offset, axis))
+                     for axis in view.axes]
+            depth = -local[2]
+            visible = (depth + radius >= view.near and
+                       depth - radius <= view.far and
+                       all(abs(local[axis]) - depth * tangents[axis] <=
+                           radius * secants[axis] for axis in range(2)))
+        mask.append(visible)
+        distances.append(distance)
+    return mask, distances
+
+
+def even_lod_distances(max_distance, levels):
+    """Splits the range up to max_distance into equal LOD bands.
+
+    Returns
+        list: The distance every level after the first starts at
+    """
+    return [max_distance * level / float(levels)
+            for level in range(1, levels)]
+
+
+def lod_levels(distances, lod_distances):
+    """Picks the level of detail of every instance by its distance.
+
+    Level 0 is used up to lod_distances[0], level 1 up to
+    lod_distances[1] and so on, the last level beyond them all.
+
+    Returns
+        list: The level of every instance
+    """
+    if np is not None:
+        return np.searchsorted(np.asarray(lod_distances, dtype=np.float64),
+                               distances, side="right")
+    return [bisect.bisect_right(lod_distances, distance)
+            for distance in distances]
+
+
+def cull_batch(batch, view, max_distance=None, frustum=True,
+               lod_distances=None, radius=0.0, lods=0):
+    """Culls a batch to what a camera sees, and picks levels of detail.
+
+    Without lod_distances or lods the instances keep their sources.
+    With them the sources of the batch are taken as levels of detail,
+    the most detailed first, and every kept instance gets the source of
+    its level. lods levels without lod_distances are split into even
+    bands up to the farthest kept instance. radius is the size of the
+    sources at scale 1, grown by the largest scale of each instance
+    whatever its sign, as mirrored instances are just as large.
+
+    Returns
+        ScatterBatch: The kept instances, as a subset of batch
+    """
+    radii = None
+    if radius:
+        scales = batch.scales
+        if np is not None:
+            radii = radius * np.abs(scales).max(axis=1)
+        else:
+            radii = [radius * max(abs(s) for s in scale)
+                     for scale in scales]
+    mask, distances = cull_mask(batch.positions, view, max_distance,
+                                frustum, radii)
+    if np is not None:
+        indices = np.nonzero(mask)[0]
+    else:
+        indices = [i for i, visible in enumerate(mask) if visible]
+    source_indices = None
+    kept_distances = _take_rows(distances, indices)
+    if lod_distances is None and lods > 1 and len(kept_distances):
+        lod_distances = even_lod_distances(float(max(kept_distances)), lods)
+    if lod_distances is not None:
+        levels = lod_levels(kept_distances, lod_distances)
+        last = len(batch.sources) - 1
+        if np is not None:
+            source_indices = np.minimum(levels, last)
+        else:
+            source_indices = [min(level, last) for level in levels]
+    return batch.subset(indices, source_indices)
@@ -0,0 +1,707 @@
+import logging
+import random
+import time
+
+import maya.api.OpenMaya as om2
+import maya.cmds as cmds
+
+import scattercache
+import scattercore
+
+log = logging.getLogger(__name__)
+
+
+ALIGN_MATRIX = "matrix"
+ALIGN_CONSTRAINT = "constraint"
+
+
+class OpenMayaMeshReader(object):
+    """Reads mesh vertex data in bulk through the OpenMaya 2.0 API."""
+
+    def _dag_path(self, mesh_name):
+        selection = om2.MSelectionList()
+        selection.add(mesh_name)
+        dag_path = selection.getDagPath(0)
+        dag_path.extendToShape()
+        return dag_path
+
+    def read_mesh(self, mesh_name):
+        """Reads the vertices of a mesh in world space.
+
+        With NumPy the arrays are converted in one go, instead of one
+        vertex at a time.
+
+        Returns
+            tuple: Position and averaged normal rows as NumPy arrays, or
+                flat lists without NumPy
+        """
+        mesh = om2.MFnMesh(self._dag_path(mesh_name))
+        points = mesh.getPoints(om2.MSpace.kWorld)
+        normals = mesh.getVertexNormals(False, om2.MSpace.kWorld)
+        np = scattercore.np
+        if np is not None:
+            return (np.array(points, dtype=np.float64).reshape(-1, 4)[:, :3],
+                    np.array(normals, dtype=np.float64).reshape(-1, 3))
+        return ([c for p in points for c in (p.x, p.y, p.z)],
+                [c for n in normals for c in (n.x, n.y, n.z)])
+
+    def read_triangles(self, mesh_name):
+        """Reads the triangulation of a mesh.
+
+        Returns
+            list: Flat vertex indices, three for every triangle
+        """
+        triangle_counts, triangle_vertices = \
+            om2.MFnMesh(self._dag_path(mesh_name)).getTriangles()
+        return list(triangle_vertices)
+
+    def signature(self, mesh_name):
+        """Returns what identifies the current state of a mesh cheaply.
+
+        Returns
+            tuple: The full DAG path, vertex and polygon counts and world
+                matrix of the mesh
+        """
+        dag_path = self._dag_path(mesh_name)
+        mesh = om2.MFnMesh(dag_path)
+        return (dag_path.fullPathName(), mesh.numVertices,
+                mesh.numPolygons, tuple(dag_path.inclusiveMatrix()))
+
+    def watch(self, mesh_name, callback):
+        """Calls callback whenever the mesh is edited.
+
+        Returns
+            int: The id to stop watching with
+        """
+        return om2.MNodeMessage.addNodeDirtyPlugCallback(
+            self._dag_path(mesh_name).node(),
+            lambda node, plug, client_data: callback())
+
+    def unwatch(self, callback_id):
+        om2.MMessage.removeCallback(callback_id)
+
+
+OUTPUT_TRANSFORMS = "transforms"
+OUTPUT_INSTANCER = "instancer"
+CHUNK_SIZE = 500
+DELETED_SCATTERS_KEPT = 10
+# Drawn seeds stay below this, so they fit a Qt spinbox.
+MAX_SEED = 2 ** 31 - 1
+
+
+class MayaScene(object):
+    """The scene edits the scatter outputs make, done through maya.cmds.
+
+    Outputs only talk to the scene through this class, so a fake scene
+    can record the calls instead.
+    """
+
+    def open_undo_chunk(self, name):
+        cmds.undoInfo(openChunk=True, chunkName=name)
+
+    def close_undo_chunk(self):
+        cmds.undoInfo(closeChunk=True)
+
+    def create_group(self, name):
+        return cmds.group(empty=True, name=name)
+
+    def parent(self, nodes, group):
+        """Parents nodes under group, keeping their world transforms.
+
+        Returns
+            list: The new names of the nodes
+        """
+        if not nodes:
+            return []
+        return cmds.parent(nodes, group)
+
+    def instance(self, source):
+        return cmds.instance(source)[0]
+
+    def set_matrix(self, node, matrix):
+        cmds.xform(node, ws=True, matrix=list(matrix))
+
+    def get_matrix(self, node):
+        return cmds.xform(node, query=True, ws=True, matrix=True)
+
+    def exists(self, node):
+        return cmds.objExists(node)
+
+    def camera_view(self, camera):
+        """Returns the world matrix and lens of a camera as a CameraView.
+        """
+        def lens(**flag):
+            return cmds.camera(camera, query=True, **flag)
+        return scattercore.CameraView(
+            cmds.xform(camera, query=True, ws=True, matrix=True),
+            lens(horizontalFieldOfView=True), lens(verticalFieldOfView=True),
+            lens(nearClipPlane=True), lens(farClipPlane=True))
+
+    def create_instancer(self, sources, positions, rotations, scales,
+                         source_indices):
+        """Creates one particle instancer holding every scattered point.
+
+        Returns
+            list: The particle transform and instancer nodes
+        """
+        particle, shape = cmds.particle(
+            p=[tuple(position) for position in positions],
+            name="scatterParticle#")
+        cmds.setAttr(shape + ".isDynamic", False)
+        count = len(positions)
+        per_particle = (
+            ("rotationPP", "vectorArray",
+             [tuple(rotation) for rotation in rotations]),
+            ("scalePP", "vectorArray", [tuple(scale) for scale in scales]),
+            ("indexPP", "doubleArray", [float(i) for i in source_indices]))
+        for attr, data_type, values in per_particle:
+            for name in (attr, attr + "0"):
+                cmds.addAttr(shape, longName=name, dataType=data_type)
+                if data_type == "vectorArray":
+                    cmds.setAttr(shape + "." + name, count, *values,
+                                 type=data_type)
+                else:
+                    cmds.setAttr(shape + "." + name, values, type=data_type)
+        instancer = cmds.particleInstancer(
+            shape, addObject=True, object=list(sources), cycle="None",
+            rotationUnits="Degrees", rotation="rotationPP",
+            scale="scalePP", objectIndex="indexPP")
+        return [particle, instancer]
+
+    def delete(self, nodes):
+        if nodes:
+            cmds.delete(nodes)
+
+
+class TransformOutput(object):
+    """Writes every scattered point as its own instance transform."""
+
+    def __init__(self, scene):
+        self.scene = scene
+
+    def iter_write(self, sources, source_indices, matrices, batch,
+                   chunk_size=CHUNK_SIZE):
+        """Creates the scattered instances under the group of batch, a
+        chunk at a time, and adds their names to the batch.
+
+        Yields
+            int: The number of instances created by each chunk
+        """
+        for start in range(0, len(source_indices), chunk_size):
+            end = start + chunk_size
+            nodes = [self.scene.instance(sources[index])
+                     for index in source_indices[start:end]]
+            nodes = self.scene.parent(nodes, batch.group)
+            for node, matrix in zip(nodes, matrices[start:end]):
+                self.scene.set_matrix(node, matrix)
+            batch.nodes.extend(nodes)
+            yield len(nodes)
+
+
+class InstancerOutput(object):
+    """Writes all scattered points into a single particle instancer.
+
+    The scatter costs one node no matter how many points it has, which
+    keeps very large scatters usable.
+    """
+
+    def __init__(self, scene):
+        self.scene = scene
+
+    def iter_write(self, sources, source_indices, matrices, batch,
+                   chunk_size=CHUNK_SIZE):
+        """Creates the instancer for the scattered points under the group
+        of batch, and adds its nodes to the batch.
+
+        The instancer is a single node, so it is written in one chunk.
+
+        Yields
+            int: The number of points written
+        """
+        positions, rotations, scales = \
+            scattercore.decompose_transforms(matrices)
+        nodes = self.scene.create_instancer(sources, positions, rotations,
+                                            scales, source_indices)
+        batch.nodes.extend(self.scene.parent(nodes, batch.group))
+        yield len(source_indices)
+
+
+OUTPUTS = {
+    OUTPUT_TRANSFORMS: TransformOutput,
+    OUTPUT_INSTANCER: InstancerOutput,
+}
+
+
+class ScatterJob(object):
+    """A scatter that creates its instances a chunk at a time.
+
+    Call step() until it returns False, for example from a QTimer, so
+    Maya stays responsive in between. Every step is its own undo chunk,
+    so edits made in Maya between steps are never undone with the
+    scatter, but Ctrl+Z then takes one step back at a time. The whole
+    job is undone at once by deleting its group node, as
+    delete_scatters does, and a cancelled job keeps the instances it
+    already made in that group. Scatterer.scatter runs all the steps in
+    one chunk instead. A job of a profiling Scatterer keeps a
+    ScatterProfile of its phases in profile.
+
+    Given a stored ScatterBatch or PointCache, the job writes it into
+    the scene instead of planning a new scatter, in place of the batch
+    in replaces if that is given. batch is the ScatterBatch the job
+    writes, which is None until the first step makes it.
+    """
+
+    def __init__(self, scatterer, chunk_size=CHUNK_SIZE, stored=None,
+                 replaces=None):
+        self.scatterer = scatterer
+        self.profile = None
+        if scatterer.profiling:
+            import scatterprofile
+            self.profile = scatterprofile.ScatterProfile(
+                scatterer.profile_path)
+        self.batch = None
+        self._steps = scatterer._iter_scatter(self, chunk_size, stored,
+                                              replaces)
+        self.done = 0
+        self.total = None
+        self.cancelled = False
+        self.finished = False
+        self.seconds = 0.0
+        self._start = time.time()
+
+    def step(self):
+        """Creates the next chunk of instances.
+
+        Returns
+            bool: False once the job has finished
+        """
+        if self.finished:
+            return False
+        scene = self.scatterer.scene
+        scene.open_undo_chunk("scatter")
+        try:
+            if self.profile is None:
+                self.done, self.total = next(self._steps)
+            else:
+                self.done, self.total = self.profile.call(
+                    "scatter", next, self._steps)
+        except StopIteration:
+            self._finish()
+            return False
+        finally:
+            scene.close_undo_chunk()
+        return True
+
+    def cancel(self):
+        self.cancelled = True
+        self._finish()
+
+    @property
+    def instances_per_second(self):
+        return self.done / max(self.seconds, 1e-9)
+
+    def _finish(self):
+        self._steps.close()
+        self.finished = True
+        self.seconds = time.time() - self._start
+        log.info("Scattered %d instances in %.2fs (%.0f/s)%s", self.done,
+                 self.seconds, self.instances_per_second,
+                 ", cancelled" if self.cancelled else "")
+        if self.profile is not None:
+            self.profile.dump()
+            self.scatterer.last_profile = self.profile
+            log.info("Scatter profile:\n  %s",
+                     "\n  ".join(self.profile.summary()))
+
+
+class Scatterer(object):
+
+    def __init__(self, mesh_reader=None, scene=None):
+        self.mesh_reader = mesh_reader or OpenMayaMeshReader()
+        self.mesh_cache = scattercore.MeshCache(self.mesh_reader)
+        self.scene = scene or MayaScene()
+        self.output_mode = OUTPUT_TRANSFORMS
+        self.scatter_targets = []
+        self.scatter_sources = []
+        self.scatter_instances = []
+        self.deleted_scatters = []
+        self.alignment = True
+        self.alignment_mode = ALIGN_MATRIX
+        self.scatter_density = 1
+        self.seed = None
+        self.sampling_strategy = scattercore.SAMPLING_AUTO
+        self.sampling_mode = scattercore.SAMPLE_VERTICES
+        self.min_distance = 0.0
+        self.streaming = False
+        self.workers = 1
+        self.cull_camera = "persp"
+        self.cull_distance = 0.0
+        self.cull_frustum = True
+        self.cull_lod = False
+        self.cull_radius = 0.0
+        self.result_cache = scattercache.ResultCache()
+        self.profiling = False
+        self.profile_path = None
+        self.last_profile = None
+        self._profile = None
+
+        # Scale Min    X Y Z
+        # Scale Max    X Y Z
+        # Rotation Min X Y Z
+        # Rotation Max X Y Z
+        # Position Min X Y Z
+        # Position Max X Y Z
+        w, h = 3, 6
+        self.attribute_array = [[0 for x in range(w)] for y in range(h)]
+        self.attribute_array[0] = [1, 1, 1]
+        self.attribute_array[1] = [1, 1, 1]
+
+    def set_scatter_targets(self):
+        self.scatter_targets = cmds.ls(os=True, fl=True) or []
+
+    def add_scatter_targets(self):
+        self.scatter_targets.extend(cmds.ls(os=True, fl=True) or [])
+
+    def select_scatter_targets(self):
+        cmds.select(self.scatter_targets)
+
+    def set_scatter_sources(self):
+        self.scatter_sources = cmds.ls(os=True, fl=True) or []
+
+    def add_scatter_sources(self):
+        self.scatter_sources.extend(cmds.ls(os=True, fl=True) or [])
+
+    def select_scatter_sources(self):
+        cmds.select(self.scatter_sources)
+
+    def scatter(self):
+        """Scatters the sources over the targets as one batch.
+
+        The batch is a single undo chunk, and everything it creates is
+        parented under one group node. scatter_instances keeps a
+        ScatterBatch of every scatter.
+
+        Returns
+            str: The group node of the batch
+        """
+        job = self.scatter_job()
+        self.scene.open_undo_chunk("scatter")
+        try:
+            while job.step():
+                pass
+        finally:
+            self.scene.close_undo_chunk()
+        return self.scatter_instances[-1].group
+
+    def scatter_job(self, chunk_size=CHUNK_SIZE):
+        """Returns a job that scatters a chunk of instances per step."""
+        return ScatterJob(self, chunk_size)
+
+    def reapply_job(self, batch=None, output_mode=None,
+                    chunk_size=CHUNK_SIZE):
+        """Returns a job that writes a stored batch into the scene again.
+
+        By default the last deleted batch is brought back. A batch that
+        is still in the scene is replaced, for example to write it with
+        another output mode.
+        """
+        if batch is None:
+            if not self.deleted_scatters:
+                raise ValueError("There is no deleted scatter to reapply")
+            batch = self.deleted_scatters.pop(-1)
+        if output_mode is not None:
+            batch.output_mode = output_mode
+        replaces = batch if batch in self.scatter_instances else None
+        return ScatterJob(self, chunk_size, batch, replaces)
+
+    def cull_job(self, batch=None, chunk_size=CHUNK_SIZE):
+        """Returns a job that rewrites a batch with only what cull_camera
+        sees, the last batch by default.
+
+        Instances outside the camera frustum, if cull_frustum is set, or
+        farther than cull_distance, if that is not 0, are left out. With
+        cull_lod the scatter sources are taken as levels of detail, the
+        most detailed first, over even bands up to cull_distance or, if
+        that is 0, the farthest kept instance. Culling always starts
+        from the whole batch, so running it again after the camera moves
+        re-culls the scatter.
+        """
+        if batch is None:
+            batch = self.scatter_instances[-1]
+        full = batch if batch.full is None else batch.full
+        view = self.scene.camera_view(self.cull_camera)
+        lod_distances = None
+        lods = len(full.sources) if self.cull_lod else 0
+        if self.cull_lod and self.cull_distance:
+            lod_distances = scattercore.even_lod_distances(
+                self.cull_distance, lods)
+        start = time.time()
+        culled = scattercore.cull_batch(full, view, self.cull_distance,
+                                        self.cull_frustum, lod_distances,
+                                        self.cull_radius, lods)
+        log.info("Kept %d of %d instances for %s in %.3fs", len(culled),
+                 len(full), self.cull_camera, time.time() - start)
+        return ScatterJob(self, chunk_size, culled, batch)
+
+    def _iter_scatter(self, job, chunk_size, stored=None, replaces=None):
+        scene, reader = self.scene, self.mesh_cache.reader
+        profile = job.profile
+        if profile is not None:
+            self._profile = profile
+            self.scene = profile.wrap(scene, "scene")
+            self.mesh_cache.reader = profile.wrap(reader, "reader")
+        batches = None
+        try:
+            group = self.scene.create_group("scatterBatch#")
+            key = cached = None
+            if stored is not None:
+                batch = scattercore.ScatterBatch(
+                    group, stored.sources, stored.seed, stored.output_mode)
+                batch.full = getattr(stored, "full", None)
+                batches = self._iter_stored_batches(stored, batch, replaces,
+                                                    chunk_size)
+            elif self.alignment and self.alignment_mode == ALIGN_CONSTRAINT:
+                batch = self._new_batch(group, OUTPUT_TRANSFORMS)
+                batches = self._iter_constraint_batches(batch, chunk_size)
+            else:
+                batch = self._new_batch(group, self.output_mode)
+                sources = [self.scene.get_matrix(source)
+                           for source in self.scatter_sources]
+                key = self._timed("cache", self._result_key, sources)
+                if key is not None:
+                    cached = self.result_cache.get(key)
+                if cached is not None:
+                    batches = self._iter_stored_batches(cached, batch, None,
+                                                        chunk_size)
+                else:
+                    batches = self._iter_matrix_batches(batch, chunk_size,
+                                                        sources)
+            self.scatter_instances.append(batch)
+            job.batch = batch
+            done = 0
+            for chunks, count in batches:
+                total = None if count is None else done + count
+                for written in chunks:
+                    done += written
+                    yield done, total
+            if key is not None and cached is None:
+                self.result_cache.put(key, batch)
+        finally:
+            if batches is not None:
+                batches.close()
+            self.scene, self.mesh_cache.reader = scene, reader
+            self._profile = None
+
+    def _timed(self, name, func, *args):
+        if self._profile is None:
+            return func(*args)
+        return self._profile.call(name, func, *args)
+
+    def _timed_iter(self, name, iterable):
+        if self._profile is None:
+            return iterable
+        return self._profile.iter_timed(name, iterable)
+
+    def _new_batch(self, group, output_mode):
+        seed = self.seed
+        if seed is None:
+            seed = random.randint(0, MAX_SEED)
+        return scattercore.ScatterBatch(group, self.scatter_sources, seed,
+                                        output_mode)
+
+    def _result_key(self, sources):
+        """Returns the result cache key of the scatter, or None.
+
+        Only scatters with a set seed give the same result every time,
+        so the others are never cached.
+        """
+        if self.result_cache is None:
+            return None
+        return scattercache.result_key(
+            self.mesh_cache, self.scatter_targets,
+            self.scatter_sources, self._settings(self.seed), sources)
+
+    def _settings(self, seed):
+        return scattercore.ScatterSettings(
+            self.attribute_array, self.scatter_density, self.alignment,
+            seed, self.sampling_strategy, self.sampling_mode,
+            self.min_distance)
+
+    def _iter_transforms(self, seed, sources):
+        settings = self._settings(seed)
+        if self.streaming or self.workers > 1:
+            import scatterpool
+            transforms = scatterpool.iter_target_transforms(
+                self.scatter_targets, self.mesh_cache,
+                len(self.scatter_sources), settings, self.workers,
+                sources=sources)
+            return self._timed_iter("compute", transforms)
+        plans = self._timed_iter("plan", scattercore.iter_plans(
+            self.scatter_targets, self.mesh_cache,
+            len(self.scatter_sources), settings, self.streaming))
+        return ((plan.source_indices,
+                 self._timed("transforms", scattercore.plan_transforms,
+                             samples, plan, self.alignment, sources))
+                for samples, plan in plans)
+
+    def _iter_matrix_batches(self, batch, chunk_size, sources):
+        output = OUTPUTS[batch.output_mode](self.scene)
+        known_total = not self.streaming and self.workers <= 1
+        transforms = self._iter_transforms(batch.seed, sources)
+        for source_indices, matrices in transforms:
+            chunks = self._timed_iter("write", output.iter_write(
+                batch.sources, source_indices, matrices, batch, chunk_size))
+            chunks = self._iter_added(chunks, batch.add, source_indices,
+                                      matrices)
+            yield chunks, len(source_indices) if known_total else None
+
+    def _iter_stored_batches(self, stored, batch, replaces, chunk_size):
+        if replaces in self.scatter_instances:
+            self.scatter_instances.remove(replaces)
+            if self.scene.exists(replaces.group):
+                self.scene.delete([replaces.group])
+        output = OUTPUTS[batch.output_mode](self.scene)
+        # An instancer holds every point, so it is written in one go.
+        read_size = chunk_size
+        if batch.output_mode != OUTPUT_TRANSFORMS:
+            read_size = max(len(stored), 1)
+        done = 0
+        try:
+            chunks_read = stored.iter_chunks(read_size)
+            for source_indices, positions, rotations, scales in chunks_read:
+                matrices = self._timed("transforms",
+                                       scattercore.trs_matrices, positions,
+                                       rotations, scales)
+                chunks = self._timed_iter("write", output.iter_write(
+                    batch.sources, source_indices, matrices, batch,
+                    chunk_size))
+                chunks = self._iter_added(chunks, batch.add_transforms,
+                                          source_indices, positions,
+                                          rotations, scales)
+                yield chunks, len(stored) - done
+                done += len(source_indices)
+        finally:
+            # A cancelled or failed import must not keep the cache file
+            # open, which would lock it on Windows.
+            if hasattr(stored, "close"):
+                stored.close()
+
+    def _iter_added(self, chunks, add, *columns):
+        """Passes on the counts of written chunks, adding the matching
+        rows of columns to the batch with add after each one.
+
+        The batch then only holds instances that are in the scene, also
+        when the job is cancelled part way.
+        """
+        start = 0
+        for written in chunks:
+            self._timed("store", add, *[column[start:start + written]
+                                        for column in columns])
+            start += written
+            yield written
+
+    def _iter_constraint_batches(self, batch, chunk_size):
+        if self.workers > 1:
+            log.warning("Constraint alignment is computed in this process.")
+        plans = self._timed_iter("plan", scattercore.iter_plans(
+            self.scatter_targets, self.mesh_cache,
+            len(self.scatter_sources), self._settings(batch.seed),
+            self.streaming))
+        for samples, plan in plans:
+            chunks = self._iter_scatter_with_constraints(samples, plan,
+                                                         batch, chunk_size)
+            total = None if self.streaming else len(plan)
+            yield self._timed_iter("write", chunks), total
+
+    def _iter_scatter_with_constraints(self, samples, plan, batch,
+                                       chunk_size):
+        if self.output_mode != OUTPUT_TRANSFORMS:
+            log.warning("Constraint alignment always creates transforms.")
+        commands = cmds
+        if self._profile is not None:
+            commands = self._profile.wrap(cmds, "cmds")
+        new_instances = []
+        for n, i in enumerate(plan.vertexes):
+            _, position, _ = samples.vertex(i)
+
+            new_instance = commands.instance(
+                self.scatter_sources[plan.source_indices[n]])[0]
+            new_instances.append(new_instance)
+
+            commands.move(position[0], position[1], position[2],
+                          new_instance, a=True, ws=True)
+
+            target = samples.component(i)
+            commands.normalConstraint(target, new_instance)
+            commands.normalConstraint(target, new_instance, rm=True)
+
+            scale = plan.scales[n]
+            rotation = plan.rotations[n]
+            position = plan.offsets[n]
+
+            commands.scale(scale[0], scale[1], scale[2],
+                           new_instance, r=True)
+            commands.rotate(rotation[0], rotation[1], rotation[2],
+                            new_instance, r=True)
+            commands.move(position[0], position[1], position[2],
+                          new_instance, r=True, os=True, wd=True)
+
+            if len(new_instances) == chunk_size:
+                self._store_constrained(batch, plan, n + 1, new_instances)
+                yield len(new_instances)
+                new_instances = []
+
+        self._store_constrained(batch, plan, len(plan), new_instances)
+        yield len(new_instances)
+
+    def _store_constrained(self, batch, plan, end, nodes):
+        """Parents constrained instances and stores where they ended up.
+        """
+        nodes = self.scene.parent(nodes, batch.group)
+        if not nodes:
+            return
+        matrices = [self.scene.get_matrix(node) for node in nodes]
+        batch.add(plan.source_indices[end - len(nodes):end], matrices)
+        batch.nodes.extend(nodes)
+
+    def delete_scatters(self):
+        """Deletes the last scatter batch by deleting its group node.
+
+        The batch is kept in deleted_scatters, so reapply_job can bring
+        it back. Batches whose group is already gone, as when their
+        steps were undone in Maya, are dropped on the way.
+
+        Returns
+            ScatterBatch: The deleted batch, or None
+        """
+        while self.scatter_instances:
+            batch = self.scatter_instances.pop(-1)
+            if not self.scene.exists(batch.group):
+                continue
+            self.scene.delete([batch.group])
+            self.deleted_scatters.append(batch)
+            del self.deleted_scatters[:-DELETED_SCATTERS_KEPT]
+            return batch
+        return None
+
+    def export_scatter(self, path, batch=None):
+        """Writes the instances of a batch, the last by default, to a
+        point cache, or to a CSV file if path does not end in .pcache.
+        """
+        import pointcache
+        if batch is None:
+            batch = self.scatter_instances[-1]
+        if path.endswith(pointcache.EXTENSION):
+            return pointcache.write_batch(batch, path)
+        batch.export_csv(path)
+        return path
+
+    def import_job(self, path, output_mode=None, chunk_size=CHUNK_SIZE):
+        """Returns a job that streams a point cache into the scene as a
+        new batch, with the output mode it was exported with by default.
+        """
+        import pointcache
+        cache = pointcache.PointCache(path)
+        if output_mode is not None:
+            cache.output_mode = output_mode
+        return ScatterJob(self, chunk_size, cache)
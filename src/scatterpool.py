@@ -0,0 +1,207 @@
+import copy
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+try:
+    from concurrent import futures
+    from multiprocessing import shared_memory
+except ImportError:
+    futures = None
+    shared_memory = None
+
+import scattercore
+from scattercore import np
+
+# Long enough that every warm up task gets a process of its own.
+WARM_UP_SECONDS = 0.05
+
+
+def parallel_available():
+    """Returns whether targets can be computed in worker processes."""
+    return (futures is not None and shared_memory is not None and
+            np is not None)
+
+
+def worker_executable():
+    """Returns the Python interpreter the worker processes should run.
+
+    Inside the Maya GUI sys.executable is Maya itself, so the workers
+    are started with the mayapy next to it instead.
+    """
+    folder, name = os.path.split(sys.executable)
+    if name.lower().startswith("maya") and \
+            not name.lower().startswith("mayapy"):
+        return os.path.join(folder, "mayapy" + os.path.splitext(name)[1])
+    return sys.executable
+
+
+class SharedArray(object):
+    """A NumPy array in shared memory, passed between processes by name.
+
+    Pickling a SharedArray only sends its name, shape and type, so the
+    data itself is never copied through the process pool.
+    """
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).str
+        size = max(int(np.prod(self.shape)) * np.dtype(dtype).itemsize, 1)
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True,
+                                                      size=size)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self.name = self._memory.name
+
+    @classmethod
+    def copy_of(cls, array):
+        array = np.ascontiguousarray(array)
+        shared = cls(array.shape, array.dtype)
+        np.ndarray(shared.shape, shared.dtype,
+                   buffer=shared._memory.buf)[...] = array
+        return shared
+
+    def __getstate__(self):
+        return self.shape, self.dtype, self.name
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def read(self):
+        """Returns a private copy of the array and detaches from it."""
+        view = np.ndarray(self.shape, self.dtype, buffer=self._memory.buf)
+        array = view.copy()
+        del view
+        self._memory.close()
+        return array
+
+    def take(self):
+        """Returns a private copy of the array and frees the memory."""
+        array = self.read()
+        self._memory.unlink()
+        return array
+
+    def close(self):
+        self._memory.close()
+
+    def unlink(self):
+        self._memory.close()
+        self._memory.unlink()
+
+
+def _warm_up():
+    time.sleep(WARM_UP_SECONDS)
+
+
+def start_pool(workers):
+    """Starts a pool of worker processes and waits until all are up.
+
+    Starting the processes and importing NumPy in them takes a while, so
+    a pool can be started once and passed to iter_target_transforms for
+    many scatters. Shut it down when done.
+
+    Returns
+        ProcessPoolExecutor: The running pool
+    """
+    context = multiprocessing.get_context("spawn")
+    context.set_executable(worker_executable())
+    pool = futures.ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=context)
+    for job in [pool.submit(_warm_up) for _ in range(workers)]:
+        job.result()
+    return pool
+
+
+def _transform_target(name, arrays, indices, source_count, settings, seed,
+                      index, sources):
+    positions, normals, triangles = [
+        None if array is None else array.read() for array in arrays]
+    mesh = scattercore.MeshData.from_arrays(name, positions, normals,
+                                            triangles)
+    samples, plan = scattercore.plan_target(mesh, indices, source_count,
+                                            settings, seed, index)
+    matrices = scattercore.plan_transforms(samples, plan, settings.alignment,
+                                           sources)
+    source_indices = SharedArray.copy_of(
+        np.asarray(plan.source_indices, dtype=np.int64))
+    matrices = SharedArray.copy_of(np.asarray(matrices, dtype=np.float64))
+    source_indices.close()
+    matrices.close()
+    return source_indices, matrices
+
+
+def _share_mesh(mesh, settings):
+    triangles = None
+    if settings.mode != scattercore.SAMPLE_VERTICES:
+        triangles = SharedArray.copy_of(mesh.triangles)
+    return (SharedArray.copy_of(mesh.positions),
+            SharedArray.copy_of(mesh.normals), triangles)
+
+
+def iter_target_transforms(targets, reader, source_count, settings,
+                           workers=1, pool=None, sources=None):
+    """Computes the instance transforms of every target, in parallel.
+
+    Meshes are read here, on the calling thread, and handed to a pool of
+    worker processes through shared memory. Each target is computed by
+    scattercore.plan_target, so the results are the same for any number
+    of workers. They also match the serial, streaming scatter used when
+    workers is 1 or the pool is not available. Given a pool from
+    start_pool it is used instead of starting one, and left running.
+    sources are the world matrices of the sources, passed on to
+    scattercore.plan_transforms.
+
+    Yields
+        tuple: The source indices and world matrices of each target, in
+            target order
+    """
+    seed = settings.seed
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    if workers <= 1 or not parallel_available():
+        settings = copy.copy(settings)
+        settings.seed = seed
+        plans = scattercore.iter_plans(targets, reader, source_count,
+                                       settings, streaming=True)
+        for samples, plan in plans:
+            yield plan.source_indices, scattercore.plan_transforms(
+                samples, plan, settings.alignment, sources)
+        return
+
+    meshes = [(name, indices, scattercore.mesh_data(reader, name))
+              for name, indices in scattercore.parse_scatter_targets(targets)]
+
+    own_pool = pool is None
+    if own_pool:
+        context = multiprocessing.get_context("spawn")
+        context.set_executable(worker_executable())
+        pool = futures.ProcessPoolExecutor(max_workers=workers,
+                                           mp_context=context)
+    shared = []
+    jobs = []
+    try:
+        for index, (name, indices, mesh) in enumerate(meshes):
+            arrays = _share_mesh(mesh, settings)
+            shared.extend(array for array in arrays if array is not None)
+            jobs.append(pool.submit(
+                _transform_target, name, arrays, indices, source_count,
+                settings, seed, index, sources))
+        while jobs:
+            source_indices, matrices = jobs[0].result()
+            jobs.pop(0)
+            yield source_indices.take(), matrices.take()
+    finally:
+        for job in jobs:
+            job.cancel()
+        if own_pool:
+            pool.shutdown(wait=True)
+        for job in jobs:
+            if not job.cancelled() and job.exception() is None:
+                for array in job.result():
+                    array.unlink()
+        for array in shared:
+            array.unlink()
@@ -0,0 +1,122 @@
+import collections
+import cProfile
+import time
+
+
+class ScatterProfile(object):
+    """Cumulative time and call counts of the phases of a scatter.
+
+    Phases nest, and each is kept under the path of phases it ran in,
+    with its total time and its own time without the phases inside it.
+    Given a dump path, the run is also recorded with cProfile.
+    """
+
+    def __init__(self, dump_path=None):
+        self.dump_path = dump_path
+        self.phases = collections.OrderedDict()
+        self._stack = []
+        self._profiler = cProfile.Profile() if dump_path else None
+
+    def call(self, name, func, *args):
+        """Calls func as the named phase, and returns its result."""
+        stack = self._stack
+        path = (stack[-1][0] if stack else ()) + (name,)
+        stack.append([path, 0.0])
+        if self._profiler is not None and len(stack) == 1:
+            self._profiler.enable()
+        start = time.time()
+        try:
+            return func(*args)
+        finally:
+            seconds = time.time() - start
+            if self._profiler is not None and len(stack) == 1:
+                self._profiler.disable()
+            _, inner = stack.pop()
+            if stack:
+                stack[-1][1] += seconds
+            record = self.phases.get(path)
+            if record is None:
+                record = self.phases[path] = [0.0, 0.0, 0]
+            record[0] += seconds
+            record[1] += seconds - inner
+            record[2] += 1
+
+    def iter_timed(self, name, iterable):
+        """Times every step of an iterator as the named phase.
+
+        Only the steps are timed, not the code using the items between
+        them.
+        """
+        iterator = iter(iterable)
+        while True:
+            try:
+                item = self.call(name, next, iterator)
+            except StopIteration:
+                return
+            yield item
+
+    def wrap(self, target, prefix):
+        """Returns target with every method call timed as a phase."""
+        return _Profiled(target, self, prefix)
+
+    def totals(self):
+        """Sums the phases by name, wherever they ran.
+
+        Returns
+            list: (name, own seconds, calls) tuples, the slowest first
+        """
+        totals = collections.defaultdict(lambda: [0.0, 0])
+        for path, (_, own, calls) in self.phases.items():
+            totals[path[-1]][0] += own
+            totals[path[-1]][1] += calls
+        return sorted(((name, own, calls)
+                       for name, (own, calls) in totals.items()),
+                      key=lambda total: total[1], reverse=True)
+
+    def summary(self, limit=None):
+        """Returns one line per phase, the slowest first."""
+        totals = self.totals()
+        overall = sum(own for _, own, _ in totals) or 1e-9
+        return ["{0} {1:.0%} {2:.3f}s {3} calls".format(
+            name, own / overall, own, calls)
+            for name, own, calls in totals[:limit]]
+
+    def write_folded(self, path):
+        """Writes the phases as folded stacks for flamegraph tools."""
+        with open(path, "w") as folded:
+            for phase, (_, own, _) in self.phases.items():
+                folded.write("{0} {1}\n".format(
+                    ";".join(phase), int(round(own * 1e6))))
+
+    def dump(self):
+        """Writes the cProfile stats to dump_path, and the phases as
+        folded stacks next to it."""
+        if self._profiler is None:
+            return
+        self._profiler.dump_stats(self.dump_path)
+        self.write_folded(self.dump_path + ".folded")
+
+
+class _Profiled(object):
+
+    def __init__(self, target, profile, prefix):
+        self._target = target
+        self._profile = profile
+        self._prefix = prefix
+        self._methods = {}
+
+    def __getattr__(self, name):
+        method = self._methods.get(name)
+        if method is None:
+            attr = getattr(self._target, name)
+            if not callable(attr):
+                return attr
+            phase = self._prefix + "." + name
+            call = self._profile.call
+
+            def method(*args, **kwargs):
+                if kwargs:
+                    return call(phase, lambda: attr(*args, **kwargs))
+                return call(phase, attr, *args)
+            self._methods[name] = method
+        return method
@@ -0,0 +1,643 @@
+import errno
+import gzip
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import savemetrics
+from fileutil import replace_file
+
+log = logging.getLogger(__name__)
+
+SCENE_TYPES = {".ma": "mayaAscii", ".mb": "mayaBinary"}
+COMPRESS_NONE = "none"
+COMPRESS_GZIP = "gzip"
+COMPRESS_ZSTD = "zstd"
+ARCHIVE_EXTENSIONS = {COMPRESS_GZIP: ".gz", COMPRESS_ZSTD: ".zst"}
+VERSION_PATTERN = re.compile(
+    r"^(?P<descriptor>[^_]+)_(?P<task>[^_]+)_v(?P<version>\d+)"
+    r"(?P<ext>\.[^.]+)(?P<archive>\.gz|\.zst|\.manifest)?$")
+# A folder changed this soon before it was scanned may change again
+# within the same mtime tick, so it is scanned again on the next lookup.
+RACY_SECONDS = 2.0
+RESERVATION_SUFFIX = ".reserved"
+# A placeholder older than this was left by a save that crashed, so its
+# version is free again.
+RESERVATION_SECONDS = 30 * 60
+# Failed claims in a row after which the folder is scanned again, as
+# other saves took more versions than probing should step over.
+RESCAN_PROBES = 4
+COPY_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def _cmds():
+    """Imports maya.cmds on first use, so SceneFile loads without Maya."""
+    import maya.cmds
+    return maya.cmds
+
+
+def _versionstore():
+    """Imports versionstore on first use, as it loads NumPy."""
+    import versionstore
+    return versionstore
+
+
+def default_folder():
+    """Returns the scenes folder of the current Maya project."""
+    root = _cmds().workspace(query=True, rootDirectory=True)
+    return os.path.join(root, "scenes")
+
+
+def reservation_path(folder, descriptor, task, version):
+    """Returns the path of the placeholder that claims a version."""
+    return os.path.join(folder, ".{0}_{1}_v{2:03d}{3}".format(
+        descriptor, task, version, RESERVATION_SUFFIX))
+
+
+def reservation_expired(path, now=None):
+    """Tells if a placeholder is older than RESERVATION_SECONDS, by the
+    time written into it.
+
+    A placeholder that is still being written is judged by its
+    modification time instead.
+    """
+    now = time.time() if now is None else now
+    try:
+        with open(path) as placeholder:
+            created = float(placeholder.read().split()[2])
+    except (IOError, OSError):
+        return False
+    except (IndexError, ValueError):
+        try:
+            created = os.path.getmtime(path)
+        except OSError:
+            return False
+    return now - created > RESERVATION_SECONDS
+
+
+def _remove_expired(path):
+    """Removes a placeholder that expired, leaving a fresh one alone.
+
+    The placeholder is first renamed aside, so of many saves finding it
+    expired only one removes it. If another save replaced it with a fresh
+    one in the meantime, that one is put back.
+
+    Returns
+        bool: Whether an expired placeholder was removed
+    """
+    aside = "{0}.{1}.{2}.expired".format(path, savemetrics.HOST,
+                                         os.getpid())
+    try:
+        os.rename(path, aside)
+    except OSError:
+        return False
+    if reservation_expired(aside):
+        os.remove(aside)
+        log.info("Removed the expired placeholder %s", path)
+        return True
+    try:
+        os.link(aside, path)
+    except (AttributeError, OSError):
+        log.warning("Could not put back the placeholder %s", path)
+    os.remove(aside)
+    return False
+
+
+def _list_folder(folder):
+    if hasattr(os, "scandir"):
+        return [entry.name for entry in os.scandir(folder)]
+    return os.listdir(folder)
+
+
+class VersionIndex(object):
+    """The highest version of every scene name in a folder.
+
+    The folder is listed once, and again only when its modification time
+    changes, so lookups do not touch the disk. Versions reserved by this
+    process, or by placeholders of other saves, count as taken even
+    before their files are written.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.versions = {}
+        self.reserved = {}
+        self.mtime = None
+        self.scanned = None
+
+    def refresh(self):
+        """Scans the folder again if it changed since the last scan.
+
+        Returns
+            int: The number of files scanned, or None if not scanned
+        """
+        try:
+            mtime = os.stat(self.folder).st_mtime
+        except OSError:
+            self.versions, self.mtime, self.scanned = {}, None, None
+            return None
+        if mtime != self.mtime or self.scanned - mtime < RACY_SECONDS:
+            return self.scan(mtime)
+        return None
+
+    def scan(self, mtime=None):
+        scanned = time.time()
+        versions = {}
+        names = _list_folder(self.folder)
+        for name in names:
+            if name.startswith(".") and name.endswith(RESERVATION_SUFFIX):
+                path = os.path.join(self.folder, name)
+                if reservation_expired(path, scanned) and \
+                        _remove_expired(path):
+                    continue
+                name = name[1:]
+            match = VERSION_PATTERN.match(name)
+            if match and (match.group("ext") in SCENE_TYPES or
+                          match.group("ext") == RESERVATION_SUFFIX):
+                key = match.group("descriptor", "task")
+                version = int(match.group("version"))
+                if version > versions.get(key, 0):
+                    versions[key] = version
+        self.versions, self.mtime, self.scanned = versions, mtime, scanned
+        return len(names)
+
+    def latest(self, descriptor, task):
+        """Returns the highest version of a scene name in any format, or
+        0 if there is none."""
+        key = (descriptor, task)
+        return max(self.versions.get(key, 0), self.reserved.get(key, 0))
+
+    def add(self, descriptor, task, version):
+        """Records a version saved to the folder by this process."""
+        key = (descriptor, task)
+        self.reserved[key] = max(self.reserved.get(key, 0), version)
+
+    def reserve(self, descriptor, task):
+        """Takes the next free version of a scene name.
+
+        Returns
+            int: A version no other save in this process will get
+        """
+        version = self.latest(descriptor, task) + 1
+        self.add(descriptor, task, version)
+        return version
+
+
+_version_indexes = {}
+_version_lock = threading.Lock()
+
+
+def version_index(folder, metrics=None, refresh=True):
+    """Returns the up to date VersionIndex of a folder.
+
+    Without refresh a folder is only scanned the first time. A rescan of
+    the folder is recorded in metrics, if given.
+    """
+    folder = os.path.normpath(os.path.abspath(folder))
+    with _version_lock:
+        index = _version_indexes.get(folder)
+        if index is None:
+            index = _version_indexes[folder] = VersionIndex(folder)
+        start = time.time()
+        scanned = None
+        if refresh or index.scanned is None:
+            scanned = index.refresh()
+    if metrics is not None and scanned is not None:
+        metrics.add_phase("scan", time.time() - start)
+        metrics.count("files_scanned", scanned)
+    return index
+
+
+def _version_saved(folder, descriptor, task, version):
+    name = "{0}_{1}_v{2:03d}".format(descriptor, task, version)
+    suffixes = [""] + list(ARCHIVE_EXTENSIONS.values()) + [".manifest"]
+    return any(os.path.exists(os.path.join(folder, name + ext + suffix))
+               for ext in SCENE_TYPES for suffix in suffixes)
+
+
+def claim_version(folder, descriptor, task, version):
+    """Claims a version for a save by creating its placeholder.
+
+    The placeholder is created with O_EXCL, which only one process can
+    do, also across workstations on a local disk or NFSv3 or later share.
+    A version whose scene was already saved is not claimed.
+
+    Returns
+        bool: Whether the version is now ours to save
+    """
+    path = reservation_path(folder, descriptor, task, version)
+    try:
+        handle = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except OSError as err:
+        if err.errno == errno.EEXIST:
+            if reservation_expired(path) and _remove_expired(path):
+                return claim_version(folder, descriptor, task, version)
+            return False
+        if err.errno != errno.ENOENT:
+            raise
+        try:
+            os.makedirs(folder)
+        except OSError:
+            if not os.path.isdir(folder):
+                raise
+        return claim_version(folder, descriptor, task, version)
+    with os.fdopen(handle, "w") as placeholder:
+        placeholder.write("{0} {1} {2:.3f}\n".format(
+            savemetrics.HOST, os.getpid(), time.time()))
+    if _version_saved(folder, descriptor, task, version):
+        release_version(folder, descriptor, task, version)
+        return False
+    return True
+
+
+def release_version(folder, descriptor, task, version):
+    """Removes the placeholder of a claimed version."""
+    try:
+        os.remove(reservation_path(folder, descriptor, task, version))
+    except OSError as err:
+        if err.errno != errno.ENOENT:
+            raise
+
+
+def reserve_version(folder, descriptor, task, metrics=None):
+    """Reserves the next free version of a scene name in a folder.
+
+    Versions are claimed with placeholder files, starting after the
+    highest version this process knows of, so no other save on any
+    workstation gets the same version and no lock is held across them.
+    Versions taken since the folder was last scanned are skipped by
+    their placeholders or scene files, one probe each, so the folder is
+    only scanned again once RESCAN_PROBES probes in a row fail. Release
+    the version once its scene is saved.
+    """
+    index = version_index(folder, metrics, refresh=False)
+    with _version_lock:
+        version = index.latest(descriptor, task) + 1
+        attempts = 1
+        failed = 0
+        while not claim_version(index.folder, descriptor, task, version):
+            attempts += 1
+            failed += 1
+            version += 1
+            if failed >= RESCAN_PROBES:
+                failed = 0
+                start = time.time()
+                scanned = index.refresh()
+                if metrics is not None and scanned is not None:
+                    metrics.add_phase("scan", time.time() - start)
+                    metrics.count("files_scanned", scanned)
+                version = max(version, index.latest(descriptor, task) + 1)
+        index.add(descriptor, task, version)
+    if metrics is not None:
+        metrics.count("claim_attempts", attempts)
+    return version
+
+
+def compressions():
+    """Returns the archive compressions this Python can write."""
+    available = [COMPRESS_NONE, COMPRESS_GZIP]
+    if zstandard is not None:
+        available.append(COMPRESS_ZSTD)
+    return available
+
+
+def _compressor(raw, name, compression):
+    if compression == COMPRESS_GZIP:
+        return gzip.GzipFile(filename=name, mode="wb", fileobj=raw)
+    if zstandard is None:
+        raise IOError("The zstandard module is needed to write " + name)
+    return zstandard.ZstdCompressor().stream_writer(raw)
+
+
+def _fsync(path):
+    handle = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(handle)
+    finally:
+        os.close(handle)
+
+
+class SaveJob(object):
+    """Moves a scene saved to a local temp file into place.
+
+    The file is copied next to its destination under a temporary name
+    and renamed over it once complete, so the destination is never left
+    half written. If that fails the local file is kept, as the only
+    copy of the scene. A compressed archive copy can be written next to
+    it the same way, and if only that fails the scene is still saved and
+    the failure is kept in archive_error. Given a VersionStore, only the
+    new chunks of the scene are stored and path gets a manifest instead
+    of a full copy. Run it with start() to copy on a background thread.
+    The version claimed in reservation, a (folder, descriptor, task,
+    version) tuple, is released once the job is done.
+    """
+
+    def __init__(self, local_path, path, compression=COMPRESS_NONE,
+                 store=None, metrics=None, reservation=None):
+        self.local_path = local_path
+        self.path = path
+        self.compression = compression
+        self.store = store
+        self.reservation = reservation
+        self.metrics = metrics or savemetrics.SaveMetrics(
+            os.path.dirname(path), path)
+        self.total = os.path.getsize(local_path)
+        if compression != COMPRESS_NONE:
+            self.total *= 2
+        self.copied = 0
+        self.error = None
+        self.archive_error = None
+        self.done = False
+        self._thread = None
+
+    @property
+    def progress(self):
+        """The fraction of the file copied so far."""
+        if not self.total:
+            return 1.0 if self.done else 0.0
+        return float(self.copied) / self.total
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run,
+                                        name="SaveJob " + self.path)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.done
+
+    @property
+    def manifest_path(self):
+        """The path of the manifest, or None if the scene is copied."""
+        if self.store is None:
+            return None
+        return self.path + _versionstore().MANIFEST_SUFFIX
+
+    @property
+    def archive_path(self):
+        """The path of the compressed copy, or None if there is none."""
+        if self.compression == COMPRESS_NONE:
+            return None
+        return self.path + ARCHIVE_EXTENSIONS[self.compression]
+
+    def run(self):
+        try:
+            folder = os.path.dirname(self.path)
+            if not os.path.isdir(folder):
+                log.warning("Missing directories in path. "
+                            "Creating directories now...")
+                with self.metrics.phase("makedirs"):
+                    try:
+                        os.makedirs(folder)
+                    except OSError:
+                        if not os.path.isdir(folder):
+                            raise
+                self.metrics.count("created_folders")
+            if self.store is None:
+                with self.metrics.phase("copy"):
+                    self._write(self.path, COMPRESS_NONE)
+            else:
+                with self.metrics.phase("store"):
+                    self._write_manifest()
+        except Exception as err:
+            log.error("Could not save %s: %s", self.path, err)
+            log.error("The scene is kept at %s", self.local_path)
+            self.error = err
+        else:
+            if self.archive_path:
+                self._write_archive()
+            os.remove(self.local_path)
+        finally:
+            if self.reservation is not None:
+                release_version(*self.reservation)
+            self.metrics.finish(self.error)
+            self.done = True
+
+    def _write_archive(self):
+        """Writes the compressed copy. The scene itself is already saved,
+        so a failure is only recorded in archive_error."""
+        try:
+            with self.metrics.phase("archive"):
+                self._write(self.archive_path, self.compression)
+        except Exception as err:
+            log.error("Could not write the archive %s: %s",
+                      self.archive_path, err)
+            self.archive_error = err
+            self.metrics.record["archive_error"] = str(err)
+
+    def _write(self, path, compression):
+        handle, partial = tempfile.mkstemp(
+            prefix="." + os.path.basename(path), suffix=".partial",
+            dir=os.path.dirname(path))
+        os.close(handle)
+        try:
+            with open(self.local_path, "rb") as source:
+                with open(partial, "wb") as raw:
+                    if compression == COMPRESS_NONE:
+                        self._copy(source, raw)
+                    else:
+                        name = os.path.basename(self.path)
+                        with _compressor(raw, name, compression) as writer:
+                            self._copy(source, writer)
+            _fsync(partial)
+            shutil.copymode(self.local_path, partial)
+            self.metrics.count("bytes_written", os.path.getsize(partial))
+            replace_file(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+    def _write_manifest(self):
+        stored_bytes = self.store.stored_bytes
+        with open(self.local_path, "rb") as source:
+            manifest = self.store.put(source, self._add_progress)
+        self.store.write_manifest(manifest, self.manifest_path)
+        self.metrics.count("chunks", len(manifest["chunks"]))
+        self.metrics.count("bytes_written",
+                           self.store.stored_bytes - stored_bytes +
+                           os.path.getsize(self.manifest_path))
+
+    def _add_progress(self, size):
+        self.copied += size
+
+    def _copy(self, source, destination):
+        while True:
+            chunk = source.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            destination.write(chunk)
+            self.copied += len(chunk)
+
+
+class SceneFile(object):
+    """An abstract representation of a scene file."""
+
+    def __init__(self, path_text=None):
+        self.compression = COMPRESS_NONE
+        self.deduplicate = False
+        self._reservation = None
+        if path_text:
+            self._init_from_path(path_text)
+        else:
+            scene = _cmds().file(query=True, sceneName=True)
+            if scene:
+                self._init_from_path(scene)
+            else:
+                log.info("Unable to initialize SceneFile object "
+                         "from open scene. Initializing with "
+                         "default values.")
+                self._folder_path = default_folder()
+                self.descriptor = "main"
+                self.task = "model"
+                self.version = 1
+                self.extension = ".ma"
+
+    def _init_from_path(self, path_text):
+        self.folder_path = os.path.dirname(path_text)
+        name, self.extension = os.path.splitext(
+            os.path.basename(path_text))
+        self.descriptor, self.task, ver_str = name.split("_")
+        self.version = int(ver_str.split("v")[-1])
+
+    @property
+    def folder_path(self):
+        return self._folder_path
+
+    @folder_path.setter
+    def folder_path(self, value):
+        self._folder_path = os.path.normpath(value)
+
+    @property
+    def filename(self):
+        pattern = "{descriptor}_{task}_v{ver:03d}{ext}"
+        return pattern.format(descriptor=self.descriptor,
+                              task=self.task,
+                              ver=self.version,
+                              ext=self.extension)
+
+    @property
+    def path(self):
+        return os.path.join(self.folder_path, self.filename)
+
+    def _save_local(self, metrics=None):
+        """Saves the scene to a local temp file and names it self.path.
+
+        Returns
+            SaveJob: The job that moves the temp file to self.path
+        """
+        metrics = metrics or savemetrics.SaveMetrics(self.folder_path)
+        metrics.record["path"] = self.path
+        reservation = self._reservation
+        if reservation != (self.folder_path, self.descriptor, self.task,
+                           self.version):
+            self.release_reservation()
+            reservation = None
+        handle, local_path = tempfile.mkstemp(
+            prefix="smartsave_", suffix=self.extension)
+        os.close(handle)
+        cmds = _cmds()
+        scene = cmds.file(query=True, sceneName=True)
+        try:
+            with metrics.phase("maya_save"):
+                cmds.file(rename=local_path)
+                cmds.file(save=True, force=True,
+                          type=SCENE_TYPES.get(self.extension, "mayaAscii"))
+        except RuntimeError as err:
+            os.remove(local_path)
+            cmds.file(rename=scene or self.path)
+            self.release_reservation()
+            metrics.finish(err)
+            raise
+        cmds.file(rename=self.path)
+        metrics.count("scene_bytes", os.path.getsize(local_path))
+        version_index(self.folder_path).add(
+            self.descriptor, self.task, self.version)
+        store = None
+        if self.deduplicate:
+            store = _versionstore().store_for(self.folder_path)
+        # The job releases the version once the scene is in place.
+        self._reservation = None
+        return SaveJob(local_path, self.path, self.compression, store,
+                       metrics, reservation)
+
+    def save(self, metrics=None):
+        """Saves the scene file.
+
+        Returns
+            str: The path to the scene file if successful
+        """
+        job = self._save_local(metrics)
+        job.run()
+        if job.error is not None:
+            _cmds().file(modified=True)
+            raise job.error
+        return job.path
+
+    def save_async(self, metrics=None):
+        """Saves the scene locally and copies it into place in the
+        background.
+
+        Returns
+            SaveJob: The running copy, to poll for progress
+        """
+        return self._save_local(metrics).start()
+
+    def next_available_version(self):
+        """Return the next available version number in the folder."""
+        return version_index(self.folder_path).latest(
+            self.descriptor, self.task) + 1
+
+    def reserve_next_version(self, metrics=None):
+        """Sets the version to the next one no other save will take.
+
+        The version stays claimed until the next save of this SceneFile
+        has written it.
+        """
+        self.release_reservation()
+        self.version = reserve_version(self.folder_path, self.descriptor,
+                                       self.task, metrics)
+        self._reservation = (self.folder_path, self.descriptor, self.task,
+                             self.version)
+        return self.version
+
+    def release_reservation(self):
+        """Gives up the version claimed by reserve_next_version, if the
+        save it was claimed for never started."""
+        if self._reservation is not None:
+            release_version(*self._reservation)
+            self._reservation = None
+
+    def save_increment(self):
+        """Increments the version and saves the scene file.
+
+        If the file already exists, increments the version number from
+        the largest number in the directory.
+
+        Returns:
+            str: The path to the scene file if successful"""
+        metrics = savemetrics.SaveMetrics(self.folder_path)
+        self.reserve_next_version(metrics)
+        return self.save(metrics)
+
+    def save_increment_async(self):
+        """Increments the version and saves the scene in the background.
+
+        Returns
+            SaveJob: The running copy, to poll for progress
+        """
+        metrics = savemetrics.SaveMetrics(self.folder_path)
+        self.reserve_next_version(metrics)
+        return self.save_async(metrics)
@@ -0,0 +1,536 @@
+"""Re-saves many scenes at once, to convert or re-version them.
+
+    python scenemigrate.py /shows/abc/scenes --format .mb --task layout \\
+        --workers 4 --journal migrate.jsonl
+
+Scenes are found by their SceneFile names, and the new name of each is
+planned with SceneFile, changing its format, descriptor, task or
+numbering. The saves run in a pool of mayapy processes that each stay
+open for many scenes. Every finished save is added to the journal, so
+running the same command again resumes where it stopped, and skips the
+scenes whose source and output are unchanged since. Files are compared
+by size and mtime first, and only hashed again when those changed, so
+the sources are hashed in the workers. --stub copies the files instead
+of opening them in Maya, to try a migration or run it in tests without
+Maya.
+"""
+import argparse
+import copy
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import savemetrics
+import scenefile
+
+log = logging.getLogger(__name__)
+
+RESULT_PREFIX = "SCENEMIGRATE "
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_UNCHANGED = "unchanged"
+STATUS_EXISTS = "exists"
+
+
+class MigrationError(ValueError):
+    """Raised when scenes can not be migrated as asked."""
+
+
+def discover(roots, latest_only=False):
+    """Finds the scenes named as SceneFile names them under roots.
+
+    Returns
+        list: A SceneFile for every scene, by path
+    """
+    scenes = []
+    for root in roots:
+        for folder, _, names in os.walk(root):
+            for name in names:
+                match = scenefile.VERSION_PATTERN.match(name)
+                if (match and match.group("ext") in scenefile.SCENE_TYPES
+                        and not match.group("archive")):
+                    scenes.append(scenefile.SceneFile(
+                        os.path.join(folder, name)))
+    if latest_only:
+        latest = {}
+        for scene in scenes:
+            key = (scene.folder_path, scene.descriptor, scene.task)
+            if key not in latest or scene.version > latest[key].version:
+                latest[key] = scene
+        scenes = list(latest.values())
+    return sorted(scenes, key=lambda scene: scene.path)
+
+
+class Migration(object):
+    """A scene to save again under a new path."""
+
+    def __init__(self, source, output):
+        self.source = source
+        self.output = output
+        self.source_sha256 = None
+
+    def to_dict(self):
+        return {"source": self.source, "output": self.output,
+                "source_sha256": self.source_sha256}
+
+    def hash_source(self):
+        """Hashes the source, unless that was done already.
+
+        Returns
+            dict: The hash and stat of the source
+        """
+        stat = file_stat(self.source)
+        if self.source_sha256 is None:
+            self.source_sha256 = file_hash(self.source)
+        return {"source_sha256": self.source_sha256, "source_stat": stat}
+
+
+class MigrationRule(object):
+    """How the names of migrated scenes change.
+
+    Unset parts of the name are kept. With renumber the versions of
+    every scene name are numbered again from 1, in their old order, and
+    the formats of one version share its new number.
+    """
+
+    def __init__(self, extension=None, descriptor=None, task=None,
+                 renumber=False, folder=None):
+        if extension is not None and \
+                extension not in scenefile.SCENE_TYPES:
+            raise MigrationError("Can not save scenes as " + extension)
+        self.extension = extension
+        self.descriptor = descriptor
+        self.task = task
+        self.renumber = renumber
+        self.folder = folder
+
+    def matches(self, scene):
+        """Tells if a scene is already named the way the rule names them,
+        so it is an output rather than a scene to migrate."""
+        changes = [(self.extension, scene.extension),
+                   (self.descriptor, scene.descriptor),
+                   (self.task, scene.task)]
+        if self.folder:
+            changes.append((os.path.normpath(self.folder),
+                            scene.folder_path))
+        changes = [(new, old) for new, old in changes if new]
+        return bool(changes) and all(new == old for new, old in changes)
+
+    def plan(self, scenes):
+        """Names the output of every scene the rule does not match.
+
+        Raises MigrationError if two scenes would be saved as one, or if
+        a scene would be saved over another scene that is migrated.
+
+        Returns
+            list: A Migration for every scene
+        """
+        migrations = []
+        numbers = {}
+        scenes = [scene for scene in scenes if not self.matches(scene)]
+        for scene in sorted(scenes, key=lambda scene: scene.version):
+            output = copy.copy(scene)
+            output.extension = self.extension or scene.extension
+            output.descriptor = self.descriptor or scene.descriptor
+            output.task = self.task or scene.task
+            if self.folder:
+                output.folder_path = self.folder
+            if self.renumber:
+                # Every format of a version keeps sharing one number.
+                versions = numbers.setdefault(
+                    (output.folder_path, output.descriptor, output.task), {})
+                version = (scene.folder_path, scene.descriptor, scene.task,
+                           scene.version)
+                if version not in versions:
+                    versions[version] = len(versions) + 1
+                output.version = versions[version]
+            migrations.append(Migration(scene.path, output.path))
+        sources = set(scene.path for scene in scenes)
+        outputs = {}
+        for migration in migrations:
+            if migration.output in outputs:
+                raise MigrationError("{0} and {1} would both be saved as "
+                                     "{2}".format(outputs[migration.output],
+                                                  migration.source,
+                                                  migration.output))
+            if (migration.output in sources and
+                    migration.output != migration.source):
+                raise MigrationError("{0} would be saved over {1}, which is "
+                                     "migrated too".format(migration.source,
+                                                           migration.output))
+            outputs[migration.output] = migration.source
+        return sorted(migrations, key=lambda migration: migration.source)
+
+
+def file_hash(path):
+    """Returns the sha256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as hashed:
+        while True:
+            chunk = hashed.read(scenefile.COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_stat(path):
+    """Returns the size and mtime of a file, or None if it is missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime]
+
+
+class Journal(object):
+    """The JSON lines record of finished migrations, one per scene."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["output"]] = entry
+
+    def record(self, entry):
+        with self._lock:
+            self.entries[entry["output"]] = entry
+            if self.path:
+                with open(self.path, "a") as journal_file:
+                    journal_file.write(json.dumps(entry, sort_keys=True) +
+                                       "\n")
+
+    def written(self, migration):
+        """Tells if the output of a migration was saved by an earlier run
+        and not changed since."""
+        entry = self.entries.get(migration.output)
+        if entry is None or entry["status"] != STATUS_OK:
+            return False
+        stat = file_stat(migration.output)
+        return stat is not None and (
+            stat == entry.get("output_stat") or
+            file_hash(migration.output) == entry["output_sha256"])
+
+    def unchanged(self, migration):
+        """Tells if a migration was done and neither of its files changed
+        since.
+
+        The source is only hashed, into the migration, if its size or
+        mtime changed.
+        """
+        entry = self.entries.get(migration.output)
+        if entry is None or entry.get("source_sha256") is None:
+            return False
+        if file_stat(migration.source) != entry.get("source_stat"):
+            migration.hash_source()
+            if migration.source_sha256 != entry["source_sha256"]:
+                return False
+        return self.written(migration)
+
+
+def pending(migrations, journal, overwrite=False):
+    """Splits migrations into the ones to run and the ones to skip.
+
+    Only the scenes in the journal whose files changed size or mtime
+    are hashed here, the rest are hashed by the workers.
+
+    Returns
+        tuple: The migrations to run, and a result dict for every skipped
+            one
+    """
+    todo, skipped = [], []
+    for migration in migrations:
+        if migration.output == migration.source:
+            continue
+        status = None
+        if journal.unchanged(migration):
+            status = STATUS_UNCHANGED
+        elif (os.path.exists(migration.output) and not overwrite and
+              not journal.written(migration)):
+            status = STATUS_EXISTS
+        if status is None:
+            todo.append(migration)
+        else:
+            result = migration.to_dict()
+            result["status"] = status
+            skipped.append(result)
+    return todo, skipped
+
+
+class StubSession(object):
+    """Stands in for Maya by copying the scene file as it is."""
+
+    def __init__(self):
+        self.scene = None
+
+    def open_scene(self, path):
+        self.scene = path
+
+    def save_scene(self, path):
+        shutil.copyfile(self.scene, path)
+
+
+def migrate_scene(session, source, output):
+    """Opens a scene and saves it as output, atomically.
+
+    Returns
+        dict: The hash, size and stat of the output
+    """
+    session.open_scene(source)
+    handle, local_path = tempfile.mkstemp(
+        prefix="scenemigrate_", suffix=os.path.splitext(output)[1])
+    os.close(handle)
+    try:
+        session.save_scene(local_path)
+        output_sha256 = file_hash(local_path)
+    except BaseException:
+        os.remove(local_path)
+        raise
+    job = scenefile.SaveJob(local_path, output)
+    job.run()
+    if job.error is not None:
+        # The source is still there, so the kept local copy is not needed.
+        os.remove(local_path)
+        raise job.error
+    return {"output_sha256": output_sha256,
+            "bytes": os.path.getsize(output),
+            "output_stat": file_stat(output)}
+
+
+def worker_main(stub=False):
+    """Migrates the scenes sent as JSON lines on stdin, one at a time.
+
+    Maya prints to stdout too, so results are marked with
+    RESULT_PREFIX.
+    """
+    if stub:
+        session = StubSession()
+    else:
+        import scattercli
+        session = scattercli.MayaSession()
+    for line in iter(sys.stdin.readline, ""):
+        task = json.loads(line)
+        result = dict(task)
+        start = time.time()
+        try:
+            migration = Migration(task["source"], task["output"])
+            migration.source_sha256 = task.get("source_sha256")
+            result.update(migration.hash_source())
+            result.update(migrate_scene(session, task["source"],
+                                        task["output"]))
+            result["status"] = STATUS_OK
+        except Exception as err:
+            log.exception("Migrating %s failed", task["source"])
+            result["status"] = STATUS_FAILED
+            result["error"] = str(err)
+        result["seconds"] = time.time() - start
+        sys.stdout.write(RESULT_PREFIX + json.dumps(result) + "\n")
+        sys.stdout.flush()
+    return 0
+
+
+class WorkerPool(object):
+    """A fixed number of worker processes, fed from one queue.
+
+    A worker that dies fails the scene it was on and is started again
+    for the next one.
+    """
+
+    def __init__(self, command, size):
+        self.command = command
+        self.size = max(size, 1)
+
+    def run(self, migrations, on_result):
+        tasks = queue.Queue()
+        for migration in migrations:
+            tasks.put(migration)
+        threads = [threading.Thread(target=self._feed,
+                                    args=(tasks, on_result))
+                   for _ in range(min(self.size, len(migrations)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _start(self):
+        return subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE,
+                                universal_newlines=True)
+
+    def _feed(self, tasks, on_result):
+        process = None
+        try:
+            while True:
+                try:
+                    migration = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                if process is None or process.poll() is not None:
+                    process = self._start()
+                on_result(self._send(process, migration))
+        finally:
+            if process is not None and process.poll() is None:
+                process.stdin.close()
+                process.wait()
+
+    def _send(self, process, migration):
+        start = time.time()
+        try:
+            process.stdin.write(json.dumps(migration.to_dict()) + "\n")
+            process.stdin.flush()
+            for line in iter(process.stdout.readline, ""):
+                if line.startswith(RESULT_PREFIX):
+                    return json.loads(line[len(RESULT_PREFIX):])
+        except (IOError, OSError):
+            pass
+        process.kill()
+        process.wait()
+        result = migration.to_dict()
+        result.update(status=STATUS_FAILED, error="The worker died",
+                      seconds=time.time() - start)
+        return result
+
+
+def run_migrations(migrations, pool, journal):
+    """Runs migrations in a WorkerPool and journals every result.
+
+    Returns
+        list: A result dict for every migration
+    """
+    results = []
+    lock = threading.Lock()
+
+    def on_result(result):
+        journal.record(result)
+        with lock:
+            results.append(result)
+            log.info("[%d/%d] %s -> %s: %s", len(results), len(migrations),
+                     result["source"], result["output"], result["status"])
+
+    pool.run(migrations, on_result)
+    return results
+
+
+def summarize(results, seconds):
+    """Sums up a run.
+
+    Returns
+        dict: The count of every status, and the throughput
+    """
+    statuses = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    saved = [result for result in results if result["status"] == STATUS_OK]
+    scene_seconds = [result["seconds"] for result in saved]
+    written = sum(result["bytes"] for result in saved)
+    return {
+        "scenes": len(results),
+        "statuses": statuses,
+        "seconds": seconds,
+        "scenes_per_second": len(saved) / max(seconds, 1e-9),
+        "mb_per_second": written / 1024.0 / 1024.0 / max(seconds, 1e-9),
+        "p50": savemetrics.percentile(scene_seconds, 0.5),
+        "p95": savemetrics.percentile(scene_seconds, 0.95),
+    }
+
+
+def worker_command(mayapy="mayapy", stub=False):
+    """Returns the command that starts one worker process."""
+    command = [sys.executable if stub else mayapy,
+               os.path.abspath(__file__), "--worker"]
+    if stub:
+        command.append("--stub")
+    return command
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("roots", nargs="*", help="Folders to find scenes in")
+    parser.add_argument("--format", choices=sorted(scenefile.SCENE_TYPES),
+                        help="Save the scenes in this format")
+    parser.add_argument("--descriptor", help="Give the scenes this "
+                                             "descriptor")
+    parser.add_argument("--task", help="Give the scenes this task")
+    parser.add_argument("--renumber", action="store_true",
+                        help="Number the versions of every name from 1")
+    parser.add_argument("--output-folder",
+                        help="Save here instead of next to every scene")
+    parser.add_argument("--latest-only", action="store_true",
+                        help="Only migrate the highest version of a name")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Replace outputs that are not in the journal")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--mayapy", default="mayapy")
+    parser.add_argument("--stub", action="store_true",
+                        help="Copy the scenes instead of saving them in "
+                             "Maya")
+    parser.add_argument("--journal", help="Record progress here, and "
+                                          "resume from it")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only list what would be saved where")
+    parser.add_argument("--report", help="Write the results as JSON here")
+    parser.add_argument("--worker", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.worker:
+        return worker_main(args.stub)
+    if not args.roots:
+        parser.error("Give at least one folder to find scenes in")
+
+    try:
+        rule = MigrationRule(args.format, args.descriptor, args.task,
+                             args.renumber, args.output_folder)
+        journal = Journal(args.journal)
+        scenes = [scene for scene in discover(args.roots, args.latest_only)
+                  if scene.path not in journal.entries]
+        migrations = rule.plan(scenes)
+    except MigrationError as err:
+        parser.error(str(err))
+    todo, skipped = pending(migrations, journal, args.overwrite)
+    if args.dry_run:
+        for migration in todo:
+            print("{0} -> {1}".format(migration.source, migration.output))
+        for result in skipped:
+            print("{source} -> {output} ({status})".format(**result))
+        return 0
+
+    start = time.time()
+    pool = WorkerPool(worker_command(args.mayapy, args.stub), args.workers)
+    results = run_migrations(todo, pool, journal) + skipped
+    summary = summarize(results, time.time() - start)
+    print("{scenes} scenes in {seconds:.1f}s: {0}\n"
+          "{scenes_per_second:.2f} scenes/s  {mb_per_second:.1f} MB/s  "
+          "p50 {p50:.2f}s  p95 {p95:.2f}s".format(
+              ", ".join("{0} {1}".format(count, status) for status, count
+                        in sorted(summary["statuses"].items())),
+              **summary))
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump({"summary": summary, "results": results}, report_file,
+                      indent=2)
+    return 1 if summary["statuses"].get(STATUS_FAILED) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,19 @@
 import logging
+import os
 
 from PySide2 import QtWidgets, QtCore
 from shiboken2 import wrapInstance
 import maya.OpenMayaUI as omui
 import maya.cmds as cmds
-import pymel.core as pmc
-from pymel.core.system import Path
+
+from scenefile import SCENE_TYPES, SceneFile, compressions, default_folder
 
 log = logging.getLogger(__name__)
 
+# SceneFile pads versions to at least 3 digits, and goes past v999.
+VERSION_PADDING = 3
+MAX_VERSION = 99999
+
 
 def maya_main_window():
     """Return the maya main window widget"""
@@ -37,6 +42,9 @@ class SmartSaveUI(QtWidgets.QDialog):
         self.folder_layout = self._create_folder_ui()
         self.filename_layout = self._create_filename_ui()
         self.successful_save = QtWidgets.QLabel("")
+        self.save_jobs = []
+        self.save_timer = QtCore.QTimer(self)
+        self.save_timer.setInterval(100)
         self.save_button_layout = self._create_save_button_ui()
         self.main_layout = QtWidgets.QVBoxLayout()
         self.main_layout.addWidget(self.title_label)
@@ -48,9 +56,7 @@ class SmartSaveUI(QtWidgets.QDialog):
         self.setLayout(self.main_layout)
 
     def _create_folder_ui(self):
-        default_folder = Path(cmds.workspace(rootDirectory=True, query=True))
-        default_folder = default_folder / "scenes"
-        self.folder_line_edit = QtWidgets.QLineEdit(default_folder)
+        self.folder_line_edit = QtWidgets.QLineEdit(default_folder())
         self.folder_browse_button = QtWidgets.QPushButton("...")
         layout = QtWidgets.QHBoxLayout()
         layout.addWidget(self.folder_line_edit)
@@ -64,12 +70,14 @@ class SmartSaveUI(QtWidgets.QDialog):
         layout.addWidget(self.descriptor_header_label, 0, 0)
         layout.addWidget(self.task_header_label, 0, 2)
         layout.addWidget(self.version_header_label, 0, 4)
+        layout.addWidget(self.archive_header_label, 0, 6)
         layout.addWidget(self.descriptor_line_edit, 1, 0)
         layout.addWidget(QtWidgets.QLabel("_"), 1, 1)
         layout.addWidget(self.task_line_edit, 1, 2)
         layout.addWidget(QtWidgets.QLabel("_v"), 1, 3)
         layout.addWidget(self.version_spinbox, 1, 4)
-        layout.addWidget(self.extension_label, 1, 5)
+        layout.addWidget(self.extension_combobox, 1, 5)
+        layout.addWidget(self.archive_combobox, 1, 6)
         return layout
 
     def _create_filename_headers(self):
@@ -79,7 +87,8 @@ class SmartSaveUI(QtWidgets.QDialog):
         self.task_header_label.setStyleSheet("font: bold")
         self.version_header_label = QtWidgets.QLabel("Version")
         self.version_header_label.setStyleSheet("font: bold")
-        self.extension_label = QtWidgets.QLabel(".ma")
+        self.archive_header_label = QtWidgets.QLabel("Archive")
+        self.archive_header_label.setStyleSheet("font: bold")
 
     def _create_filename_inputs(self):
         self.descriptor_line_edit = QtWidgets.QLineEdit(
@@ -90,16 +99,28 @@ class SmartSaveUI(QtWidgets.QDialog):
         self.version_spinbox = QtWidgets.QSpinBox()
         self.version_spinbox.setButtonSymbols(
             QtWidgets.QAbstractSpinBox.PlusMinus)
-        self.version_spinbox.setFixedWidth(50)
+        self.version_spinbox.setFixedWidth(60)
+        self.version_spinbox.setMinimum(1)
+        self.version_spinbox.setMaximum(MAX_VERSION)
         self.version_spinbox.setValue(self.scenefile.version)
         self._add_version_spinbox_padding(self.scenefile.version)
-        self.version_spinbox.setMinimum(1)
-        self.version_spinbox.setMaximum(999)
+        self.extension_combobox = QtWidgets.QComboBox()
+        self.extension_combobox.addItems(sorted(SCENE_TYPES))
+        self.extension_combobox.setCurrentText(self.scenefile.extension)
+        self.archive_combobox = QtWidgets.QComboBox()
+        self.archive_combobox.addItems(compressions())
+        self.archive_combobox.setCurrentText(self.scenefile.compression)
 
     def _create_save_button_ui(self):
+        self.deduplicate_checkbox = QtWidgets.QCheckBox("Deduplicate")
+        self.deduplicate_checkbox.setToolTip(
+            "Store only the changed chunks of the scene and save a "
+            "manifest.\nRebuild it with versionstore.py restore.")
+        self.deduplicate_checkbox.setChecked(self.scenefile.deduplicate)
         self.save_button = QtWidgets.QPushButton("Save")
         self.save_increment_button = QtWidgets.QPushButton("Save Increment")
         layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.deduplicate_checkbox)
         layout.addWidget(self.save_button)
         layout.addWidget(self.save_increment_button)
         return layout
@@ -111,6 +132,7 @@ class SmartSaveUI(QtWidgets.QDialog):
         self.save_increment_button.clicked.connect(self._save_increment)
         self.version_spinbox.valueChanged.connect(
             self._add_version_spinbox_padding)
+        self.save_timer.timeout.connect(self._update_save_progress)
 
     @QtCore.Slot()
     def _browse_folder(self):
@@ -127,128 +149,70 @@ class SmartSaveUI(QtWidgets.QDialog):
     def _save_file(self):
         """Saves the scene"""
         self._set_scenefile_properties_from_ui()
-        self._update_successful_save(self.scenefile.save())
+        self._start_save(self.scenefile.save_async)
 
     @QtCore.Slot()
     def _save_increment(self):
         """Save an increment of the scene"""
         self._set_scenefile_properties_from_ui()
-        self._update_successful_save(self.scenefile.save_increment())
-        self.version_spinbox.setValue(self.scenefile.version)
+        if self._start_save(self.scenefile.save_increment_async):
+            self.version_spinbox.setValue(self.scenefile.version)
 
     def _set_scenefile_properties_from_ui(self):
         self.scenefile.folder_path = self.folder_line_edit.text()
         self.scenefile.descriptor = self.descriptor_line_edit.text()
         self.scenefile.task = self.task_line_edit.text()
         self.scenefile.version = self.version_spinbox.value()
-        self.scenefile.extension = self.extension_label.text()
+        self.scenefile.extension = self.extension_combobox.currentText()
+        self.scenefile.compression = self.archive_combobox.currentText()
+        self.scenefile.deduplicate = self.deduplicate_checkbox.isChecked()
 
-    def _update_successful_save(self, value):
-        if value:
-            self.successful_save.setText(
-                self.scenefile.filename + " saved successfully!")
-        else:
+    def _start_save(self, save):
+        """Saves locally, then copies the scene into place in the
+        background while the timer reports its progress.
+
+        Returns
+            bool: Whether the save started
+        """
+        try:
+            self.save_jobs.append(save())
+        except (RuntimeError, OSError, IOError) as err:
+            log.error("Could not save %s: %s", self.scenefile.path, err)
+            self.scenefile.release_reservation()
             self.successful_save.setText(
-                "Error: Could not save " + self.scenefile.filename)
+                "Error: Could not save {0}: {1}".format(
+                    self.scenefile.filename, err))
+            return False
+        self._update_save_progress()
+        self.save_timer.start()
+        return True
 
     @QtCore.Slot()
-    def _add_version_spinbox_padding(self, value):
-        if value >= 100:
-            self.version_spinbox.setPrefix("")
-        elif value >= 10:
-            self.version_spinbox.setPrefix("0")
-        else:
-            self.version_spinbox.setPrefix("00")
-
-
-class SceneFile(object):
-    """An abstract representation of a scene file."""
-
-    def __init__(self, path_text=None):
-        if path_text:
-            self._init_from_path(path_text)
-        else:
-            scene = pmc.system.sceneName()
-            if scene:
-                self._init_from_path(scene)
+    def _update_save_progress(self):
+        lines = []
+        for job in self.save_jobs:
+            filename = os.path.basename(job.path)
+            if not job.done:
+                lines.append("Saving {0}... {1:.0%}".format(
+                    filename, job.progress))
+            elif job.archive_error is not None:
+                lines.append(filename + " saved, but its archive could not "
+                             "be written")
+            elif job.error is None:
+                lines.append(filename + " saved successfully!")
             else:
-                log.info("Unable to initialize SceneFile object "
-                         "from open scene. Initializing with "
-                         "default values.")
-                self._folder_path = Path(cmds.workspace(
-                    query=True,
-                    rootDirectory=True)) / "scenes"
-                self.descriptor = "main"
-                self.task = "model"
-                self.version = 1
-                self.extension = ".ma"
-
-    def _init_from_path(self, path_text):
-        path = Path(path_text)
-        self.folder_path = path.parent
-        self.extension = path.ext
-        self.descriptor, self.task, ver_str = path.name.stripext().split("_")
-        self.version = int(ver_str.split("v")[-1])
-
-    @property
-    def folder_path(self):
-        return self._folder_path
-
-    @folder_path.setter
-    def folder_path(self, value):
-        self._folder_path = Path(value)
-
-    @property
-    def filename(self):
-        pattern = "{descriptor}_{task}_v{ver:03d}{ext}"
-        return pattern.format(descriptor=self.descriptor,
-                              task=self.task,
-                              ver=self.version,
-                              ext=self.extension)
-
-    @property
-    def path(self):
-        return self.folder_path / self.filename
-
-    def save(self):
-        """Saves the scene file.
+                lines.append("Error: Could not save {0}, it is kept at "
+                             "{1}".format(filename, job.local_path))
+        self.successful_save.setText("\n".join(lines))
+        if all(job.done for job in self.save_jobs):
+            if any(job.error is not None for job in self.save_jobs):
+                # Maya took the local save for the real one, so the
+                # scene has to be saved again.
+                cmds.file(modified=True)
+            self.save_timer.stop()
+            self.save_jobs = []
 
-        Returns
-            Path: The path to the scene file if successful
-        """
-        try:
-            return pmc.system.saveAs(self.path)
-        except RuntimeError as err:
-            log.warning("Missing directories in path. "
-                        "Creating directories now...")
-            self.folder_path.makedirs_p()
-            return pmc.system.saveAs(self.path)
-
-    def next_available_version(self):
-        """Return the next available version number in the folder."""
-        pattern = "{descriptor}_{task}_v*{ext}".format(
-            descriptor=self.descriptor, task=self.task, ext=self.extension)
-        matching_scenefiles = []
-        try:
-            for file_ in self.folder_path.files():
-                if file_.name.fnmatch(pattern):
-                    matching_scenefiles.append(file_)
-            if not matching_scenefiles:
-                return 1
-        except OSError as err:
-            return 1
-        matching_scenefiles.sort()
-        latest_scenefile = matching_scenefiles[-1]
-        latest_version = latest_scenefile.name.stripext().split("_v")[-1]
-        return int(latest_version) + 1
-
-    def save_increment(self):
-        """Increments the version and saves the scene file.
-
-        If the file already exists, increments the version number from
-        the largest number in the directory.
-
-        Returns:
-            Path: The path to the scene file if successful"""
-        self.version = self.next_available_version()
-        return self.save()
+    @QtCore.Slot()
+    def _add_version_spinbox_padding(self, value):
+        self.version_spinbox.setPrefix(
+            "0" * max(VERSION_PADDING - len(str(value)), 0))
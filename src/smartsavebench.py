@@ -0,0 +1,151 @@
+"""Benchmark of the SceneFile save formats.
+
+Saves one scene in every format and archive compression, and records
+write time, file size and reload time of each, under mayapy:
+
+    mayapy smartsavebench.py --scene /shots/sh010/sh010_layout_v003.ma
+
+Without --scene a synthetic scene of --instances instanced cubes is
+built, which gives a rough idea of a scatter heavy scene.
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import scenefile
+
+
+def _cmds():
+    import maya.standalone
+    try:
+        maya.standalone.initialize(name="python")
+    except RuntimeError:
+        pass
+    import maya.cmds
+    return maya.cmds
+
+
+def build_scene(cmds, instances):
+    """Fills a new scene with instanced cubes at random transforms."""
+    import random
+    rng = random.Random(0)
+    cmds.file(new=True, force=True)
+    cube = cmds.polyCube()[0]
+    for _ in range(instances):
+        node = cmds.instance(cube)[0]
+        cmds.xform(node, translation=[rng.uniform(-100, 100)
+                                      for _ in range(3)],
+                   rotation=[rng.uniform(-180, 180) for _ in range(3)])
+
+
+def _read_archive(path, compression):
+    start = time.time()
+    if compression == scenefile.COMPRESS_GZIP:
+        with gzip.open(path, "rb") as archive:
+            while archive.read(scenefile.COPY_CHUNK_BYTES):
+                pass
+    else:
+        with open(path, "rb") as raw:
+            reader = scenefile.zstandard.ZstdDecompressor().stream_reader(
+                raw)
+            while reader.read(scenefile.COPY_CHUNK_BYTES):
+                pass
+    return time.time() - start
+
+
+def run_format(cmds, scene, folder, extension, compression):
+    """Saves, measures and reopens the scene in one format.
+
+    Returns
+        dict: The timings and sizes of the format
+    """
+    if scene:
+        cmds.file(scene, open=True, force=True)
+    scene_file = scenefile.SceneFile(
+        os.path.join(folder, "bench_save_v001" + extension))
+    scene_file.compression = compression
+    start = time.time()
+    job = scene_file._save_local()
+    local_seconds = time.time() - start
+    start = time.time()
+    job.run()
+    copy_seconds = time.time() - start
+    if job.error is not None:
+        raise job.error
+
+    start = time.time()
+    cmds.file(job.path, open=True, force=True)
+    result = {
+        "format": extension,
+        "compression": compression,
+        "write_seconds": local_seconds,
+        "copy_seconds": copy_seconds,
+        "reload_seconds": time.time() - start,
+        "size_mb": os.path.getsize(job.path) / 1024.0 / 1024.0,
+    }
+    if job.archive_path:
+        result["archive_mb"] = (os.path.getsize(job.archive_path) /
+                                1024.0 / 1024.0)
+        result["unarchive_seconds"] = _read_archive(job.archive_path,
+                                                    compression)
+    return result
+
+
+def _print_result(result):
+    line = ("{format}  {compression:<5} write {write_seconds:7.2f}s  "
+            "copy {copy_seconds:7.2f}s  reload {reload_seconds:7.2f}s  "
+            "{size_mb:9.1f} MB".format(**result))
+    if "archive_mb" in result:
+        line += "  archive {archive_mb:9.1f} MB  unarchive " \
+                "{unarchive_seconds:.2f}s".format(**result)
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scene", help="The scene to save in each format")
+    parser.add_argument("--instances", type=int, default=10000,
+                        help="Size of the synthetic scene without --scene")
+    parser.add_argument("--formats", nargs="+",
+                        default=sorted(scenefile.SCENE_TYPES))
+    parser.add_argument("--compressions", nargs="+",
+                        default=scenefile.compressions())
+    parser.add_argument("--folder", help="Save here instead of a temp "
+                                         "folder, to time a network share")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    cmds = _cmds()
+    scene = args.scene
+    folder = args.folder or tempfile.mkdtemp(prefix="smartsavebench_")
+    if not scene:
+        build_scene(cmds, args.instances)
+        scene = os.path.join(tempfile.mkdtemp(prefix="smartsavebench_"),
+                             "bench_source_v001.mb")
+        cmds.file(rename=scene)
+        cmds.file(save=True, force=True, type="mayaBinary")
+
+    results = []
+    try:
+        for extension in args.formats:
+            for compression in args.compressions:
+                result = run_format(cmds, scene, folder, extension,
+                                    compression)
+                _print_result(result)
+                results.append(result)
+    finally:
+        if not args.folder:
+            shutil.rmtree(folder, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""Benchmark of how long the tool modules take to import.
+
+Each module is imported in a fresh interpreter with Maya, PyMEL and Qt
+replaced by stub modules, so it runs on a plain CI box. Giving the heavy
+stubs an import cost shows what a module that loads them would cost:
+
+    python startupbench.py --heavy-cost 2.0
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+import types
+
+STUBBED = ("maya", "pymel", "PySide2", "shiboken2")
+HEAVY = ("pymel.core", "PySide2")
+MODULES = ("scattercore", "scattermaya", "scattercli", "scenefile",
+           "scatter", "smartsave")
+QT_FREE = ("scattercore", "scattermaya", "scattercli", "scenefile")
+NEVER = ("pymel",)
+
+
+class _StubType(type):
+
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Stub
+
+
+def _stub_call(self, *args, **kwargs):
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+    return _Stub()
+
+
+# Stands in for any class, function, decorator or constant of a stub.
+_Stub = _StubType("_Stub", (object,), {
+    "__init__": lambda self, *args, **kwargs: None,
+    "__call__": _stub_call,
+    "__getattr__": lambda self, name: _Stub(),
+})
+
+
+class StubModule(types.ModuleType):
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Stub
+
+
+class StubFinder(object):
+    """Imports every module of the stubbed packages as a StubModule."""
+
+    def __init__(self, heavy_cost=0.0):
+        self.heavy_cost = heavy_cost
+        self.imported = []
+
+    def _stubs(self, name):
+        return name.split(".")[0] in STUBBED
+
+    def find_module(self, name, path=None):
+        return self if self._stubs(name) else None
+
+    def find_spec(self, name, path=None, target=None):
+        if not self._stubs(name):
+            return None
+        import importlib.util
+        return importlib.util.spec_from_loader(name, self)
+
+    def create_module(self, spec):
+        return self._create(spec.name)
+
+    def exec_module(self, module):
+        pass
+
+    def load_module(self, name):
+        module = self._create(name)
+        sys.modules[name] = module
+        return module
+
+    def _create(self, name):
+        self.imported.append(name)
+        if name in HEAVY:
+            time.sleep(self.heavy_cost)
+        module = StubModule(name)
+        module.__path__ = []
+        module.__loader__ = self
+        return module
+
+
+def time_import(module_name, heavy_cost=0.0):
+    """Imports a module under the stubs and times it.
+
+    Run this in a fresh interpreter, as modules that are already
+    imported are not timed again.
+
+    Returns
+        dict: The import time and the stub modules it loaded
+    """
+    finder = StubFinder(heavy_cost)
+    sys.meta_path.insert(0, finder)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    start = time.time()
+    importlib.import_module(module_name)
+    seconds = time.time() - start
+    return {"module": module_name, "seconds": seconds,
+            "stubs": sorted(set(finder.imported))}
+
+
+def run_module(module_name, heavy_cost=0.0, repeat=1):
+    """Times the import of a module in fresh interpreters.
+
+    Returns
+        dict: The fastest of the runs
+    """
+    results = []
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), "--child",
+             module_name, "--heavy-cost", str(heavy_cost)])
+        results.append(json.loads(output.decode().splitlines()[-1]))
+    return min(results, key=lambda result: result["seconds"])
+
+
+def problems(result):
+    """Returns the stubs a module loaded but should not have."""
+    forbidden = NEVER
+    if result["module"] in QT_FREE:
+        forbidden += ("PySide2", "shiboken2")
+    return [stub for stub in result["stubs"]
+            if stub.split(".")[0] in forbidden]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=list(MODULES))
+    parser.add_argument("--heavy-cost", type=float, default=0.0,
+                        help="Seconds to sleep when a heavy stub is "
+                             "imported")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--fail-above", type=float, default=0,
+                        help="Exit with an error if any import takes more "
+                             "than this many seconds")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(time_import(args.child, args.heavy_cost)))
+        return 0
+
+    results = []
+    failed = False
+    for module_name in args.modules:
+        result = run_module(module_name, args.heavy_cost, args.repeat)
+        result["problems"] = problems(result)
+        print("{module:<14} {ms:8.1f} ms  {problems}".format(
+            module=module_name, ms=result["seconds"] * 1000,
+            problems=", ".join(result["problems"])))
+        failed = failed or bool(result["problems"]) or (
+            args.fail_above and result["seconds"] > args.fail_above)
+        results.append(result)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
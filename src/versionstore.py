@@ -0,0 +1,302 @@
+"""Content addressed storage of scene versions.
+
+A scene is split into content defined chunks, and every chunk is kept
+once in a store folder, named by its hash. A saved version is then only
+a small manifest listing its chunks, so near identical versions share
+almost all of their data. Rebuild a scene from its manifest with:
+
+    python versionstore.py restore main_model_v003.ma.manifest
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from fileutil import replace_file
+
+MANIFEST_SUFFIX = ".manifest"
+MANIFEST_VERSION = 1
+STORE_FOLDER = ".versionstore"
+MIN_CHUNK_BYTES = 16 * 1024
+MAX_CHUNK_BYTES = 256 * 1024
+# A chunk ends where the top bits of the rolling hash are all zero, which
+# happens every 64 KB on average. The low bits depend on too few bytes.
+BOUNDARY_MASK = 0xFFFF0000
+WINDOW = 32
+READ_BYTES = 16 * 1024 * 1024
+ZLIB_LEVEL = 1
+
+_GEAR_RNG = random.Random(0x5CA77E12)
+GEAR = [_GEAR_RNG.getrandbits(32) for _ in range(256)]
+
+
+def _atomic_write(path, data):
+    handle, partial = tempfile.mkstemp(
+        prefix="." + os.path.basename(path), suffix=".partial",
+        dir=os.path.dirname(path))
+    try:
+        with os.fdopen(handle, "wb") as partial_file:
+            partial_file.write(data)
+            partial_file.flush()
+            os.fsync(partial_file.fileno())
+        replace_file(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+def _boundary_hits(context, block):
+    """Returns the offsets in block after which a chunk may end.
+
+    The gear hash at a byte only depends on the WINDOW bytes up to it,
+    so the hits do not depend on how the data is split into blocks as
+    long as context holds the bytes before the block.
+    """
+    if np is not None:
+        data = np.frombuffer(context + block, dtype=np.uint8)
+        hashes = np.asarray(GEAR, dtype=np.uint32)[data]
+        # Sums windows of doubling width, so a 32 byte window takes 5
+        # passes over the data instead of 31.
+        width = 1
+        while width < WINDOW:
+            hashes[width:] += hashes[:-width] << np.uint32(width)
+            width *= 2
+        hits = np.nonzero(hashes[len(context):] & BOUNDARY_MASK == 0)[0]
+        return hits.tolist()
+    rolling = 0
+    for byte in bytearray(context):
+        rolling = ((rolling << 1) + GEAR[byte]) & 0xFFFFFFFF
+    hits = []
+    for offset, byte in enumerate(bytearray(block)):
+        rolling = ((rolling << 1) + GEAR[byte]) & 0xFFFFFFFF
+        if not rolling & BOUNDARY_MASK:
+            hits.append(offset)
+    return hits
+
+
+def iter_chunks(stream, read_bytes=READ_BYTES):
+    """Splits a file into content defined chunks.
+
+    An edit only changes the chunks around it, so the rest of a new
+    version splits into the same chunks as the old one.
+
+    Yields
+        bytes: The chunks, in file order
+    """
+    pending = bytearray()
+    context = b""
+    while True:
+        block = stream.read(read_bytes)
+        if not block:
+            break
+        offset = len(pending)
+        pending.extend(block)
+        start = 0
+        for hit in _boundary_hits(context, block):
+            end = offset + hit + 1
+            while end - start > MAX_CHUNK_BYTES:
+                yield bytes(pending[start:start + MAX_CHUNK_BYTES])
+                start += MAX_CHUNK_BYTES
+            if end - start >= MIN_CHUNK_BYTES:
+                yield bytes(pending[start:end])
+                start = end
+        while len(pending) - start > MAX_CHUNK_BYTES:
+            yield bytes(pending[start:start + MAX_CHUNK_BYTES])
+            start += MAX_CHUNK_BYTES
+        del pending[:start]
+        context = (context + block)[-(WINDOW - 1):]
+    if pending:
+        yield bytes(pending)
+
+
+class VersionStore(object):
+    """A folder of zlib compressed chunks, named by their sha256."""
+
+    def __init__(self, root):
+        self.root = root
+        self.new_bytes = 0
+        self.stored_bytes = 0
+
+    def object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def has(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    def put_chunk(self, chunk):
+        """Stores a chunk unless the store already has it.
+
+        Returns
+            str: The sha256 of the chunk
+        """
+        digest = hashlib.sha256(chunk).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            folder = os.path.dirname(path)
+            if not os.path.isdir(folder):
+                try:
+                    os.makedirs(folder)
+                except OSError:
+                    if not os.path.isdir(folder):
+                        raise
+            data = zlib.compress(chunk, ZLIB_LEVEL)
+            _atomic_write(path, data)
+            self.new_bytes += len(chunk)
+            self.stored_bytes += len(data)
+        return digest
+
+    def read_chunk(self, digest):
+        with open(self.object_path(digest), "rb") as chunk_file:
+            chunk = zlib.decompress(chunk_file.read())
+        if hashlib.sha256(chunk).hexdigest() != digest:
+            raise IOError("Chunk {0} in {1} is corrupt".format(digest,
+                                                               self.root))
+        return chunk
+
+    def put(self, stream, progress=None):
+        """Stores every chunk of a file.
+
+        progress is called with the size of each chunk as it is stored.
+
+        Returns
+            dict: The manifest of the file
+        """
+        file_hash = hashlib.sha256()
+        chunks = []
+        size = 0
+        for chunk in iter_chunks(stream):
+            file_hash.update(chunk)
+            chunks.append([self.put_chunk(chunk), len(chunk)])
+            size += len(chunk)
+            if progress is not None:
+                progress(len(chunk))
+        return {
+            "format": "versionstore",
+            "version": MANIFEST_VERSION,
+            "size": size,
+            "sha256": file_hash.hexdigest(),
+            "chunks": chunks,
+        }
+
+    def write_manifest(self, manifest, path):
+        """Writes a manifest, recording where the store is from there."""
+        manifest = dict(manifest)
+        manifest["store"] = os.path.relpath(
+            self.root, os.path.dirname(os.path.abspath(path)))
+        _atomic_write(path, json.dumps(manifest, indent=1).encode("utf-8"))
+
+    def restore(self, manifest, path):
+        """Rebuilds a file from its manifest, atomically.
+
+        Returns
+            str: The path of the rebuilt file
+        """
+        file_hash = hashlib.sha256()
+        handle, partial = tempfile.mkstemp(
+            prefix="." + os.path.basename(path), suffix=".partial",
+            dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(handle, "wb") as partial_file:
+                for digest, size in manifest["chunks"]:
+                    chunk = self.read_chunk(digest)
+                    file_hash.update(chunk)
+                    partial_file.write(chunk)
+            if file_hash.hexdigest() != manifest["sha256"]:
+                raise IOError("Rebuilt file does not match its manifest")
+            replace_file(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        return path
+
+    def disk_usage(self):
+        """Returns the bytes of all the chunks in the store."""
+        total = 0
+        for folder, _, names in os.walk(os.path.join(self.root, "objects")):
+            total += sum(os.path.getsize(os.path.join(folder, name))
+                         for name in names)
+        return total
+
+
+def store_for(folder):
+    """Returns the store shared by the scenes in a folder."""
+    return VersionStore(os.path.join(folder, STORE_FOLDER))
+
+
+def read_manifest(path):
+    """Reads a manifest and opens the store it points to.
+
+    Returns
+        tuple: The manifest dict and its VersionStore
+    """
+    with open(path, "rb") as manifest_file:
+        manifest = json.loads(manifest_file.read().decode("utf-8"))
+    if manifest.get("format") != "versionstore" or \
+            manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(path + " is not a version store manifest")
+    root = os.path.join(os.path.dirname(os.path.abspath(path)),
+                        manifest["store"])
+    return manifest, VersionStore(os.path.normpath(root))
+
+
+def restore(manifest_path, path=None):
+    """Rebuilds the scene of a manifest, next to it by default.
+
+    Returns
+        str: The path of the rebuilt scene
+    """
+    if path is None:
+        if not manifest_path.endswith(MANIFEST_SUFFIX):
+            raise ValueError("Give a path to restore {0} to".format(
+                manifest_path))
+        path = manifest_path[:-len(MANIFEST_SUFFIX)]
+    manifest, store = read_manifest(manifest_path)
+    return store.restore(manifest, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    restore_parser = commands.add_parser(
+        "restore", help="Rebuild scenes from their manifests")
+    restore_parser.add_argument("manifests", nargs="+")
+    restore_parser.add_argument("--output",
+                                help="Where to rebuild a single manifest")
+    usage_parser = commands.add_parser(
+        "usage", help="Show how much the store saves in a scenes folder")
+    usage_parser.add_argument("folder")
+    args = parser.parse_args(argv)
+
+    if args.command == "restore":
+        if args.output and len(args.manifests) > 1:
+            parser.error("--output needs a single manifest")
+        for manifest_path in args.manifests:
+            print(restore(manifest_path, args.output))
+    elif args.command == "usage":
+        store = store_for(args.folder)
+        logical = 0
+        for name in os.listdir(args.folder):
+            if name.endswith(MANIFEST_SUFFIX):
+                manifest, _ = read_manifest(os.path.join(args.folder, name))
+                logical += manifest["size"]
+        print("{0:.1f} MB of scenes in {1:.1f} MB of chunks".format(
+            logical / 1024.0 / 1024.0, store.disk_usage() / 1024.0 / 1024.0))
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Benchmark of deduplicated saves against plain saves.
+
+Saves a run of versions of a synthetic Maya ASCII scene, each a few
+edits away from the last, both as plain copies and into a version
+store, then compares disk usage and save throughput. Needs no Maya:
+
+    python versionstorebench.py --size 100 --versions 20
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import scenefile
+import versionstore
+
+NODE = ('createNode transform -n "node{0}";\n'
+        '\tsetAttr ".t" -type "double3" {1:.6f} {2:.6f} {3:.6f} ;\n'
+        '\tsetAttr ".r" -type "double3" {4:.6f} {5:.6f} {6:.6f} ;\n')
+
+
+class SyntheticScene(object):
+    """Maya ASCII like text that can be edited a little at a time."""
+
+    def __init__(self, size_mb, seed=0):
+        self.rng = random.Random(seed)
+        self.nodes = []
+        size = 0
+        while size < size_mb * 1024 * 1024:
+            self.nodes.append(self._node())
+            size += len(self.nodes[-1])
+
+    def _node(self):
+        return NODE.format(self.rng.getrandbits(32),
+                           *[self.rng.uniform(-100, 100) for _ in range(6)])
+
+    def edit(self, count):
+        """Changes, adds or removes count random nodes."""
+        for _ in range(count):
+            index = self.rng.randrange(len(self.nodes))
+            action = self.rng.random()
+            if action < 0.6:
+                self.nodes[index] = self._node()
+            elif action < 0.8:
+                self.nodes.insert(index, self._node())
+            else:
+                del self.nodes[index]
+
+    def write(self, path):
+        with open(path, "w") as scene_file:
+            scene_file.write("//Maya ASCII scene\n")
+            scene_file.writelines(self.nodes)
+
+
+def folder_size(folder):
+    total = 0
+    for root, _, names in os.walk(folder):
+        total += sum(os.path.getsize(os.path.join(root, name))
+                     for name in names)
+    return total
+
+
+def _save(scene, folder, version, store):
+    handle, local_path = tempfile.mkstemp(suffix=".ma")
+    os.close(handle)
+    scene.write(local_path)
+    path = os.path.join(folder, "bench_save_v{0:03d}.ma".format(version))
+    job = scenefile.SaveJob(local_path, path, store=store)
+    start = time.time()
+    job.run()
+    if job.error is not None:
+        raise job.error
+    return time.time() - start, job.total
+
+
+def run(size_mb, versions, edits, seed=0):
+    """Saves the same versions plainly and deduplicated.
+
+    Returns
+        dict: The disk usage and throughput of both
+    """
+    scene = SyntheticScene(size_mb, seed)
+    plain_folder = tempfile.mkdtemp(prefix="versionstorebench_plain_")
+    store_folder = tempfile.mkdtemp(prefix="versionstorebench_store_")
+    store = versionstore.store_for(store_folder)
+    seconds = {"plain": 0.0, "store": 0.0}
+    logical = 0
+    try:
+        for version in range(1, versions + 1):
+            if version > 1:
+                scene.edit(edits)
+            plain_seconds, size = _save(scene, plain_folder, version, None)
+            store_seconds, _ = _save(scene, store_folder, version, store)
+            seconds["plain"] += plain_seconds
+            seconds["store"] += store_seconds
+            logical += size
+        result = {
+            "versions": versions,
+            "scene_mb": size / 1024.0 / 1024.0,
+            "logical_mb": logical / 1024.0 / 1024.0,
+            "plain_mb": folder_size(plain_folder) / 1024.0 / 1024.0,
+            "store_mb": folder_size(store_folder) / 1024.0 / 1024.0,
+        }
+    finally:
+        shutil.rmtree(plain_folder, ignore_errors=True)
+        shutil.rmtree(store_folder, ignore_errors=True)
+    for name, total in seconds.items():
+        result[name + "_seconds"] = total
+        result[name + "_mb_per_second"] = (result["logical_mb"] /
+                                           max(total, 1e-9))
+    result["saving"] = 1.0 - result["store_mb"] / result["plain_mb"]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=float, default=50,
+                        help="Size of the scene in MB")
+    parser.add_argument("--versions", type=int, default=10)
+    parser.add_argument("--edits", type=int, default=20,
+                        help="Nodes changed between versions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    print("numpy: {0}".format("yes" if versionstore.np is not None else "no"))
+    result = run(args.size, args.versions, args.edits, args.seed)
+    print("{versions} versions of {scene_mb:.1f} MB\n"
+          "plain  {plain_mb:9.1f} MB  {plain_mb_per_second:8.1f} MB/s\n"
+          "store  {store_mb:9.1f} MB  {store_mb_per_second:8.1f} MB/s\n"
+          "saving {saving:.0%}".format(**result))
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(result, json_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Stress test of version reservation across processes.
+
+Starts many processes that save increments of the same scene name into
+one folder at once, each reserving a version, writing a placeholder
+scene for it and releasing it, then checks no version was handed out
+twice and reports the reservation throughput. Needs no Maya:
+
+    python versionstress.py --processes 16 --saves 200
+
+With --naive the versions are instead taken as one past the highest in
+the folder, as before reservations, to show the collisions.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import scenefile
+
+DESCRIPTOR = "stress"
+TASK = "save"
+
+
+def _save(folder, version):
+    """Writes the scene of a version, failing if it already exists."""
+    path = os.path.join(folder, "{0}_{1}_v{2:03d}.ma".format(
+        DESCRIPTOR, TASK, version))
+    try:
+        handle = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except OSError:
+        return False
+    os.write(handle, b"//Maya ASCII scene\n")
+    os.close(handle)
+    return True
+
+
+def worker(folder, saves, naive, start_event, results):
+    start_event.wait()
+    versions, clobbered = [], 0
+    start = time.time()
+    for _ in range(saves):
+        if naive:
+            index = scenefile.version_index(folder)
+            version = index.latest(DESCRIPTOR, TASK) + 1
+            index.add(DESCRIPTOR, TASK, version)
+        else:
+            version = scenefile.reserve_version(folder, DESCRIPTOR, TASK)
+        if not _save(folder, version):
+            clobbered += 1
+        if not naive:
+            scenefile.release_version(folder, DESCRIPTOR, TASK, version)
+        versions.append(version)
+    results.put((os.getpid(), versions, clobbered, time.time() - start))
+
+
+def run(processes, saves, naive=False, folder=None):
+    """Runs the stress test in folder, or a new temp folder.
+
+    Returns
+        dict: The counts of duplicate versions and clobbered saves, and
+            the throughput
+    """
+    own_folder = folder is None
+    folder = folder or tempfile.mkdtemp(prefix="versionstress_")
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(
+        target=worker, args=(folder, saves, naive, start_event, results))
+        for _ in range(processes)]
+    try:
+        for process in workers:
+            process.start()
+        start = time.time()
+        start_event.set()
+        reports = [results.get() for _ in workers]
+        seconds = time.time() - start
+        for process in workers:
+            process.join()
+        leftover = [name for name in os.listdir(folder)
+                    if name.endswith(scenefile.RESERVATION_SUFFIX)]
+    finally:
+        if own_folder:
+            shutil.rmtree(folder, ignore_errors=True)
+    versions = [version for _, taken, _, _ in reports for version in taken]
+    total = processes * saves
+    return {
+        "processes": processes,
+        "saves": total,
+        "naive": naive,
+        "duplicates": len(versions) - len(set(versions)),
+        "clobbered": sum(clobbered for _, _, clobbered, _ in reports),
+        "highest": max(versions) if versions else 0,
+        "leftover_placeholders": len(leftover),
+        "seconds": seconds,
+        "saves_per_second": total / max(seconds, 1e-9),
+        "slowest_process_seconds": max(report[3] for report in reports),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--saves", type=int, default=100,
+                        help="Saves per process")
+    parser.add_argument("--naive", action="store_true",
+                        help="Take versions without reserving them")
+    parser.add_argument("--folder", help="Hammer this folder instead of a "
+                                         "temp folder, to try a share")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--fail-below", type=float, default=0,
+                        help="Exit with an error below this many saves per "
+                             "second")
+    args = parser.parse_args(argv)
+
+    result = run(args.processes, args.saves, args.naive, args.folder)
+    print("{saves} saves from {processes} processes in {seconds:.2f}s "
+          "({saves_per_second:.0f}/s)\n"
+          "duplicates {duplicates}  clobbered {clobbered}  highest "
+          "v{highest:03d}  leftover placeholders "
+          "{leftover_placeholders}".format(**result))
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(result, json_file, indent=2)
+    failed = (result["duplicates"] or result["clobbered"] or
+              result["leftover_placeholders"] or
+              result["saves_per_second"] < args.fail_below)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""A fake maya.cmds for running the scatter paths without Maya.
+
+It keeps the translation, orientation and scale of every node and
+applies the commands the constraint path calls the way Maya does:
+normalConstraint aims X along the normal with Y toward world up, scale
+-r multiplies the scale, rotate -r turns about the world axes and move
+-r -os -wd moves along the unscaled object axes. An instance starts
+with the transform of its source.
+"""
+import copy
+import math
+import sys
+import types
+
+
+def _dot(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def _cross(a, b):
+    return [a[1] * b[2] - a[2] * b[1],
+            a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0]]
+
+
+def _unit(vec):
+    length = math.sqrt(_dot(vec, vec))
+    return [c / length for c in vec]
+
+
+def _mult(a, b):
+    return [[_dot(row, [b[k][j] for k in range(3)]) for j in range(3)]
+            for row in a]
+
+
+def _axis_rotation(axis, degrees):
+    """The row vector matrix of a turn about a world axis."""
+    c, s = math.cos(math.radians(degrees)), math.sin(math.radians(degrees))
+    i, j = [k for k in range(3) if k != axis]
+    matrix = [[1.0 if row == col else 0.0 for col in range(3)]
+              for row in range(3)]
+    matrix[i][i], matrix[i][j], matrix[j][i], matrix[j][j] = c, s, -s, c
+    if axis == 1:
+        matrix[i][j], matrix[j][i] = -s, s
+    return matrix
+
+
+class FakeCmds(object):
+    """The parts of maya.cmds the scatter paths use."""
+
+    def __init__(self, meshes):
+        self.meshes = meshes
+        self.nodes = {}
+        self.open_chunks = 0
+        self.chunks = 0
+        self._count = 0
+
+    def _new(self, prefix):
+        self._count += 1
+        name = "{0}{1}".format(prefix.rstrip("#"), self._count)
+        self.add_transform(name)
+        return name
+
+    def add_transform(self, name):
+        """Adds a transform node at the origin, to scatter as a source."""
+        self.nodes[name] = {"t": [0.0] * 3, "s": [1.0] * 3,
+                            "r": [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0],
+                                  [0.0, 0.0, 1.0]],
+                            "matrix": None}
+
+    def add_camera(self, name, matrix):
+        """Adds a camera with the lens of Maya's default cameras."""
+        self.nodes[name] = {"matrix": list(matrix),
+                            "lens": {"horizontalFieldOfView": 54.43,
+                                     "verticalFieldOfView": 37.85,
+                                     "nearClipPlane": 0.1,
+                                     "farClipPlane": 10000.0}}
+
+    def camera(self, name, query=False, **flag):
+        return self.nodes[name]["lens"][list(flag)[0]]
+
+    def undoInfo(self, openChunk=False, closeChunk=False, chunkName=None):
+        if openChunk:
+            self.open_chunks += 1
+            self.chunks += 1
+        if closeChunk:
+            self.open_chunks -= 1
+
+    def group(self, empty=True, name="group#"):
+        return self._new(name)
+
+    def parent(self, nodes, group):
+        for node in nodes:
+            self.nodes[node]["parent"] = group
+        return list(nodes)
+
+    def objExists(self, node):
+        return node in self.nodes
+
+    def delete(self, nodes):
+        """Deletes nodes and everything parented under them."""
+        for node in nodes:
+            if node not in self.nodes:
+                raise ValueError("No object matches name: " + node)
+            self.nodes.pop(node)
+            children = [child for child, state in self.nodes.items()
+                        if state.get("parent") == node]
+            self.delete(children)
+
+    def particle(self, p=(), name="particle#"):
+        particle = self._new(name)
+        shape = particle + "Shape"
+        self.nodes[shape] = {"parent": particle, "positions": list(p),
+                             "attrs": {}}
+        return [particle, shape]
+
+    def addAttr(self, node, longName=None, dataType=None):
+        self.nodes[node]["attrs"][longName] = None
+
+    def setAttr(self, plug, *values, **kwargs):
+        node, attr = plug.split(".", 1)
+        if kwargs.get("type") == "vectorArray":
+            assert values[0] == len(values) - 1
+            values = list(values[1:])
+        elif len(values) == 1:
+            values = values[0]
+        self.nodes[node].setdefault("attrs", {})[attr] = values
+
+    def particleInstancer(self, shape, **flags):
+        instancer = self._new("instancer")
+        self.nodes[instancer].update(parent=shape, flags=flags)
+        return instancer
+
+    def instance(self, source):
+        node = self._new(source + "_inst")
+        for attr in ("t", "s", "r", "matrix"):
+            self.nodes[node][attr] = copy.deepcopy(self.nodes[source][attr])
+        return [node]
+
+    def move(self, x, y, z, node, a=False, r=False, ws=False, os=False,
+             wd=False):
+        state = self.nodes[node]
+        if a:
+            state["t"] = [x, y, z]
+        else:
+            offset = [_dot([x, y, z], [row[k] for row in state["r"]])
+                      for k in range(3)]
+            state["t"] = [t + o for t, o in zip(state["t"], offset)]
+
+    def normalConstraint(self, target, node, rm=False):
+        if rm:
+            return
+        mesh, vertex = target.split(".vtx[")
+        normal = self.meshes[mesh][1][int(vertex.rstrip("]"))]
+        x_axis = _unit(normal)
+        z_axis = _unit(_cross(x_axis, [0.0, 1.0, 0.0]))
+        self.nodes[node]["r"] = [x_axis, _cross(z_axis, x_axis), z_axis]
+
+    def scale(self, x, y, z, node, r=False):
+        state = self.nodes[node]
+        state["s"] = [s * v for s, v in zip(state["s"], (x, y, z))]
+
+    def rotate(self, x, y, z, node, r=False):
+        state = self.nodes[node]
+        for axis, angle in enumerate((x, y, z)):
+            state["r"] = _mult(state["r"], _axis_rotation(axis, angle))
+
+    def xform(self, node, query=False, ws=False, matrix=None):
+        state = self.nodes[node]
+        if not query:
+            state["matrix"] = list(matrix)
+            return None
+        if state["matrix"] is not None:
+            return state["matrix"]
+        flat = []
+        for scale, row in zip(state["s"], state["r"]):
+            flat.extend([scale * c for c in row] + [0.0])
+        return flat + list(state["t"]) + [1.0]
+
+
+class FakeReader(object):
+
+    def __init__(self, meshes):
+        self.meshes = meshes
+
+    def read_mesh(self, name):
+        positions, normals = self.meshes[name]
+        return ([c for p in positions for c in p],
+                [c for n in normals for c in n])
+
+
+def install(meshes, transforms=()):
+    """Puts a FakeCmds in place of maya.cmds, with a transform node for
+    each name in transforms.
+
+    Returns
+        FakeCmds: The fake, to inspect the scene with
+    """
+    cmds = FakeCmds(meshes)
+    for name in transforms:
+        cmds.add_transform(name)
+    maya = types.ModuleType("maya")
+    api = types.ModuleType("maya.api")
+    maya.cmds = cmds
+    maya.api = api
+    api.OpenMaya = types.ModuleType("maya.api.OpenMaya")
+    sys.modules.update({"maya": maya, "maya.cmds": cmds, "maya.api": api,
+                        "maya.api.OpenMaya": api.OpenMaya})
+    return cmds
@@ -0,0 +1,131 @@
+"""Checks that matrix alignment places instances where the constraint
+path does, in the fake scene of fakemaya.
+"""
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import fakemaya
+
+
+def _meshes():
+    positions, normals = [], []
+    for i in range(40):
+        angle = i * 0.7
+        positions.append([math.cos(angle) * i, 0.1 * i, math.sin(angle) * i])
+        normals.append([math.sin(angle * 1.3), 0.4 + (i % 5) * 0.3,
+                        math.cos(angle * 0.9)])
+    return {"pPlane1": (positions, normals)}
+
+
+class AlignmentTest(unittest.TestCase):
+
+    TOLERANCE = 1e-6
+
+    def setUp(self):
+        self.meshes = _meshes()
+        self.cmds = fakemaya.install(self.meshes, ["pCube1", "pSphere1"])
+        import scattercore
+        import scattermaya
+        scattermaya.cmds = self.cmds
+        self.scattercore = scattercore
+        self.scattermaya = scattermaya
+        self.numpy = scattercore.np
+
+    def tearDown(self):
+        self.scattercore.np = self.numpy
+
+    def _transform_sources(self):
+        """Scales, mirrors and turns the sources, as a user might."""
+        self.cmds.scale(2.0, 0.5, 1.5, "pCube1", r=True)
+        self.cmds.rotate(30, -20, 75, "pCube1", r=True)
+        self.cmds.move(4, 5, 6, "pCube1", a=True)
+        self.cmds.scale(-1.0, 1.0, 3.0, "pSphere1", r=True)
+        self.cmds.rotate(0, 90, 10, "pSphere1", r=True)
+
+    def _scatter(self, mode, targets, alignment=True):
+        scatterer = self.scattermaya.Scatterer(
+            fakemaya.FakeReader(self.meshes))
+        scatterer.result_cache = None
+        scatterer.scatter_targets = targets
+        scatterer.scatter_sources = ["pCube1", "pSphere1"]
+        scatterer.alignment_mode = mode
+        scatterer.alignment = alignment
+        scatterer.seed = 7
+        scatterer.scatter_density = 0.8
+        scatterer.attribute_array = [[0.5, 0.8, 0.6], [2.0, 1.5, 1.8],
+                                     [-180, -90, -45], [180, 90, 45],
+                                     [-1, -0.5, -2], [1, 0.5, 2]]
+        scatterer.scatter()
+        batch = scatterer.scatter_instances[-1]
+        return [self.cmds.xform(node, query=True, ws=True, matrix=True)
+                for node in batch.nodes]
+
+    def _assert_matrices_match(self, matrices, references):
+        self.assertTrue(matrices)
+        self.assertEqual(len(matrices), len(references))
+        for matrix, reference in zip(matrices, references):
+            for value, expected in zip(matrix, reference):
+                self.assertAlmostEqual(value, expected,
+                                       delta=self.TOLERANCE)
+
+    def _assert_paths_match(self, targets):
+        self._assert_matrices_match(
+            self._scatter(self.scattermaya.ALIGN_MATRIX, targets),
+            self._scatter(self.scattermaya.ALIGN_CONSTRAINT, targets))
+
+    def _constrained_without_alignment(self, targets):
+        """The constraint path without its normalConstraint, which is
+        what Maya does to an instance when alignment is off.
+
+        Alignment stays on, as it picks the constraint path.
+        """
+        normal_constraint = self.cmds.normalConstraint
+        self.cmds.normalConstraint = lambda *args, **kwargs: None
+        try:
+            return self._scatter(self.scattermaya.ALIGN_CONSTRAINT, targets)
+        finally:
+            self.cmds.normalConstraint = normal_constraint
+
+    def test_matrix_matches_constraint(self):
+        self._assert_paths_match(["pPlane1"])
+
+    def test_matrix_matches_constraint_on_vertices(self):
+        self._assert_paths_match(["pPlane1.vtx[3:17]", "pPlane1.vtx[30]"])
+
+    def test_matrix_matches_constraint_without_numpy(self):
+        self.scattercore.np = None
+        self._assert_paths_match(["pPlane1"])
+
+    def test_instances_keep_the_source_scale(self):
+        self._transform_sources()
+        self._assert_paths_match(["pPlane1"])
+
+    def test_instances_keep_the_source_scale_without_numpy(self):
+        self.scattercore.np = None
+        self._transform_sources()
+        self._assert_paths_match(["pPlane1"])
+
+    def test_unaligned_instances_keep_the_source_transform(self):
+        self._transform_sources()
+        self._assert_matrices_match(
+            self._scatter(self.scattermaya.ALIGN_MATRIX, ["pPlane1"],
+                          alignment=False),
+            self._constrained_without_alignment(["pPlane1"]))
+
+    def test_unaligned_instances_keep_the_source_transform_without_numpy(
+            self):
+        self.scattercore.np = None
+        self._transform_sources()
+        self._assert_matrices_match(
+            self._scatter(self.scattermaya.ALIGN_MATRIX, ["pPlane1"],
+                          alignment=False),
+            self._constrained_without_alignment(["pPlane1"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
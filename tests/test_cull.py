@@ -0,0 +1,160 @@
+"""Checks frustum and distance culling, level of detail bands, and how
+cull_job uses them in the fake scene of fakemaya.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import fakemaya
+
+
+def _grid(size):
+    positions = [[float(x), 0.0, float(z)] for x in range(size)
+                 for z in range(size)]
+    normals = [[0.0, 1.0, 0.0]] * len(positions)
+    return {"pPlane1": (positions, normals)}
+
+
+class CullJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.meshes = _grid(20)
+        self.cmds = fakemaya.install(self.meshes, ["lod0", "lod1", "lod2"])
+        import scattercore
+        import scattermaya
+        scattermaya.cmds = self.cmds
+        self.scatterer = scattermaya.Scatterer(
+            fakemaya.FakeReader(self.meshes))
+        self.scatterer.scatter_targets = ["pPlane1"]
+        self.scatterer.scatter_sources = ["lod0", "lod1", "lod2"]
+        self.scatterer.seed = 2
+        self.scatterer.result_cache = None
+        view = scattercore.CameraView.look_at((-5.0, 5.0, -5.0),
+                                              (10.0, 0.0, 10.0))
+        matrix = [c for axis in view.axes for c in list(axis) + [0.0]]
+        self.cmds.add_camera("persp", matrix + view.position + [1.0])
+        self.scatterer.scatter()
+
+    def _cull(self):
+        job = self.scatterer.cull_job()
+        while job.step():
+            pass
+        return self.scatterer.scatter_instances[-1]
+
+    def test_default_distance_splits_over_kept_instances(self):
+        self.scatterer.cull_lod = True
+        culled = self._cull()
+        counts = culled.stats()["sources"]
+        self.assertTrue(len(culled))
+        self.assertTrue(all(counts[source] for source in counts), counts)
+
+    def test_cull_distance_bounds_the_levels(self):
+        self.scatterer.cull_lod = True
+        self.scatterer.cull_distance = 21.0
+        culled = self._cull()
+        camera = (-5.0, 5.0, -5.0)
+        for index, position in zip(culled.source_indices,
+                                   culled.positions):
+            distance = sum((p - c) ** 2
+                           for p, c in zip(position, camera)) ** 0.5
+            self.assertLessEqual(distance, 21.0)
+            self.assertEqual(index, int(distance // 7.0))
+
+    def test_without_lod_sources_are_kept(self):
+        full = self.scatterer.scatter_instances[-1]
+        culled = self._cull()
+        self.assertLess(len(culled), len(full))
+        self.assertIs(culled.full, full)
+
+
+class CullMaskTest(unittest.TestCase):
+
+    def setUp(self):
+        import scattercore
+        self.scattercore = scattercore
+        # At the origin, looking down -Z with a 90 degree field of view.
+        identity = [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1]
+        self.view = scattercore.CameraView(identity, 90.0, 90.0, near=1.0,
+                                           far=100.0)
+
+    def _mask(self, positions, max_distance=None, frustum=True, radii=None):
+        mask, distances = self.scattercore.cull_mask(
+            positions, self.view, max_distance, frustum, radii)
+        return [bool(visible) for visible in mask], distances
+
+    def test_frustum_edges(self):
+        positions = [[0, 0, -10], [9.9, 0, -10], [10.1, 0, -10],
+                     [0, -9.9, -10], [0, -10.1, -10], [0, 0, 10],
+                     [0, 0, -0.5], [0, 0, -99.5], [0, 0, -100.5]]
+        mask, distances = self._mask(positions)
+        self.assertEqual(mask, [True, True, False, True, False, False,
+                                False, True, False])
+        self.assertAlmostEqual(distances[5], 10.0)
+
+    def test_radius_reaches_into_the_frustum(self):
+        positions = [[10.1, 0, -10], [0, 0, -0.5], [0, 0, -100.5],
+                     [11, 0, -10]]
+        mask, _ = self._mask(positions, radii=[0.2, 0.6, 0.6, 0.2])
+        self.assertEqual(mask, [True, True, True, False])
+
+    def test_distance(self):
+        positions = [[0, 0, -40], [0, 0, -60], [0, 0, 40], [30, 0, -40]]
+        mask, distances = self._mask(positions, max_distance=50.0)
+        self.assertEqual(mask, [True, False, False, True])
+        mask, _ = self._mask(positions, max_distance=50.0, frustum=False)
+        self.assertEqual(mask, [True, False, True, True])
+        mask, _ = self._mask(positions, max_distance=50.0, frustum=False,
+                             radii=[0, 10.5, 0, 0])
+        self.assertEqual(mask, [True, True, True, True])
+        self.assertAlmostEqual(distances[3], 50.0)
+
+    def _mirrored_batch(self):
+        batch = self.scattercore.ScatterBatch("scatterBatch1", ["rock"])
+        batch.add_transforms([0, 0, 0],
+                             [[11, 0, -10], [0, 0, -10], [0, 0, -101.5]],
+                             [[0, 0, 0]] * 3,
+                             [[-2, -0.5, -0.5], [-1, 1, 1], [1, 1, -2]])
+        return batch
+
+    def _assert_mirrored_scales_reach(self):
+        culled = self.scattercore.cull_batch(self._mirrored_batch(),
+                                             self.view, radius=1.0)
+        self.assertEqual(len(culled), 3)
+
+    def test_mirrored_scales_reach_into_the_frustum(self):
+        self._assert_mirrored_scales_reach()
+
+    def test_mirrored_scales_reach_into_the_frustum_without_numpy(self):
+        numpy = self.scattercore.np
+        self.scattercore.np = None
+        try:
+            self._assert_mirrored_scales_reach()
+        finally:
+            self.scattercore.np = numpy
+
+
+class LodLevelsTest(unittest.TestCase):
+
+    def setUp(self):
+        import scattercore
+        self.scattercore = scattercore
+
+    def test_levels_start_at_their_distance(self):
+        levels = self.scattercore.lod_levels(
+            [0.0, 9.99, 10.0, 15.0, 20.0, 25.0], [10.0, 20.0])
+        self.assertEqual([int(level) for level in levels],
+                         [0, 0, 1, 1, 2, 2])
+
+    def test_even_bands(self):
+        self.assertEqual(self.scattercore.even_lod_distances(30.0, 3),
+                         [10.0, 20.0])
+        self.assertEqual(self.scattercore.even_lod_distances(30.0, 1), [])
+        levels = self.scattercore.lod_levels([5.0, 50.0], [])
+        self.assertEqual([int(level) for level in levels], [0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
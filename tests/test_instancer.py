@@ -0,0 +1,78 @@
+"""Checks the particle instancer output mode, in the fake scene of
+fakemaya.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import fakemaya
+
+
+def _grid(size):
+    positions = [[float(x), 0.0, float(z)] for x in range(size)
+                 for z in range(size)]
+    normals = [[0.0, 1.0, 0.0]] * len(positions)
+    return {"pPlane1": (positions, normals)}
+
+
+class InstancerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.meshes = _grid(12)
+        self.cmds = fakemaya.install(self.meshes, ["pCube1", "pSphere1"])
+        import scattermaya
+        scattermaya.cmds = self.cmds
+        self.scatterer = scattermaya.Scatterer(
+            fakemaya.FakeReader(self.meshes))
+        self.scatterer.scatter_targets = ["pPlane1"]
+        self.scatterer.scatter_sources = ["pCube1", "pSphere1"]
+        self.scatterer.output_mode = scattermaya.OUTPUT_INSTANCER
+        self.scatterer.scatter_density = 0.5
+        self.scatterer.seed = 4
+        self.scatterer.attribute_array[0] = [0.5, 0.5, 0.5]
+        self.scatterer.attribute_array[1] = [2, 2, 2]
+        self.scatterer.attribute_array[3] = [0, 90, 0]
+
+    def _shape(self, batch):
+        particle = batch.nodes[0]
+        return self.cmds.nodes[particle + "Shape"]
+
+    def test_one_instancer_holds_every_point(self):
+        group = self.scatterer.scatter()
+        batch = self.scatterer.scatter_instances[-1]
+        self.assertEqual(len(batch), 72)
+        self.assertEqual(len(batch.nodes), 2)
+        shape = self._shape(batch)
+        self.assertEqual(len(shape["positions"]), 72)
+        attrs = shape["attrs"]
+        self.assertFalse(attrs["isDynamic"])
+        for name in ("rotationPP", "scalePP", "indexPP"):
+            self.assertEqual(len(attrs[name]), 72)
+            self.assertEqual(attrs[name], attrs[name + "0"])
+        self.assertEqual(sorted(set(attrs["indexPP"])), [0.0, 1.0])
+        for scale in attrs["scalePP"]:
+            self.assertTrue(all(0.5 - 1e-6 <= c <= 2 + 1e-6
+                                for c in scale))
+        for position, stored in zip(shape["positions"], batch.positions):
+            self.assertEqual(list(position), [float(c) for c in stored])
+        instancer = self.cmds.nodes[batch.nodes[1]]
+        self.assertEqual(instancer["flags"]["object"],
+                         ["pCube1", "pSphere1"])
+        self.assertEqual(self.cmds.nodes[batch.nodes[0]]["parent"], group)
+
+    def test_delete_removes_the_instancer(self):
+        group = self.scatterer.scatter()
+        batch = self.scatterer.scatter_instances[-1]
+        particle, instancer = batch.nodes
+        self.assertIs(self.scatterer.delete_scatters(), batch)
+        for node in (group, particle, particle + "Shape", instancer):
+            self.assertFalse(self.cmds.objExists(node))
+        self.assertEqual(self.scatterer.scatter_instances, [])
+        self.assertEqual(self.scatterer.deleted_scatters, [batch])
+
+
+if __name__ == "__main__":
+    unittest.main()
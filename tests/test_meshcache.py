@@ -0,0 +1,114 @@
+"""Checks when MeshCache reads a mesh again."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import scattercore
+
+
+class Reader(object):
+    """Reads meshes from a dict, counting reads and watches."""
+
+    def __init__(self, meshes):
+        self.meshes = meshes
+        self.matrices = {}
+        self.reads = 0
+        self.watched = {}
+        self._next_id = 0
+
+    def read_mesh(self, name):
+        self.reads += 1
+        return ([float(c) for p in self.meshes[name] for c in p],
+                [0.0, 1.0, 0.0] * len(self.meshes[name]))
+
+    def signature(self, name):
+        return ("|" + name, len(self.meshes[name]),
+                self.matrices.get(name, 0))
+
+    def watch(self, name, callback):
+        self._next_id += 1
+        self.watched[self._next_id] = (name, callback)
+        return self._next_id
+
+    def unwatch(self, callback_id):
+        del self.watched[callback_id]
+
+    def edit(self, name):
+        for watched, callback in list(self.watched.values()):
+            if watched == name:
+                callback()
+
+
+class PlainReader(object):
+    """Reads meshes with no way to tell if they changed."""
+
+    def __init__(self, meshes):
+        self.reader = Reader(meshes)
+
+    def read_mesh(self, name):
+        return self.reader.read_mesh(name)
+
+
+def _meshes(count=50):
+    return {"pPlane1": [[i, 0, 0] for i in range(count)],
+            "pPlane2": [[0, i, 0] for i in range(count)]}
+
+
+class MeshCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.reader = Reader(_meshes())
+        self.cache = scattercore.MeshCache(self.reader)
+
+    def test_unchanged_mesh_is_read_once(self):
+        first = self.cache.mesh_data("pPlane1")
+        self.assertIs(self.cache.mesh_data("pPlane1"), first)
+        self.assertEqual(self.reader.reads, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_changed_signature_reads_again(self):
+        self.cache.mesh_data("pPlane1")
+        self.reader.meshes["pPlane1"].append([99, 0, 0])
+        self.assertEqual(len(self.cache.mesh_data("pPlane1").positions), 51)
+        self.reader.matrices["pPlane1"] = 1
+        self.cache.mesh_data("pPlane1")
+        self.assertEqual(self.reader.reads, 3)
+        self.assertEqual(len(self.reader.watched), 1)
+
+    def test_edit_reads_again(self):
+        self.cache.mesh_data("pPlane1")
+        self.reader.meshes["pPlane1"][0] = [0, 5, 0]
+        self.reader.edit("pPlane1")
+        positions = self.cache.mesh_data("pPlane1").positions
+        self.assertEqual([float(c) for c in positions[0]], [0.0, 5.0, 0.0])
+        self.assertEqual(self.reader.reads, 2)
+
+    def test_least_recently_used_mesh_is_dropped(self):
+        self.cache.max_bytes = self.cache.mesh_data("pPlane1").nbytes
+        self.cache.mesh_data("pPlane2")
+        self.assertEqual(list(self.cache._entries), ["|pPlane2"])
+        self.assertEqual([name for name, _ in self.reader.watched.values()
+                          if name != "pPlane2"], [])
+        self.cache.mesh_data("pPlane1")
+        self.assertEqual(self.reader.reads, 3)
+
+    def test_clear_stops_watching(self):
+        self.cache.mesh_data("pPlane1")
+        self.cache.digest("pPlane2")
+        self.cache.clear()
+        self.assertEqual(self.reader.watched, {})
+        self.assertEqual(self.cache.nbytes, 0)
+
+    def test_reader_without_signature_always_reads(self):
+        reader = PlainReader(_meshes())
+        cache = scattercore.MeshCache(reader)
+        cache.mesh_data("pPlane1")
+        cache.read_mesh("pPlane1")
+        self.assertEqual(reader.reader.reads, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Checks that point caches hold what was written to them, and that
+importing one lets go of the file.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import fakemaya
+import pointcache
+import scattercore
+
+
+def _batch(count=37):
+    batch = scattercore.ScatterBatch("scatterBatch1", ["rock", "tree"], 12,
+                                     "transforms")
+    batch.add_transforms(
+        [i % 2 for i in range(count)],
+        [[i * 1.5, -i, i * 0.25] for i in range(count)],
+        [[i, 2.0 * i, -i] for i in range(count)],
+        [[1.0 + i, 1.0, 0.5] for i in range(count)])
+    batch.nodes.extend("inst{0}".format(i) for i in range(count))
+    return batch
+
+
+def _rows(rows):
+    return [[float(c) for c in row] for row in rows]
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_pointcache_")
+        self.path = os.path.join(self.folder, "forest.pcache")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_header_and_columns_survive(self):
+        batch = _batch()
+        pointcache.write_batch(batch, self.path)
+        with pointcache.PointCache(self.path) as cache:
+            self.assertEqual(len(cache), len(batch))
+            self.assertEqual(cache.seed, 12)
+            self.assertEqual(cache.group, "scatterBatch1")
+            self.assertEqual(cache.sources, ["rock", "tree"])
+            self.assertEqual(cache.output_mode, "transforms")
+            read = cache.to_batch()
+            self.assertEqual(list(read.source_indices),
+                             list(batch.source_indices))
+            for name in ("positions", "rotations", "scales"):
+                self.assertEqual(_rows(getattr(read, name)),
+                                 _rows(getattr(batch, name)))
+            chunks = list(cache.iter_chunks(10))
+        self.assertEqual([len(chunk[0]) for chunk in chunks],
+                         [10, 10, 10, 7])
+        self.assertEqual(os.listdir(self.folder), ["forest.pcache"])
+
+    def test_unset_seed_and_empty_batch(self):
+        batch = scattercore.ScatterBatch("empty", ["rock"])
+        pointcache.write_batch(batch, self.path)
+        with pointcache.PointCache(self.path) as cache:
+            self.assertEqual(len(cache), 0)
+            self.assertIsNone(cache.seed)
+            self.assertEqual(list(cache.iter_chunks(10)), [])
+
+    def test_other_files_are_refused(self):
+        with open(self.path, "wb") as other:
+            other.write(b"not a point cache at all, but long enough")
+        self.assertRaises(ValueError, pointcache.PointCache, self.path)
+
+
+class ImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_pointcache_")
+        self.path = os.path.join(self.folder, "forest.pcache")
+        pointcache.write_batch(_batch(), self.path)
+        self.cmds = fakemaya.install({}, ["rock", "tree"])
+        import scattermaya
+        scattermaya.cmds = self.cmds
+        self.scatterer = scattermaya.Scatterer(fakemaya.FakeReader({}))
+        self.closed = []
+        close = pointcache.PointCache.close
+
+        def recording_close(cache):
+            self.closed.append(cache.path)
+            close(cache)
+
+        pointcache.PointCache.close = recording_close
+        self.addCleanup(setattr, pointcache.PointCache, "close", close)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_import_writes_every_instance(self):
+        job = self.scatterer.import_job(self.path, chunk_size=10)
+        while job.step():
+            pass
+        self.assertEqual(len(self.scatterer.scatter_instances[-1]), 37)
+        self.assertEqual(self.closed, [self.path])
+
+    def test_cancelled_import_closes_the_cache(self):
+        job = self.scatterer.import_job(self.path, chunk_size=10)
+        job.step()
+        job.cancel()
+        self.assertEqual(len(self.scatterer.scatter_instances[-1]), 10)
+        self.assertEqual(self.closed, [self.path])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Checks that OpenMayaMeshReader reads the points and normals it is
+given by a fake OpenMaya, with and without NumPy.
+"""
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import fakemaya
+
+
+class _Vector(tuple):
+    """An MPoint or MFloatVector: a sequence with x, y and z."""
+
+    x = property(lambda self: self[0])
+    y = property(lambda self: self[1])
+    z = property(lambda self: self[2])
+
+
+class _Mesh(object):
+
+    points = [_Vector((float(i), 2.0 * i, -1.0, 1.0)) for i in range(5)]
+    normals = [_Vector((0.0, 1.0, 0.1 * i)) for i in range(5)]
+
+    def __init__(self, dag_path):
+        self.dag_path = dag_path
+
+    def getPoints(self, space):
+        return list(self.points)
+
+    def getVertexNormals(self, angle_weighted, space):
+        return list(self.normals)
+
+
+class _Space(object):
+    kWorld = 4
+
+
+class _DagPath(object):
+
+    def extendToShape(self):
+        pass
+
+
+class _SelectionList(object):
+
+    def add(self, name):
+        self.name = name
+
+    def getDagPath(self, index):
+        return _DagPath()
+
+
+def _open_maya():
+    om2 = types.ModuleType("OpenMaya")
+    om2.MSelectionList = _SelectionList
+    om2.MFnMesh = _Mesh
+    om2.MSpace = _Space
+    return om2
+
+
+class ReadMeshTest(unittest.TestCase):
+
+    def setUp(self):
+        fakemaya.install({})
+        import scattercore
+        import scattermaya
+        self.scattercore = scattercore
+        self.numpy = scattercore.np
+        self.addCleanup(setattr, scattermaya, "om2", scattermaya.om2)
+        scattermaya.om2 = _open_maya()
+        self.reader = scattermaya.OpenMayaMeshReader()
+
+    def tearDown(self):
+        self.scattercore.np = self.numpy
+
+    def _assert_read(self):
+        positions, normals = self.reader.read_mesh("pPlane1")
+        positions = self.scattercore._to_rows(positions)
+        normals = self.scattercore._to_rows(normals)
+        self.assertEqual([[float(c) for c in row] for row in positions],
+                         [[float(i), 2.0 * i, -1.0] for i in range(5)])
+        self.assertEqual([[float(c) for c in row] for row in normals],
+                         [[0.0, 1.0, 0.1 * i] for i in range(5)])
+
+    def test_read_mesh(self):
+        self._assert_read()
+
+    def test_read_mesh_without_numpy(self):
+        self.scattercore.np = None
+        self._assert_read()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""Checks that vertex and attribute sampling pick what they should, the
+same way for the same seed.
+"""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import scattercore
+
+STRATEGIES = (scattercore.SAMPLING_AUTO, scattercore.SAMPLING_SPARSE,
+              scattercore.SAMPLING_SHUFFLE)
+ATTRIBUTES = [[0.5, 1, 1], [2, 1, 3],
+              [0, -90, 0], [0, 90, 10],
+              [-1, 0, 0], [1, 0, 0]]
+
+
+def _plain(values):
+    return [[float(c) for c in row] if hasattr(row, "__len__") else
+            int(row) for row in values]
+
+
+class ChooseVerticesTest(unittest.TestCase):
+
+    def _choose(self, count, density, strategy, seed=7):
+        return _plain(scattercore.choose_vertices(
+            count, density, random.Random(seed), strategy))
+
+    def test_picks_distinct_sorted_vertices(self):
+        for strategy in STRATEGIES:
+            for density in (0.0, 0.1, 0.5, 1.0):
+                picked = self._choose(1000, density, strategy)
+                self.assertEqual(len(picked), int(density * 1000))
+                self.assertEqual(picked, sorted(set(picked)))
+                self.assertTrue(all(0 <= i < 1000 for i in picked))
+
+    def test_seed_gives_the_same_vertices(self):
+        for strategy in STRATEGIES:
+            self.assertEqual(self._choose(5000, 0.2, strategy),
+                             self._choose(5000, 0.2, strategy))
+            self.assertNotEqual(self._choose(5000, 0.2, strategy),
+                                self._choose(5000, 0.2, strategy, seed=8))
+
+    def test_sparse_sampling_at_high_density(self):
+        for density in (0.9, 0.99, 1.0):
+            picked = self._choose(20000, density,
+                                  scattercore.SAMPLING_SPARSE)
+            self.assertEqual(len(picked), int(density * 20000))
+            self.assertEqual(picked, sorted(set(picked)))
+        self.assertEqual(picked, list(range(20000)))
+
+    def test_sparse_sampling_covers_the_population(self):
+        rng = random.Random(1)
+        seen = set()
+        for _ in range(200):
+            seen.update(scattercore.sample_sparse(20, 3, rng))
+        self.assertEqual(seen, set(range(20)))
+
+
+class PlanTest(unittest.TestCase):
+
+    def test_seed_gives_the_same_plan(self):
+        plans = [scattercore.plan_scatter(500, 3, ATTRIBUTES, 0.3, seed=21)
+                 for _ in range(2)]
+        for name in ("vertexes", "source_indices", "scales", "rotations",
+                     "offsets"):
+            self.assertEqual(_plain(getattr(plans[0], name)),
+                             _plain(getattr(plans[1], name)))
+        self.assertEqual(len(plans[0]), 150)
+        self.assertEqual(set(_plain(plans[0].source_indices)),
+                         set([0, 1, 2]))
+
+    def test_attributes_stay_in_their_ranges(self):
+        scales, rotations, offsets = scattercore.sample_attributes(
+            ATTRIBUTES, 200, seed=3)
+        for rows, (low, high) in zip((scales, rotations, offsets),
+                                     zip(ATTRIBUTES[0::2],
+                                         ATTRIBUTES[1::2])):
+            self.assertEqual(len(rows), 200)
+            for row in rows:
+                for value, lower, upper in zip(row, low, high):
+                    self.assertTrue(lower <= value <= upper)
+        again = scattercore.sample_attributes(ATTRIBUTES, 200, seed=3)
+        self.assertEqual(_plain(again[0]), _plain(scales))
+
+
+if __name__ == "__main__":
+    unittest.main()
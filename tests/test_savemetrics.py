@@ -0,0 +1,107 @@
+"""Checks the save metrics records and their p50/p95 summaries."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import savemetrics
+import scenefile
+
+
+class PercentileTest(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        values = list(range(20, 0, -1))
+        self.assertEqual(savemetrics.percentile(values, 0.5), 10)
+        self.assertEqual(savemetrics.percentile(values, 0.95), 19)
+        self.assertEqual(savemetrics.percentile(values, 1.0), 20)
+        self.assertEqual(savemetrics.percentile(values, 0.0), 1)
+
+    def test_few_values(self):
+        self.assertEqual(savemetrics.percentile([], 0.5), 0.0)
+        self.assertEqual(savemetrics.percentile([3.5], 0.95), 3.5)
+        self.assertEqual(savemetrics.percentile([1, 9], 0.5), 1)
+
+
+class RecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_savemetrics_")
+        self.path = os.path.join(self.folder, "metrics.jsonl")
+        savemetrics.set_metrics_file(self.path)
+
+    def tearDown(self):
+        savemetrics.set_metrics_file(None)
+        shutil.rmtree(self.folder)
+
+    def _record(self, folder, seconds, ok=True, written=0):
+        metrics = savemetrics.SaveMetrics(folder, folder + "/a_b_v001.ma")
+        metrics.add_phase("copy", seconds)
+        metrics.count("bytes_written", written)
+        record = metrics.finish(None if ok else IOError("disk full"))
+        record["seconds"] = seconds
+        return record
+
+    def test_phases_and_counts_add_up(self):
+        metrics = savemetrics.SaveMetrics(self.folder)
+        with metrics.phase("copy"):
+            pass
+        metrics.add_phase("copy", 1.0)
+        metrics.count("created_folders")
+        metrics.count("created_folders")
+        record = metrics.finish(OSError("No space left on device"))
+        self.assertGreaterEqual(record["phases"]["copy"], 1.0)
+        self.assertEqual(record["counts"], {"created_folders": 2})
+        self.assertFalse(record["ok"])
+        self.assertIn("No space", record["error"])
+
+    def test_records_are_appended_and_read_back(self):
+        self._record("/fast", 0.5)
+        with open(self.path, "a") as metrics:
+            metrics.write("not json\n")
+        self._record("/slow", 2.0, ok=False)
+        records = savemetrics.read_records([self.path])
+        self.assertEqual([record["folder"] for record in records],
+                         ["/fast", "/slow"])
+        self.assertEqual([record["ok"] for record in records],
+                         [True, False])
+
+    def test_summary_puts_the_slowest_folder_first(self):
+        records = ([self._record("/fast", 0.1 * i, written=1024 * 1024)
+                    for i in range(1, 11)] +
+                   [self._record("/slow", 1.0 * i) for i in range(1, 5)])
+        records[-1]["ok"] = False
+        summaries = savemetrics.summarize(records)
+        self.assertEqual([summary["folder"] for summary in summaries],
+                         ["/slow", "/fast"])
+        slow_summary, fast_summary = summaries
+        self.assertEqual((slow_summary["saves"], slow_summary["failed"]),
+                         (4, 1))
+        self.assertEqual((slow_summary["p50"], slow_summary["p95"]),
+                         (2.0, 4.0))
+        self.assertAlmostEqual(fast_summary["p50"], 0.5)
+        self.assertAlmostEqual(fast_summary["mb_per_second"], 10 / 5.5)
+        self.assertEqual(sorted(fast_summary["phases"]), ["copy"])
+
+    def test_save_job_records_its_phases(self):
+        local = os.path.join(self.folder, "local.ma")
+        with open(local, "w") as scene:
+            scene.write("//Maya ASCII scene\n" * 100)
+        path = os.path.join(self.folder, "new", "shot_anim_v001.ma")
+        job = scenefile.SaveJob(local, path)
+        job.run()
+        self.assertIsNone(job.error)
+        record = savemetrics.read_records([self.path])[-1]
+        self.assertTrue(record["ok"])
+        self.assertEqual(sorted(record["phases"]), ["copy", "makedirs"])
+        self.assertEqual(record["counts"]["bytes_written"],
+                         os.path.getsize(path))
+        self.assertEqual(record["counts"]["created_folders"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Checks the array-backed ScatterBatch and its NameTable."""
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import scattercore
+
+
+def _batch(count=6):
+    batch = scattercore.ScatterBatch("scatterBatch1", ["rock", "tree"], 3)
+    batch.add_transforms([i % 2 for i in range(count)],
+                         [[i, 2 * i, -i] for i in range(count)],
+                         [[0, 10 * i, 0] for i in range(count)],
+                         [[1 + i, 1, 1] for i in range(count)])
+    batch.nodes.extend("inst{0}".format(i) for i in range(count))
+    return batch
+
+
+def _rows(rows):
+    return [[float(c) for c in row] for row in rows]
+
+
+class NameTableTest(unittest.TestCase):
+
+    def test_names_read_back_in_order(self):
+        table = scattercore.NameTable(["a", "bb"])
+        table.extend(["", "|group|ccc"])
+        self.assertEqual(len(table), 4)
+        self.assertEqual(list(table), ["a", "bb", "", "|group|ccc"])
+        self.assertEqual(table[1], "bb")
+        self.assertEqual(table[-1], "|group|ccc")
+        self.assertEqual(table[2], "")
+        self.assertRaises(IndexError, table.__getitem__, 4)
+
+    def test_reads_between_extends(self):
+        table = scattercore.NameTable()
+        table.extend(["first"])
+        self.assertEqual(table[0], "first")
+        table.extend(["second"])
+        self.assertEqual(list(table), ["first", "second"])
+        self.assertEqual(table.nbytes, len("firstsecond") +
+                         2 * table._ends.itemsize)
+
+
+class ScatterBatchTest(unittest.TestCase):
+
+    def test_columns_keep_what_was_added(self):
+        batch = _batch()
+        self.assertEqual(len(batch), 6)
+        self.assertEqual(list(batch.source_indices), [0, 1, 0, 1, 0, 1])
+        self.assertEqual(_rows(batch.positions)[2], [2.0, 4.0, -2.0])
+        self.assertEqual(_rows(batch.rotations)[3], [0.0, 30.0, 0.0])
+        self.assertEqual(batch.nbytes, 6 * 52 + batch.nodes.nbytes)
+
+    def test_matrices_read_back(self):
+        batch = _batch()
+        again = scattercore.ScatterBatch("copy", batch.sources)
+        again.add(batch.source_indices, batch.matrices())
+        for name in ("positions", "rotations", "scales"):
+            for row, other in zip(_rows(getattr(again, name)),
+                                  _rows(getattr(batch, name))):
+                for value, expected in zip(row, other):
+                    self.assertAlmostEqual(value, expected, places=4)
+
+    def test_subset_keeps_the_full_batch(self):
+        batch = _batch()
+        subset = batch.subset([1, 4], [0, 0])
+        self.assertIs(subset.full, batch)
+        self.assertEqual(list(subset.source_indices), [0, 0])
+        self.assertEqual(_rows(subset.positions),
+                         [[1.0, 2.0, -1.0], [4.0, 8.0, -4.0]])
+        self.assertIs(subset.subset([0]).full, batch)
+        self.assertEqual(len(subset.nodes), 0)
+
+    def test_chunks_cover_every_instance(self):
+        chunks = list(_batch().iter_chunks(4))
+        self.assertEqual([len(chunk[0]) for chunk in chunks], [4, 2])
+        self.assertEqual(_rows(chunks[1][3]),
+                         [[5.0, 1.0, 1.0], [6.0, 1.0, 1.0]])
+
+    def test_stats(self):
+        stats = _batch().stats()
+        self.assertEqual(stats["instances"], 6)
+        self.assertEqual(stats["nodes"], 6)
+        self.assertEqual(stats["sources"], {"rock": 3, "tree": 3})
+        self.assertEqual([list(map(float, bound))
+                          for bound in stats["bounds"]],
+                         [[0.0, 0.0, -5.0], [5.0, 10.0, 0.0]])
+        self.assertEqual(stats["scale"], (1.0, 6.0))
+
+    def test_export_csv(self):
+        folder = tempfile.mkdtemp(prefix="test_scatterbatch_")
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, "batch.csv")
+        _batch(2).export_csv(path)
+        with open(path) as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(rows[0], ["source", "tx", "ty", "tz", "rx", "ry",
+                                   "rz", "sx", "sy", "sz"])
+        self.assertEqual(rows[1:], [
+            ["rock"] + [repr(float(c)) for c in (0, 0, 0, 0, 0, 0, 1, 1, 1)],
+            ["tree"] + [repr(float(c)) for c in (1, 2, -1, 0, 10, 0, 2, 1,
+                                                 1)]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Checks when the result cache reuses a scatter, in the fake scene of
+fakemaya.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import fakemaya
+
+
+def _grid(size, height=0.0):
+    positions = [[float(x), height, float(z)] for x in range(size)
+                 for z in range(size)]
+    normals = [[0.0, 1.0, 0.3]] * len(positions)
+    return {"pPlane1": (positions, normals)}
+
+
+class ResultCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.meshes = _grid(10)
+        self.cmds = fakemaya.install(self.meshes, ["pCube1"])
+        import scattermaya
+        scattermaya.cmds = self.cmds
+        self.scatterer = scattermaya.Scatterer(
+            fakemaya.FakeReader(self.meshes))
+        self.scatterer.scatter_targets = ["pPlane1"]
+        self.scatterer.scatter_sources = ["pCube1"]
+        self.scatterer.seed = 5
+
+    def _heights(self):
+        self.scatterer.scatter()
+        batch = self.scatterer.scatter_instances[-1]
+        return set(round(position[1], 6) for position in batch.positions)
+
+
+class ResultCacheTest(ResultCacheTestCase):
+
+    def test_same_settings_hit(self):
+        first = self._heights()
+        self.assertEqual(self._heights(), first)
+        cache = self.scatterer.result_cache
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_moved_points_miss(self):
+        self.assertEqual(self._heights(), set([0.0]))
+        self.meshes.update(_grid(10, height=5.0))
+        self.assertEqual(self._heights(), set([5.0]))
+        cache = self.scatterer.result_cache
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_unset_seed_is_not_cached(self):
+        self.scatterer.seed = None
+        self._heights()
+        self._heights()
+        cache = self.scatterer.result_cache
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+
+class WatchingReader(fakemaya.FakeReader):
+    """A FakeReader that counts reads and can watch meshes, as the
+    OpenMaya reader does."""
+
+    def __init__(self, meshes):
+        super(WatchingReader, self).__init__(meshes)
+        self.reads = 0
+        self.callbacks = {}
+
+    def read_mesh(self, name):
+        self.reads += 1
+        return super(WatchingReader, self).read_mesh(name)
+
+    def signature(self, name):
+        return ("|" + name, len(self.meshes[name][0]))
+
+    def watch(self, name, callback):
+        self.callbacks[len(self.callbacks)] = (name, callback)
+        return len(self.callbacks) - 1
+
+    def unwatch(self, callback_id):
+        del self.callbacks[callback_id]
+
+    def edit(self, name):
+        for watched, callback in list(self.callbacks.values()):
+            if watched == name:
+                callback()
+
+
+class WarmHitTest(ResultCacheTestCase):
+
+    def setUp(self):
+        super(WarmHitTest, self).setUp()
+        import scattercore
+        self.reader = WatchingReader(self.meshes)
+        self.scatterer.mesh_cache = scattercore.MeshCache(self.reader)
+
+    def test_warm_hit_skips_the_mesh_read(self):
+        self._heights()
+        reads = self.reader.reads
+        # As if the mesh data had been evicted since.
+        self.scatterer.mesh_cache._entries.clear()
+        self._heights()
+        self.assertEqual(self.reader.reads, reads)
+        cache = self.scatterer.result_cache
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_edited_mesh_is_hashed_again(self):
+        self.assertEqual(self._heights(), set([0.0]))
+        self.meshes.update(_grid(10, height=5.0))
+        self.reader.edit("pPlane1")
+        self.assertEqual(self._heights(), set([5.0]))
+        cache = self.scatterer.result_cache
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
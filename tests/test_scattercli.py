@@ -0,0 +1,127 @@
+"""Checks that recipes are parsed and run scene by scene, in the fake
+scene of fakemaya.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import fakemaya
+import scattercli
+
+
+def _grid(size):
+    positions = [[float(x), 0.0, float(z)] for x in range(size)
+                 for z in range(size)]
+    normals = [[0.0, 1.0, 0.0]] * len(positions)
+    return {"ground": (positions, normals)}
+
+
+RECIPE = {
+    "defaults": {"density": 0.5, "seed": 1},
+    "scenes": [
+        {"scene": "layout.ma", "output": "out/scatter.mb",
+         "scatters": [
+             {"targets": ["ground"], "sources": ["rock1", "rock2"],
+              "scale": [[0.5, 0.5, 0.5], [2, 2, 2]]},
+             {"targets": ["ground"], "sources": ["tree1"],
+              "density": 0.25}]},
+        {"scene": "missing.ma"},
+    ],
+}
+
+
+class FakeSession(object):
+    """Opens and saves scenes by name only."""
+
+    def __init__(self, scenes):
+        self.scenes = scenes
+        self.saved = []
+
+    def open_scene(self, path):
+        if os.path.basename(path) not in self.scenes:
+            raise RuntimeError("File not found: " + path)
+
+    def save_scene(self, path):
+        self.saved.append(path)
+
+
+class RecipeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_scattercli_")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_defaults_fill_the_scatters(self):
+        jobs = scattercli.parse_recipe(RECIPE, self.folder)
+        first, second = jobs[0].scatters
+        self.assertEqual(first.settings["density"], 0.5)
+        self.assertEqual(second.settings["density"], 0.25)
+        self.assertEqual(first.settings["seed"], 1)
+        self.assertEqual(first.attribute_array[:2],
+                         [[0.5, 0.5, 0.5], [2, 2, 2]])
+        self.assertEqual(jobs[0].output,
+                         os.path.join(self.folder, "out/scatter.mb"))
+        self.assertEqual(jobs[1].output,
+                         os.path.join(self.folder, "missing_scattered.ma"))
+
+    def test_load_recipe_is_relative_to_its_file(self):
+        path = os.path.join(self.folder, "recipe.json")
+        with open(path, "w") as recipe_file:
+            json.dump(RECIPE, recipe_file)
+        jobs = scattercli.load_recipe(path)
+        self.assertEqual(jobs[0].scene,
+                         os.path.join(self.folder, "layout.ma"))
+
+    def test_bad_recipes_are_refused(self):
+        bad_scatters = (
+            {"targets": ["ground"], "sources": ["rock1"], "densty": 1},
+            {"targets": ["ground"], "sources": []},
+            {"targets": "ground", "sources": ["rock1"]},
+            {"targets": ["ground"], "sources": ["rock1"],
+             "scale": [[1, 1, 1]]},
+        )
+        for scatter in bad_scatters:
+            self.assertRaises(scattercli.RecipeError,
+                              scattercli.ScatterSpec.from_dict, scatter)
+        self.assertRaises(scattercli.RecipeError, scattercli.parse_recipe,
+                          {"defaults": {}})
+        self.assertRaises(scattercli.RecipeError, scattercli.parse_recipe,
+                          {"scenes": [{"output": "a.ma"}]})
+        self.assertRaises(scattercli.RecipeError, scattercli.parse_recipe,
+                          {"scenes": [{"scene": "a.ma", "output": "a.obj"}]})
+
+
+class RunJobsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.meshes = _grid(10)
+        self.cmds = fakemaya.install(self.meshes, ["rock1", "rock2", "tree1"])
+        import scattermaya
+        scattermaya.cmds = self.cmds
+        self.scattermaya = scattermaya
+        self.session = FakeSession(["layout.ma"])
+
+    def _scatterer(self):
+        return self.scattermaya.Scatterer(fakemaya.FakeReader(self.meshes))
+
+    def test_each_scene_runs_and_failures_are_kept_apart(self):
+        jobs = scattercli.parse_recipe(RECIPE, "/shots")
+        results = scattercli.run_jobs(jobs, self.session, self._scatterer)
+        self.assertEqual([result["status"] for result in results],
+                         ["ok", "failed"])
+        self.assertEqual(results[0]["instances"], 50 + 25)
+        self.assertIn("missing.ma", results[1]["error"])
+        self.assertEqual(self.session.saved,
+                         [os.path.join("/shots", "out/scatter.mb")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""Checks that a scatter's batch only holds the instances in the scene,
+in the fake scene of fakemaya.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import fakemaya
+
+
+def _grid(size):
+    positions = [[float(x), 0.0, float(z)] for x in range(size)
+                 for z in range(size)]
+    normals = [[0.1, 1.0, 0.2]] * len(positions)
+    return {"pPlane1": (positions, normals)}
+
+
+class ScatterJobTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.meshes = _grid(30)
+        self.cmds = fakemaya.install(self.meshes, ["pCube1", "pSphere1"])
+        import scattermaya
+        scattermaya.cmds = self.cmds
+        self.scattermaya = scattermaya
+        self.scatterer = scattermaya.Scatterer(
+            fakemaya.FakeReader(self.meshes))
+        self.scatterer.scatter_targets = ["pPlane1"]
+        self.scatterer.scatter_sources = ["pCube1", "pSphere1"]
+        self.scatterer.seed = 11
+
+    def _cancel_after(self, job, steps):
+        for _ in range(steps):
+            job.step()
+        job.cancel()
+        return self.scatterer.scatter_instances[-1]
+
+
+class CancelTest(ScatterJobTestCase):
+
+    def test_cancelled_batch_matches_its_nodes(self):
+        job = self.scatterer.scatter_job(chunk_size=100)
+        batch = self._cancel_after(job, 3)
+        self.assertEqual(len(batch.nodes), 300)
+        self.assertEqual(len(batch), len(batch.nodes))
+
+    def test_reapply_of_cancelled_batch_makes_only_its_instances(self):
+        self._cancel_after(self.scatterer.scatter_job(chunk_size=100), 2)
+        self.scatterer.delete_scatters()
+        job = self.scatterer.reapply_job(chunk_size=50)
+        while job.step():
+            pass
+        batch = self.scatterer.scatter_instances[-1]
+        self.assertEqual(len(batch.nodes), 200)
+        self.assertEqual(len(batch), 200)
+
+    def test_job_cancelled_before_its_first_step_has_no_batch(self):
+        self.scatterer.scatter()
+        earlier = self.scatterer.scatter_instances[-1]
+        job = self.scatterer.scatter_job(chunk_size=100)
+        job.cancel()
+        self.assertIsNone(job.batch)
+        self.assertEqual(job.done, 0)
+        self.assertEqual(self.scatterer.scatter_instances, [earlier])
+
+    def test_job_keeps_its_batch(self):
+        job = self.scatterer.scatter_job(chunk_size=100)
+        batch = self._cancel_after(job, 1)
+        self.assertIs(job.batch, batch)
+
+    def test_cancelled_reapply_matches_its_nodes(self):
+        self.scatterer.scatter()
+        job = self.scatterer.reapply_job(
+            self.scatterer.scatter_instances[-1], chunk_size=100)
+        batch = self._cancel_after(job, 4)
+        self.assertEqual(len(batch.nodes), 400)
+        self.assertEqual(len(batch), len(batch.nodes))
+
+
+class DeleteTest(ScatterJobTestCase):
+
+    def test_delete_after_undo_drops_the_undone_batch(self):
+        self.scatterer.scatter()
+        kept = self.scatterer.scatter_instances[-1]
+        self.scatterer.scatter()
+        undone = self.scatterer.scatter_instances[-1]
+        # Undoing every step of a scatter in Maya removes its group.
+        self.cmds.delete([undone.group])
+        self.assertIs(self.scatterer.delete_scatters(), kept)
+        self.assertFalse(self.cmds.objExists(kept.group))
+        self.assertEqual(self.scatterer.scatter_instances, [])
+        self.assertEqual(self.scatterer.deleted_scatters, [kept])
+
+    def test_delete_with_only_undone_batches(self):
+        self.scatterer.scatter()
+        self.cmds.delete([self.scatterer.scatter_instances[-1].group])
+        self.assertIsNone(self.scatterer.delete_scatters())
+        self.assertEqual(self.scatterer.scatter_instances, [])
+
+
+class UndoChunkTest(ScatterJobTestCase):
+
+    def test_no_chunk_is_open_between_steps(self):
+        job = self.scatterer.scatter_job(chunk_size=100)
+        for _ in range(3):
+            job.step()
+            self.assertEqual(self.cmds.open_chunks, 0)
+        self.assertEqual(self.cmds.chunks, 3)
+        job.cancel()
+        self.assertEqual(self.cmds.open_chunks, 0)
+
+    def test_scatter_closes_its_chunks(self):
+        self.scatterer.scatter()
+        self.assertEqual(self.cmds.open_chunks, 0)
+        self.assertEqual(len(self.scatterer.scatter_instances[-1]), 900)
+
+
+if __name__ == "__main__":
+    unittest.main()
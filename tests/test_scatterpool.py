@@ -0,0 +1,136 @@
+"""Checks that the worker pool scatters exactly like a single process and
+frees its shared memory.
+"""
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import scattercore
+import scatterpool
+
+SHARED_MEMORY_FOLDER = "/dev/shm"
+
+
+class GridReader(object):
+    """Reads wavy grids of triangles, one per mesh name."""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+
+    def read_mesh(self, name):
+        size = self.sizes[name]
+        positions, normals = [], []
+        for i in range(size * size):
+            x, z = i % size, i // size
+            positions.extend([x, math.sin(x * 0.3) * z * 0.2, z])
+            normals.extend([math.sin(i * 0.7), 1.0, math.cos(i * 1.1)])
+        return positions, normals
+
+    def read_triangles(self, name):
+        size = self.sizes[name]
+        triangles = []
+        for z in range(size - 1):
+            for x in range(size - 1):
+                i = z * size + x
+                triangles.extend([i, i + size, i + 1,
+                                  i + 1, i + size, i + size + 1])
+        return triangles
+
+
+READER = GridReader({"pPlane1": 30, "pPlane2": 20, "pPlane3": 25})
+TARGETS = ["pPlane1", "pPlane2.vtx[10:200]", "pPlane3"]
+SOURCES = [[2, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0.5, 0, 0, 0, 0, 1],
+           [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1]]
+
+
+def _settings(mode=scattercore.SAMPLE_VERTICES):
+    return scattercore.ScatterSettings(
+        [[0.5, 0.5, 0.5], [2, 2, 2], [-90, -90, -90], [90, 90, 90],
+         [-1, -1, -1], [1, 1, 1]], density=0.6, seed=23, mode=mode,
+        min_distance=0.4)
+
+
+def _serial(settings):
+    """The single worker scatter of Scatterer, planned all at once."""
+    return [(list(plan.source_indices),
+             scattercore.plan_transforms(samples, plan, settings.alignment,
+                                         SOURCES))
+            for samples, plan in scattercore.iter_plans(
+                TARGETS, READER, len(SOURCES), settings)]
+
+
+def _pooled(settings, workers):
+    return [(list(source_indices), matrices) for source_indices, matrices
+            in scatterpool.iter_target_transforms(
+                TARGETS, READER, len(SOURCES), settings, workers,
+                sources=SOURCES)]
+
+
+class SameScatterTestCase(unittest.TestCase):
+
+    def assertSameScatter(self, results, references):
+        self.assertEqual(len(results), len(references))
+        for (indices, matrices), (ref_indices, ref_matrices) in zip(
+                results, references):
+            self.assertTrue(ref_indices)
+            self.assertEqual([int(i) for i in indices],
+                             [int(i) for i in ref_indices])
+            self.assertEqual(len(matrices), len(ref_matrices))
+            for matrix, reference in zip(matrices, ref_matrices):
+                for value, expected in zip(matrix, reference):
+                    self.assertAlmostEqual(value, expected, places=9)
+
+
+class StreamingTest(SameScatterTestCase):
+
+    def test_streaming_matches_planning_up_front(self):
+        for mode in (scattercore.SAMPLE_VERTICES,
+                     scattercore.SAMPLE_POISSON):
+            settings = _settings(mode)
+            self.assertSameScatter(_pooled(settings, 1), _serial(settings))
+
+
+@unittest.skipUnless(scatterpool.parallel_available(),
+                     "needs NumPy and multiprocessing.shared_memory")
+class WorkersTest(SameScatterTestCase):
+
+    def test_any_number_of_workers_gives_the_same_scatter(self):
+        for mode in (scattercore.SAMPLE_VERTICES,
+                     scattercore.SAMPLE_POISSON):
+            settings = _settings(mode)
+            reference = _serial(settings)
+            for workers in (1, 2, 4):
+                self.assertSameScatter(_pooled(settings, workers),
+                                       reference)
+
+
+@unittest.skipUnless(scatterpool.parallel_available() and
+                     os.path.isdir(SHARED_MEMORY_FOLDER),
+                     "needs NumPy and POSIX shared memory")
+class SharedMemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.before = set(os.listdir(SHARED_MEMORY_FOLDER))
+
+    def assertNoSegmentsLeft(self):
+        self.assertEqual(set(os.listdir(SHARED_MEMORY_FOLDER)) - self.before,
+                         set())
+
+    def test_finished_run_unlinks_its_segments(self):
+        _pooled(_settings(), 2)
+        self.assertNoSegmentsLeft()
+
+    def test_cancelled_run_unlinks_its_segments(self):
+        transforms = scatterpool.iter_target_transforms(
+            TARGETS, READER, len(SOURCES), _settings(), 2, sources=SOURCES)
+        next(transforms)
+        transforms.close()
+        self.assertNoSegmentsLeft()
+
+
+if __name__ == "__main__":
+    unittest.main()
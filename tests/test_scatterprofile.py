@@ -0,0 +1,130 @@
+"""Checks how ScatterProfile times nested phases, and that a profiling
+Scatterer records its phases, in the fake scene of fakemaya.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import fakemaya
+import scatterprofile
+
+
+class Clock(object):
+    """Stands in for the time module, moving on only when told to."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ScatterProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.addCleanup(setattr, scatterprofile, "time", scatterprofile.time)
+        scatterprofile.time = self.clock
+        self.profile = scatterprofile.ScatterProfile()
+
+    def _outer(self):
+        self.clock.sleep(1.0)
+        self.profile.call("inner", self.clock.sleep, 2.0)
+        self.profile.call("inner", self.clock.sleep, 0.5)
+        return "done"
+
+    def test_nested_phases_keep_their_own_time(self):
+        self.assertEqual(self.profile.call("outer", self._outer), "done")
+        self.assertEqual(self.profile.phases[("outer",)], [3.5, 1.0, 1])
+        self.assertEqual(self.profile.phases[("outer", "inner")],
+                         [2.5, 2.5, 2])
+
+    def test_totals_sum_a_phase_wherever_it_ran(self):
+        self.profile.call("outer", self._outer)
+        self.profile.call("inner", self.clock.sleep, 1.0)
+        self.assertEqual(self.profile.totals(),
+                         [("inner", 3.5, 3), ("outer", 1.0, 1)])
+        self.assertEqual(self.profile.summary(1), ["inner 78% 3.500s 3 calls"])
+
+    def test_failing_phase_is_still_timed(self):
+        def fail():
+            self.clock.sleep(1.0)
+            raise ValueError("failed")
+        self.assertRaises(ValueError, self.profile.call, "fail", fail)
+        self.assertEqual(self.profile.phases[("fail",)], [1.0, 1.0, 1])
+        self.assertEqual(self.profile._stack, [])
+
+    def test_iter_timed_skips_the_consumer(self):
+        def steps():
+            for _ in range(3):
+                self.clock.sleep(1.0)
+                yield
+        for _ in self.profile.iter_timed("step", steps()):
+            self.clock.sleep(10.0)
+        self.assertEqual(self.profile.phases[("step",)], [3.0, 3.0, 4])
+
+    def test_wrap_times_every_method(self):
+        class Scene(object):
+            name = "scene"
+
+            def create(self, node, parent=None):
+                return node, parent
+
+        scene = self.profile.wrap(Scene(), "scene")
+        self.assertEqual(scene.name, "scene")
+        self.assertEqual(scene.create("a", parent="b"), ("a", "b"))
+        self.assertEqual(scene.create("c"), ("c", None))
+        self.assertEqual(self.profile.phases[("scene.create",)][2], 2)
+
+    def test_folded_stacks(self):
+        self.profile.call("outer", self._outer)
+        folder = tempfile.mkdtemp(prefix="test_scatterprofile_")
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, "scatter.folded")
+        self.profile.write_folded(path)
+        with open(path) as folded:
+            self.assertEqual(folded.read().splitlines(),
+                             ["outer;inner 2500000", "outer 1000000"])
+
+
+class ProfilingScattererTest(unittest.TestCase):
+
+    def setUp(self):
+        positions = [[float(x), 0.0, float(z)] for x in range(10)
+                     for z in range(10)]
+        self.meshes = {"pPlane1": (positions, [[0.0, 1.0, 0.0]] * 100)}
+        self.cmds = fakemaya.install(self.meshes, ["pCube1"])
+        import scattermaya
+        scattermaya.cmds = self.cmds
+        self.scatterer = scattermaya.Scatterer(
+            fakemaya.FakeReader(self.meshes))
+        self.scatterer.scatter_targets = ["pPlane1"]
+        self.scatterer.scatter_sources = ["pCube1"]
+        self.scatterer.profiling = True
+
+    def test_scatter_records_its_phases(self):
+        job = self.scatterer.scatter_job(chunk_size=30)
+        while job.step():
+            pass
+        names = set(name for name, _, _ in job.profile.totals())
+        for name in ("scatter", "plan", "transforms", "write", "store",
+                     "reader.read_mesh", "scene.instance"):
+            self.assertIn(name, names)
+        calls = dict((name, count) for name, _, count
+                     in job.profile.totals())
+        self.assertEqual(calls["scene.instance"], 100)
+        self.assertIs(self.scatterer.last_profile, job.profile)
+        self.assertNotIsInstance(self.scatterer.scene,
+                                 scatterprofile._Profiled)
+
+
+if __name__ == "__main__":
+    unittest.main()
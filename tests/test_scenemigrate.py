@@ -0,0 +1,197 @@
+"""Checks how scenes are planned, journaled and migrated, with
+StubSession standing in for Maya.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import textwrap
+import unittest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+import scenefile
+import scenemigrate
+
+
+class InProcessPool(object):
+    """Migrates every scene in this process, like a worker would."""
+
+    def __init__(self):
+        self.session = scenemigrate.StubSession()
+        self.sources = []
+
+    def run(self, migrations, on_result):
+        for migration in migrations:
+            self.sources.append(migration.source)
+            result = migration.to_dict()
+            result.update(migration.hash_source())
+            result.update(scenemigrate.migrate_scene(
+                self.session, migration.source, migration.output))
+            result.update(status=scenemigrate.STATUS_OK, seconds=0.0)
+            on_result(result)
+
+
+class MigrateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_scenemigrate_")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _scene(self, name, text="//Maya ASCII scene\n"):
+        path = os.path.join(self.folder, name)
+        with open(path, "w") as scene:
+            scene.write(text)
+        return scenefile.SceneFile(path)
+
+    def _names(self, migrations):
+        return [(os.path.basename(migration.source),
+                 os.path.basename(migration.output))
+                for migration in migrations]
+
+
+class PlanTest(MigrateTestCase):
+
+    def test_renumbering_keeps_formats_together(self):
+        scenes = [self._scene("shot_anim_v004.ma"),
+                  self._scene("shot_anim_v004.mb"),
+                  self._scene("shot_anim_v007.ma")]
+        rule = scenemigrate.MigrationRule(task="layout", renumber=True)
+        self.assertEqual(self._names(rule.plan(scenes)), [
+            ("shot_anim_v004.ma", "shot_layout_v001.ma"),
+            ("shot_anim_v004.mb", "shot_layout_v001.mb"),
+            ("shot_anim_v007.ma", "shot_layout_v002.ma")])
+
+    def test_two_scenes_saved_as_one_are_refused(self):
+        scenes = [self._scene("shot_anim_v001.ma"),
+                  self._scene("prop_anim_v001.ma")]
+        rule = scenemigrate.MigrationRule(descriptor="set")
+        self.assertRaises(scenemigrate.MigrationError, rule.plan, scenes)
+
+    def test_saving_over_a_migrated_scene_is_refused(self):
+        scenes = [self._scene("shot_anim_v002.ma"),
+                  self._scene("shot_anim_v003.ma")]
+        rule = scenemigrate.MigrationRule(renumber=True)
+        self.assertRaises(scenemigrate.MigrationError, rule.plan, scenes)
+
+    def test_scenes_the_rule_matches_are_outputs(self):
+        scenes = [self._scene("shot_anim_v001.ma"),
+                  self._scene("shot_anim_v001.mb")]
+        rule = scenemigrate.MigrationRule(extension=".mb")
+        self.assertEqual(self._names(rule.plan(scenes)),
+                         [("shot_anim_v001.ma", "shot_anim_v001.mb")])
+
+
+class JournalTest(MigrateTestCase):
+
+    def setUp(self):
+        super(JournalTest, self).setUp()
+        self.scenes = [self._scene("shot_anim_v001.ma", "one\n"),
+                       self._scene("shot_anim_v002.ma", "two\n")]
+        self.rule = scenemigrate.MigrationRule(task="layout")
+        self.journal_path = os.path.join(self.folder, "journal.jsonl")
+
+    def _run(self):
+        journal = scenemigrate.Journal(self.journal_path)
+        todo, skipped = scenemigrate.pending(self.rule.plan(self.scenes),
+                                             journal)
+        pool = InProcessPool()
+        scenemigrate.run_migrations(todo, pool, journal)
+        return pool.sources, [result["status"] for result in skipped]
+
+    def test_resume_skips_unchanged_scenes_without_hashing(self):
+        self._run()
+        file_hash = scenemigrate.file_hash
+
+        def no_hash(path):
+            raise AssertionError("Hashed " + path)
+
+        scenemigrate.file_hash = no_hash
+        try:
+            sources, skipped = self._run()
+        finally:
+            scenemigrate.file_hash = file_hash
+        self.assertEqual(sources, [])
+        self.assertEqual(skipped, [scenemigrate.STATUS_UNCHANGED] * 2)
+
+    def test_changed_source_is_migrated_again(self):
+        self._run()
+        self._scene("shot_anim_v002.ma", "two, edited\n")
+        sources, skipped = self._run()
+        self.assertEqual([os.path.basename(source) for source in sources],
+                         ["shot_anim_v002.ma"])
+        self.assertEqual(skipped, [scenemigrate.STATUS_UNCHANGED])
+        with open(os.path.join(self.folder, "shot_layout_v002.ma")) as out:
+            self.assertEqual(out.read(), "two, edited\n")
+
+    def test_outputs_not_in_the_journal_are_kept(self):
+        self._scene("shot_layout_v001.ma", "by hand\n")
+        sources, skipped = self._run()
+        self.assertEqual([os.path.basename(source) for source in sources],
+                         ["shot_anim_v002.ma"])
+        self.assertEqual(skipped, [scenemigrate.STATUS_EXISTS])
+
+
+# Migrates with StubSession, but dies on scenes named crash.
+CRASHING_WORKER = textwrap.dedent("""
+    import json, os, sys
+    sys.path.insert(0, {src!r})
+    import scenemigrate
+    for line in iter(sys.stdin.readline, ""):
+        task = json.loads(line)
+        if "crash" in task["source"]:
+            os._exit(1)
+        result = dict(task, seconds=0.0, status=scenemigrate.STATUS_OK)
+        result.update(scenemigrate.migrate_scene(
+            scenemigrate.StubSession(), task["source"], task["output"]))
+        sys.stdout.write(scenemigrate.RESULT_PREFIX + json.dumps(result) +
+                         "\\n")
+        sys.stdout.flush()
+""")
+
+
+class WorkerPoolTest(MigrateTestCase):
+
+    def test_a_dead_worker_fails_only_its_scene(self):
+        scenes = [self._scene("a_anim_v001.ma"),
+                  self._scene("crash_anim_v001.ma"),
+                  self._scene("c_anim_v001.ma")]
+        migrations = scenemigrate.MigrationRule(task="layout").plan(scenes)
+        pool = scenemigrate.WorkerPool(
+            [sys.executable, "-c", CRASHING_WORKER.format(src=SRC)], 1)
+        results = scenemigrate.run_migrations(migrations, pool,
+                                              scenemigrate.Journal())
+        statuses = dict((os.path.basename(result["source"]),
+                         result["status"]) for result in results)
+        self.assertEqual(statuses, {
+            "a_anim_v001.ma": scenemigrate.STATUS_OK,
+            "crash_anim_v001.ma": scenemigrate.STATUS_FAILED,
+            "c_anim_v001.ma": scenemigrate.STATUS_OK})
+        self.assertTrue(os.path.exists(
+            os.path.join(self.folder, "c_layout_v001.ma")))
+
+    def test_stub_workers_migrate_and_journal(self):
+        scenes = [self._scene("shot_anim_v00{0}.ma".format(version))
+                  for version in (1, 2, 3)]
+        migrations = scenemigrate.MigrationRule(extension=".mb").plan(scenes)
+        journal_path = os.path.join(self.folder, "journal.jsonl")
+        pool = scenemigrate.WorkerPool(
+            scenemigrate.worker_command(stub=True), 2)
+        scenemigrate.run_migrations(migrations, pool,
+                                    scenemigrate.Journal(journal_path))
+        with open(journal_path) as journal_file:
+            entries = [json.loads(line) for line in journal_file]
+        self.assertEqual([entry["status"] for entry in entries],
+                         [scenemigrate.STATUS_OK] * 3)
+        self.assertTrue(all(entry["source_sha256"] for entry in entries))
+        journal = scenemigrate.Journal(journal_path)
+        todo, skipped = scenemigrate.pending(migrations, journal)
+        self.assertEqual((len(todo), len(skipped)), (0, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""Checks area weighted and Poisson disk sampling over mesh surfaces."""
+import itertools
+import math
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import scattercore
+
+
+def _two_triangles():
+    """A triangle of area 1 and, far off along X, one of area 3."""
+    positions = [0, 0, 0, 2, 0, 0, 0, 0, 1,
+                 10, 0, 0, 13, 0, 0, 10, 0, 2]
+    normals = [0, 1, 0] * 6
+    return scattercore.MeshData.from_arrays("pTwo", positions, normals,
+                                            [0, 2, 1, 3, 5, 4])
+
+
+def _quad(size):
+    positions = [0, 0, 0, size, 0, 0, size, 0, size, 0, 0, size]
+    return scattercore.MeshData.from_arrays(
+        "pQuad", positions, [0, 1, 0] * 4, [0, 2, 1, 0, 3, 2])
+
+
+class AreaWeightedTest(unittest.TestCase):
+
+    def test_points_spread_by_area(self):
+        table = _two_triangles().surface
+        self.assertAlmostEqual(table.area, 4.0)
+        positions, normals = table.sample(8000, random.Random(5))
+        in_large = sum(1 for position in positions if position[0] >= 10)
+        self.assertAlmostEqual(in_large / 8000.0, 0.75, delta=0.03)
+        for normal in normals:
+            self.assertAlmostEqual(float(normal[1]), 1.0)
+
+    def test_points_lie_on_the_triangles(self):
+        positions, _ = _two_triangles().surface.sample(500,
+                                                       random.Random(2))
+        for x, y, z in positions:
+            self.assertEqual(y, 0)
+            if x < 10:
+                self.assertLessEqual(x / 2.0 + z, 1.0 + 1e-9)
+            else:
+                self.assertLessEqual((x - 10) / 3.0 + z / 2.0, 1.0 + 1e-9)
+            self.assertGreaterEqual(z, 0)
+
+    def test_seed_gives_the_same_points(self):
+        table = _two_triangles().surface
+        first, _ = table.sample(50, random.Random(9))
+        second, _ = table.sample(50, random.Random(9))
+        self.assertEqual([list(map(float, p)) for p in first],
+                         [list(map(float, p)) for p in second])
+
+
+class PoissonTest(unittest.TestCase):
+
+    def test_minimum_spacing_is_kept(self):
+        settings = scattercore.ScatterSettings(
+            [[1, 1, 1]] * 2 + [[0, 0, 0]] * 4, density=100.0,
+            mode=scattercore.SAMPLE_POISSON, min_distance=0.8)
+        samples = scattercore.surface_samples(
+            _quad(10.0), None, settings, random.Random(1),
+            scattercore._poisson_grid(settings))
+        positions = samples.gather(range(len(samples)))[0]
+        self.assertGreater(len(positions), 50)
+        for a, b in itertools.combinations(positions, 2):
+            distance = math.sqrt(sum((float(p) - float(q)) ** 2
+                                     for p, q in zip(a, b)))
+            self.assertGreaterEqual(distance, 0.8)
+
+    def test_a_full_surface_stops_early(self):
+        table = _quad(1.0).surface
+        grid = scattercore.SpatialHash(2.0)
+        positions, _ = scattercore.sample_poisson(table, 100, grid,
+                                                  random.Random(3))
+        self.assertEqual(len(positions), 1)
+
+    def test_spatial_hash_looks_across_cells(self):
+        grid = scattercore.SpatialHash(1.0)
+        grid.add((0.95, 0.0, 0.0))
+        self.assertTrue(grid.has_neighbour((1.05, 0.0, 0.0)))
+        self.assertTrue(grid.has_neighbour((0.95, 0.99, 0.0)))
+        self.assertFalse(grid.has_neighbour((1.96, 0.0, 0.0)))
+        self.assertFalse(grid.has_neighbour((0.95, 0.0, -1.0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""Checks that decompose_transforms and trs_matrices undo each other."""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import scattercore
+
+
+class RoundTripTest(unittest.TestCase):
+
+    TOLERANCE = 1e-9
+
+    def setUp(self):
+        self.numpy = scattercore.np
+        rng = random.Random(3)
+        count = 64
+        self.positions = [[rng.uniform(-50, 50) for _ in range(3)]
+                          for _ in range(count)]
+        self.rotations = [[rng.uniform(-180, 180) for _ in range(3)]
+                          for _ in range(count)]
+        self.scales = [[rng.choice((-1, 1)) * rng.uniform(0.1, 5)
+                        for _ in range(3)] for _ in range(count)]
+        self.scales[0] = [-1.0, 1.0, 1.0]
+
+    def tearDown(self):
+        scattercore.np = self.numpy
+
+    def _assert_round_trip(self):
+        matrices = scattercore.trs_matrices(self.positions, self.rotations,
+                                            self.scales)
+        rebuilt = scattercore.trs_matrices(
+            *scattercore.decompose_transforms(matrices))
+        for matrix, other in zip(matrices, rebuilt):
+            for value, expected in zip(matrix, other):
+                self.assertAlmostEqual(value, expected,
+                                       delta=self.TOLERANCE)
+
+    def test_round_trip_with_negative_scales(self):
+        self._assert_round_trip()
+
+    def test_round_trip_with_negative_scales_without_numpy(self):
+        scattercore.np = None
+        self._assert_round_trip()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""Checks how versions are reserved with placeholder files."""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import savemetrics
+import scenefile
+
+
+class ReserveVersionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_versions_")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _placeholder(self, version, created):
+        path = scenefile.reservation_path(self.folder, "shot", "anim",
+                                          version)
+        with open(path, "w") as placeholder:
+            placeholder.write("{0} 1 {1:.3f}\n".format(savemetrics.HOST,
+                                                       created))
+        return path
+
+    def _save(self, version):
+        path = os.path.join(self.folder,
+                            "shot_anim_v{0:03d}.ma".format(version))
+        with open(path, "w") as scene:
+            scene.write("//Maya ASCII scene\n")
+
+    def test_expired_placeholder_is_reclaimed(self):
+        old = time.time() - scenefile.RESERVATION_SECONDS - 60
+        path = self._placeholder(1, old)
+        version = scenefile.reserve_version(self.folder, "shot", "anim")
+        self.assertEqual(version, 1)
+        self.assertFalse(scenefile.reservation_expired(path))
+        scenefile.release_version(self.folder, "shot", "anim", version)
+
+    def test_fresh_placeholder_is_skipped(self):
+        self._placeholder(1, time.time())
+        version = scenefile.reserve_version(self.folder, "shot", "anim")
+        self.assertEqual(version, 2)
+
+    def test_many_new_versions_rescan_the_folder(self):
+        scenefile.reserve_version(self.folder, "shot", "anim")
+        for version in range(1, 41):
+            self._save(version)
+        metrics = savemetrics.SaveMetrics(self.folder)
+        version = scenefile.reserve_version(self.folder, "shot", "anim",
+                                            metrics)
+        self.assertEqual(version, 41)
+        counts = metrics.record["counts"]
+        self.assertLessEqual(counts["claim_attempts"],
+                             scenefile.RESCAN_PROBES + 1)
+        self.assertTrue(counts["files_scanned"])
+
+    def test_failed_save_keeps_reservation_to_release(self):
+        scene = scenefile.SceneFile(os.path.join(self.folder,
+                                                 "shot_anim_v001.ma"))
+        version = scene.reserve_next_version()
+        path = scenefile.reservation_path(self.folder, "shot", "anim",
+                                          version)
+        mkstemp = scenefile.tempfile.mkstemp
+
+        def full_disk(*args, **kwargs):
+            raise OSError(28, "No space left on device")
+
+        scenefile.tempfile.mkstemp = full_disk
+        try:
+            self.assertRaises(OSError, scene.save_async)
+        finally:
+            scenefile.tempfile.mkstemp = mkstemp
+        self.assertTrue(os.path.exists(path))
+        scene.release_reservation()
+        self.assertFalse(os.path.exists(path))
+
+
+class VersionIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_versions_")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _touch(self, name):
+        with open(os.path.join(self.folder, name), "w") as touched:
+            touched.write("")
+
+    def _age_folder(self):
+        old = time.time() - 100
+        os.utime(self.folder, (old, old))
+
+    def test_highest_version_of_every_name(self):
+        for name in ("shot_anim_v002.ma", "shot_anim_v010.mb",
+                     "shot_anim_v011.ma.gz", "shot_anim_v1000.ma",
+                     "shot_layout_v004.ma.manifest", "shot_anim_v2000.txt",
+                     "notes.txt", "shot_anim_v3000.ma.partial"):
+            self._touch(name)
+        index = scenefile.VersionIndex(self.folder)
+        self.assertEqual(index.scan(), 8)
+        self.assertEqual(index.latest("shot", "anim"), 1000)
+        self.assertEqual(index.latest("shot", "layout"), 4)
+        self.assertEqual(index.latest("prop", "anim"), 0)
+
+    def test_unchanged_folder_is_not_listed_again(self):
+        self._touch("shot_anim_v001.ma")
+        self._age_folder()
+        index = scenefile.VersionIndex(self.folder)
+        self.assertEqual(index.refresh(), 1)
+        self._touch("shot_anim_v002.ma")
+        os.utime(self.folder, (index.mtime, index.mtime))
+        self.assertIsNone(index.refresh())
+        self.assertEqual(index.latest("shot", "anim"), 1)
+        os.utime(self.folder, (index.mtime + 1, index.mtime + 1))
+        self.assertEqual(index.refresh(), 2)
+        self.assertEqual(index.latest("shot", "anim"), 2)
+
+    def test_reserved_versions_count_as_taken(self):
+        self._touch("shot_anim_v003.ma")
+        index = scenefile.VersionIndex(self.folder)
+        index.scan()
+        self.assertEqual(index.reserve("shot", "anim"), 4)
+        self.assertEqual(index.reserve("shot", "anim"), 5)
+        self.assertEqual(index.latest("shot", "anim"), 5)
+
+    def test_next_available_version_sees_new_saves(self):
+        self._touch("shot_anim_v001.ma")
+        scene = scenefile.SceneFile(os.path.join(self.folder,
+                                                 "shot_anim_v001.ma"))
+        self.assertEqual(scene.next_available_version(), 2)
+        self._touch("shot_anim_v007.mb")
+        self.assertEqual(scene.next_available_version(), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Checks that the version store rebuilds scenes exactly and shares the
+chunks of near identical versions.
+"""
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+import versionstore
+
+
+def _data(size, salt=b""):
+    blocks = (hashlib.sha256(salt + str(i).encode("ascii")).digest()
+              for i in range(size // 32 + 1))
+    return b"".join(blocks)[:size]
+
+
+class VersionStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="test_versionstore_")
+        self.store = versionstore.store_for(self.folder)
+        self.scene = _data(600 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _save(self, name, data):
+        manifest = self.store.put(io.BytesIO(data))
+        path = os.path.join(self.folder, name + versionstore.MANIFEST_SUFFIX)
+        self.store.write_manifest(manifest, path)
+        return manifest, path
+
+    def test_restore_rebuilds_the_scene(self):
+        manifest, path = self._save("shot_anim_v001.ma", self.scene)
+        self.assertEqual(manifest["size"], len(self.scene))
+        restored = versionstore.restore(path)
+        self.assertEqual(restored, path[:-len(versionstore.MANIFEST_SUFFIX)])
+        with open(restored, "rb") as restored_file:
+            self.assertEqual(restored_file.read(), self.scene)
+
+    def test_chunks_keep_their_bounds(self):
+        chunks = list(versionstore.iter_chunks(io.BytesIO(self.scene)))
+        self.assertEqual(b"".join(chunks), self.scene)
+        self.assertGreater(len(chunks), 2)
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(len(chunk), versionstore.MIN_CHUNK_BYTES)
+            self.assertLessEqual(len(chunk), versionstore.MAX_CHUNK_BYTES)
+
+    def test_chunks_do_not_depend_on_the_read_size(self):
+        whole = list(versionstore.iter_chunks(io.BytesIO(self.scene)))
+        pieces = list(versionstore.iter_chunks(io.BytesIO(self.scene),
+                                               read_bytes=7919))
+        self.assertEqual(pieces, whole)
+
+    def test_an_edit_only_stores_new_chunks(self):
+        self._save("shot_anim_v001.ma", self.scene)
+        first = self.store.new_bytes
+        edited = (self.scene[:300000] + b"// a new line\n" +
+                  self.scene[300000:])
+        manifest, _ = self._save("shot_anim_v002.ma", edited)
+        self.assertLess(self.store.new_bytes - first,
+                        2 * versionstore.MAX_CHUNK_BYTES)
+        self.assertEqual(manifest["size"], len(edited))
+        second = self.store.new_bytes
+        self._save("shot_anim_v003.ma", edited)
+        self.assertEqual(self.store.new_bytes, second)
+
+    def test_corrupt_chunk_is_refused(self):
+        manifest, path = self._save("shot_anim_v001.ma", self.scene)
+        digest = manifest["chunks"][0][0]
+        with open(self.store.object_path(digest), "wb") as chunk_file:
+            chunk_file.write(versionstore.zlib.compress(b"not the chunk"))
+        self.assertRaises(IOError, versionstore.restore, path)
+        self.assertFalse(os.path.exists(
+            path[:-len(versionstore.MANIFEST_SUFFIX)]))
+
+
+if __name__ == "__main__":
+    unittest.main()